@@ -1,19 +1,35 @@
 import os
 import csv
 import glob
-import time
 import random
-import subprocess
-import re
 import logging
 from datetime import datetime
-from typing import Dict, List, Any
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Any, Tuple, Set
 from di_container import get_container, DIContainer
-from ai_helpers import generate_with_retry
-from html_generator import generate_short_url
+from ai_helpers import generate_with_retry, parse_json_response
+from html_generator import RedirectPageWriter, LinkManifestWriter
+from short_id import get_short_id_allocator
+from page_manifest import get_page_manifest
+from html_layout import PageLayout, get_page_layout
+from git_publisher import get_git_publisher
+from product import Product
+from post_sanitizer import AFFILIATE_POST_SANITIZER
+from columnar_store import get_columnar_store, write_safely, DATASET_AFFILIATE_POSTS
+from product_store import get_product_store
+from async_generation_engine import AsyncGenerationEngine
 from concurrent.futures import ThreadPoolExecutor
 
 
+@dataclass(slots=True)
+class AffiliateEntry:
+    """投稿文の生成対象となる商品 1 件（商品情報・短縮 URL・生成結果）。"""
+    product: Product
+    short_url: str
+    post: str | None = None
+    attempts: int = 0  # AI へのリクエスト回数（バッチ生成の場合は対象に含まれた回数）
+
+
 class AffiliatePostGenerator:
     """依存性の注入 (DI) を利用してアフィリエイトポストを生成するクラス。"""
     
@@ -28,9 +44,41 @@ class AffiliatePostGenerator:
         self.accounts = self.container.get_accounts()
         self.client = self.container.get_ai_client()
         self.logger: logging.Logger = self.container.get_logger(__name__)
+        # storage.format が parquet / arrow の場合のみ有効な列指向ストア
+        self.columnar_store = get_columnar_store(self.config)
+        # リダイレクトページの保持期間の索引に記録する実行 ID（全アカウントで共通）
+        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # base_url は起動時に一度だけ読み込み、リダイレクトページはアカウント単位で一括書き込み
+        # ファイル名は転送先 URL ごとの安定した短縮 ID（索引は data/ に永続化）、本文が変わらないページは再書き込みしない
+        # redirect_pages.layout が sharded の場合は html/ab/abc123.html のようにサブディレクトリへ分けて配置
+        # redirect_pages.mode が manifest の場合はページを作らず、html/links.json と転送ページ 1 つで公開
+        redirect_config = self.config.get("redirect_pages") or {}
+        base_url = self.container.get_secrets().get("base_url", "")
+        if redirect_config.get("mode", "pages") == "manifest":
+            self.page_writer = LinkManifestWriter(
+                base_url,
+                id_allocator=get_short_id_allocator(self.config, "../html"),
+                manifest=get_page_manifest(self.config),
+                resolver_page=redirect_config.get("resolver_page", "go.html")
+            )
+        else:
+            self.page_writer = RedirectPageWriter(
+                base_url,
+                max_workers=redirect_config.get("max_workers", 8),
+                id_allocator=get_short_id_allocator(self.config, "../html"),
+                manifest=get_page_manifest(self.config),
+                skip_unchanged=redirect_config.get("skip_unchanged", True),
+                layout=get_page_layout(self.config, "../html")
+            )
+        # 書き込み・削除したページだけを 1 コミットにまとめて公開（publish.push が background の場合は非同期にプッシュ）
+        self.publisher = get_git_publisher(self.config, self.page_writer.manifest, self.logger)
     
     def cleanup_html(self) -> None:
-        """保持ポリシーに基づいて古い HTML ファイルを削除します。"""
+        """保持ポリシーに基づいて古い HTML ファイルを削除します。
+
+        削除対象はリダイレクトページの索引（data/ のマニフェスト）から求めるため、
+        html ディレクトリの走査やファイルの更新日時には依存しません。
+        """
         # スクリプトの場所基準で html ディレクトリの絶対パスを特定
         script_dir = os.path.dirname(os.path.abspath(__file__))
         html_dir = os.path.join(script_dir, "..", "html")
@@ -40,93 +88,80 @@ class AffiliatePostGenerator:
             self.logger.warning(f"HTML ディレクトリが見つかりません: {html_dir}")
             return
 
-        now = time.time()
-        
         # 設定ファイルから保持設定を取得（デフォルトは5日間）
         html_config = self.config.get("html_cleanup", {})
         retention_days = self.config.get("affiliate_post_generation", {}).get("html_retention_days", 5)
         seconds_in_retention = retention_days * 24 * 60 * 60
         
-        # 削除対象から除外するファイル名と、対象とする拡張子
+        # 削除対象から除外するファイル名
         excluded_files = html_config.get("excluded_files", ["index.html"])
-        extensions = html_config.get("default_extensions", [".html"])
-
-        html_files = []
-        for f in os.listdir(html_dir):
-            if f in excluded_files or not any(f.endswith(ext) for ext in extensions):
-                continue
-            file_path = os.path.join(html_dir, f)
-            try:
-                # 最終更新日時を取得
-                mtime = os.path.getmtime(file_path)
-                html_files.append({"name": f, "path": file_path, "mtime": mtime})
-            except Exception:
-                continue
-
-        if not html_files:
-            return
-
-        # 最新のファイル（今回の実行で生成されたと思われるもの）を特定
-        latest_file = max(html_files, key=lambda x: x["mtime"])
-        latest_mtime = latest_file["mtime"]
-        
-        # 「最新セット」の基準: 最新ファイルから 10 分以内に更新されたものは残す
-        SET_THRESHOLD_SECONDS = 10 * 60 
-        
-        # 本日の日付文字列
-        today_str = datetime.now().strftime("%Y-%m-%d")
-
-        for item in html_files:
-            f = item["name"]
-            file_path = item["path"]
-            file_mtime = item["mtime"]
-            
-            # 判定1: 保持期間を過ぎているか（古いファイル）
-            is_expired = (now - file_mtime > seconds_in_retention)
-            
-            # 判定2: 本日分だが、最新の実行セットではないか（同日内の古い実行残り）
-            file_date_str = datetime.fromtimestamp(file_mtime).strftime("%Y-%m-%d")
-            is_today = (file_date_str == today_str)
-            is_old_today_set = is_today and (latest_mtime - file_mtime > SET_THRESHOLD_SECONDS)
-
-            if is_expired or is_old_today_set:
-                try:
-                    os.remove(file_path)
-                    reason = "保持期間超過" if is_expired else "当日内の古いセット"
-                    print(f"削除しました: {f} ({reason})")
-                    self.logger.info(f"HTML ファイルを削除しました: {f} ({reason})")
-                except Exception as e:
-                    print(f"削除失敗: {f} - {e}")
-                    self.logger.warning(f"HTML ファイルの削除に失敗しました: {f} - {e}")
-
-    def generate_post_text(self, product_name: str, short_url: str, price: str = "", review_average: str = "0.0", review_count: str = "0", point_rate: str = "1") -> str:
+        if isinstance(self.page_writer, LinkManifestWriter):
+            excluded_files = list(excluded_files) + [self.page_writer.resolver_page]
+
+        # 索引の導入前に生成されたページは、初回のみディレクトリを走査して索引に取り込む
+        manifest = self.page_writer.manifest
+        layout = PageLayout(html_dir, self.page_writer.layout.layout, self.page_writer.layout.shard_length)
+        adopted = manifest.adopt_existing(layout, excluded_files)
+        if adopted:
+            self.logger.info(f"既存の HTML ファイル {adopted} 件を索引に登録しました")
+
+        # 判定: 保持期間を過ぎているか、本日分だが最新の実行では使用されていないか（同日内の古い実行残り）
+        removed = manifest.sweep(
+            layout,
+            seconds_in_retention,
+            batch_size=html_config.get("batch_size", 500),
+            excluded_files=excluded_files
+        )
+        for f, reason in removed:
+            print(f"削除しました: {f} ({reason})")
+            self.logger.info(f"HTML ファイルを削除しました: {f} ({reason})")
+
+        # 単一マニフェスト方式の場合は、索引から削除したリンクを links.json からも取り除く
+        if isinstance(self.page_writer, LinkManifestWriter):
+            pruned = self.page_writer.prune()
+            if pruned:
+                self.logger.info(f"links.json から {pruned} 件のリンクを削除しました")
+
+    def generate_post_text(self, product: Product, short_url: str, use_cache: bool = True) -> str:
         """追加情報を活用して、より魅力的なアフィリエイト用ポスト文案を生成します。
         
         Args:
-            product_name: 商品名
+            product: 商品情報（商品名・価格・レビュー・ポイント倍率）
             short_url: 短縮風のリダイレクト URL
-            price: 価格情報
-            review_average: レビュー平均点
-            review_count: レビュー件数
-            point_rate: ポイント倍率
+            use_cache: False の場合は応答キャッシュを参照せずに再生成します
             
         Returns:
             生成されたポスト文案
         """
+        prompt = self._build_post_prompt(product)
+        text = generate_with_retry(self.client, prompt, self.config["affiliate_post_generation"], use_cache=use_cache)
+        return self._finalize_post_text(text, short_url)
+
+    def _summarize_product(self, product: Product) -> Tuple[str, str]:
+        """プロンプトに埋め込む商品名と補足情報のサマリを作成します。
+        
+        Returns:
+            (長さを制限した商品名, 補足情報テキスト) のタプル
+        """
         # 商品名が長すぎる場合はカット
         max_name_len = self.config["affiliate_post_generation"].get("max_product_name_length", 80)
-        safe_name = product_name[:max_name_len]
+        safe_name = product.name[:max_name_len]
 
         # 追加情報のサマリを作成
         info_summary = []
-        if price:
-            info_summary.append(f"価格: {price}円")
-        if float(review_average) > 0:
-            info_summary.append(f"評価: ★{review_average}（{review_count}件）")
-        if int(point_rate) > 1:
-            info_summary.append(f"ポイント: {point_rate}倍")
+        if product.price is not None:
+            info_summary.append(f"価格: {product.price_text}円")
+        if product.review_average > 0:
+            info_summary.append(f"評価: ★{product.review_text}（{product.review_count}件）")
+        if product.point_rate > 1:
+            info_summary.append(f"ポイント: {product.point_rate}倍")
         
         extra_info_text = " / ".join(info_summary)
+        return safe_name, extra_info_text
+
+    def _build_post_prompt(self, product: Product) -> str:
+        """アフィリエイト用ポスト文案を生成するためのプロンプトを組み立てます。"""
+        safe_name, extra_info_text = self._summarize_product(product)
 
         prompt = f"""
 以下の情報から、X（旧Twitter）向けの「思わずクリックしたくなる」魅力的な投稿文を作成してください。
@@ -146,176 +181,386 @@ class AffiliatePostGenerator:
 ・短縮URLはシステムの最後に自動付与されるため、生成文には含めない
 ・1行で完結（改行が必要な場合は \n を使用し、実際の改行はしない）
 """
-        text = generate_with_retry(self.client, prompt, self.config["affiliate_post_generation"])
+        return prompt
+
+    def _build_batch_prompt(self, entries: List[AffiliateEntry]) -> str:
+        """複数商品をまとめて 1 回で生成するためのプロンプトを組み立てます。
+        
+        各商品には p1, p2, ... のキーを割り当て、同じキーを持つ JSON オブジェクトで
+        投稿文を返すよう指示します。
+        """
+        product_blocks = []
+        for i, entry in enumerate(entries, start=1):
+            safe_name, extra_info_text = self._summarize_product(entry.product)
+            product_blocks.append(f"[p{i}]\n商品名: {safe_name}\n補足情報: {extra_info_text}")
+        products_text = "\n\n".join(product_blocks)
+
+        return f"""
+以下の {len(entries)} 件の商品それぞれについて、X（旧Twitter）向けの「思わずクリックしたくなる」魅力的な投稿文を作成してください。
+
+{products_text}
+
+条件：
+・各商品の本文は50文字以内
+・価格、高評価、ポイント還元などの「お得感・安心感」を1つ以上盛り込む
+・宣伝臭を抑えつつ、利用者のメリット（「これいい！」「助かる」等）を強調
+・絵文字は1つまで
+・文章の中にURLや[短縮URL]のようなプレースホルダは含めない（短縮URLはシステムが自動付与します）
+・改行が必要な場合は \\n を使用し、実際の改行はしない
+
+出力形式：
+商品のキー（p1, p2, ...）をキー、投稿文を値とする JSON オブジェクトのみを出力してください。
+例: {{"p1": "投稿文", "p2": "投稿文"}}
+"""
+
+    def _parse_batch_posts(self, text: str, entries: List[AffiliateEntry]) -> List[str]:
+        """キー付き JSON の応答を各エントリに対応付け、整形・検証した投稿文のリストを返します。
+        
+        Args:
+            text: AI が返した JSON オブジェクトの応答
+            entries: プロンプトに含めたエントリ（p1 から順に対応）
+            
+        Returns:
+            entries と同じ順序の投稿文のリスト（欠落・不正な要素はエラーメッセージ）
+        """
+        data = parse_json_response(text)
+        if not isinstance(data, dict):
+            data = {}
+        posts = []
+        for i, entry in enumerate(entries, start=1):
+            item = data.get(f"p{i}")
+            if not isinstance(item, str) or not item.strip():
+                posts.append("[AIエラー] バッチ応答に含まれていません")
+                continue
+            posts.append(self._finalize_post_text(item, entry.short_url))
+        return posts
+
+    def generate_post_texts_batched(self, entries: List[AffiliateEntry]) -> None:
+        """batch_size 件ずつ商品をまとめて投稿文を生成し、各エントリの post に格納します。
         
-        # ===== Step 1: 改行をリテラル形式に統一（行ずれ防止の最重要対策） =====
-        # AI が実際の改行を返すことがあるため、最初にすべてリテラル \\n に変換
-        text = text.replace("\r\n", "\\n").replace("\n", "\\n")
+        欠落または検証に失敗した商品だけを、retry_passes 回まで再度まとめてリクエストします。
         
-        # ===== Step 2: URL やプレースホルダの排除 =====
-        text = re.sub(r'https?://[\w/:%#\$&\?\(\)~\.=\+\-]+', '', text)
-        text = text.replace("[短縮URL]", "\\n").replace("【短縮URL】", "\\n")
+        Args:
+            entries: _load_entries で作成したエントリのリスト
+        """
+        section = self.config["affiliate_post_generation"]
+        batch_size = max(1, int(section.get("batch_size", 1)))
+
+        def process_batch(batch: List[AffiliateEntry], use_cache: bool = True) -> None:
+            try:
+                text = generate_with_retry(self.client, self._build_batch_prompt(batch), section, json_mode=True, use_cache=use_cache)
+                posts = self._parse_batch_posts(text, batch)
+            except Exception as ex:
+                self.logger.error(f"バッチ生成エラー: {len(batch)} 件 - {ex}")
+                posts = ["[AIエラー] 生成に失敗しました"] * len(batch)
+            for entry, post in zip(batch, posts):
+                entry.attempts += 1
+                # 再試行で成功済みの投稿を失敗結果で上書きしない
+                if self._is_failed(entry.post):
+                    entry.post = post
+
+        def run_batches(targets: List[AffiliateEntry], use_cache: bool = True) -> None:
+            batches = [targets[i:i + batch_size] for i in range(0, len(targets), batch_size)]
+            max_workers = (section.get("rate_limit") or {}).get("max_concurrent", 5)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(lambda batch: process_batch(batch, use_cache), batches))
+
+        run_batches(entries)
+
+        retry_passes = section.get("retry_passes", 3)
+        for rp in range(1, retry_passes + 1):
+            failed = [e for e in entries if self._is_failed(e.post)]
+            if not failed:
+                break
+            print(f"[再試行パス {rp}/{retry_passes}] 失敗した生成の再実行中: {len(failed)} 件")
+            run_batches(failed, use_cache=False)
+
+    def _finalize_post_text(self, text: str, short_url: str) -> str:
+        """AI の生成結果を整形・検証し、短縮 URL を結合します。
         
-        # ===== Step 3: 不要な文字列（ノイズ）の除去 =====
-        text = re.sub(r'^【.*?】', '', text)
-        text = re.sub(r'^例[1-9]：', '', text)
-        text = re.sub(r'^例：', '', text)
-        text = text.replace("本文：", "").replace("投稿内容：", "")
-        text = re.sub(r'上記例を参考にして.*', '', text)
-        text = re.sub(r'他に\d+パターン.*', '', text)
+        Args:
+            text: AI が返した生のテキスト
+            short_url: 短縮風のリダイレクト URL
+            
+        Returns:
+            投稿用の文案、または "[AIエラー]" で始まるエラーメッセージ
+        """
+        result = AFFILIATE_POST_SANITIZER.sanitize(text)
+        if not result.ok:
+            return result.as_post()
+        # URL を結合（\\n を確実に挿入）
+        return f"{result.text}\\n{short_url}"
+
+    @staticmethod
+    def _is_failed(p: str | None) -> bool:
+        """生成に失敗（空文字やエラーメッセージ）したポストかどうかを判定します。"""
+        if p is None:
+            return True
+        s = str(p).strip()
+        return s == "" or s.startswith("[AIエラー]")
+
+    def _changed_products(self, account: str) -> Set[str] | None:
+        """only_changed_products が有効な場合に、直近の取得で新着・変化のあった商品キーを返します。
         
-        # ===== Step 4: \\n のノーマライズ =====
-        # AI が \\n（二重エスケープ）を出力する場合があるため \n に統一
-        text = text.replace("\\\\n", "\\n")
-        # \\n が3つ以上連続する場合を \\n\\n に圧縮
-        while "\\n\\n\\n" in text:
-            text = text.replace("\\n\\n\\n", "\\n\\n")
-        # 先頭・末尾の \\n を除去
-        while text.startswith("\\n"):
-            text = text[2:]
-        while text.endswith("\\n"):
-            text = text[:-2]
-        text = text.strip()
+        Returns:
+            対象とする商品キーの集合。全商品を対象にする場合は None
+        """
+        section = self.config["affiliate_post_generation"]
+        if not section.get("only_changed_products", False):
+            return None
+        store = get_product_store(self.config)
+        if store is None:
+            self.logger.warning("product_store が無効のため、only_changed_products を無視して全商品を処理します")
+            return None
+        changed = store.changed_since_last_run(account, section.get("changed_kinds"))
+        print(f"[INFO] {account}: 新着・変化のあった商品 {len(changed)} 件を対象にします")
+        return changed
+
+    def _load_entries(self, input_path: str) -> List[AffiliateEntry]:
+        """入力 CSV を読み込み、商品ごとにリダイレクト HTML を生成してエントリのリストを返します。
         
-        # ===== Step 5: プレースホルダ / テンプレート用単語の検知 =====
-        placeholder_pattern = r'\[.*?\]|【.*?】|〇{2,}|○{2,}|◯{2,}|[X]{2,}|[x]{2,}|[△]{2,}|[Δ]{2,}|[×]{2,}'
-        template_words = ["ブランド名", "商品名", "店舗名", "会社名", "カテゴリー", "〇〇", "○○"]
-        if re.search(placeholder_pattern, text) or any(w in text for w in template_words):
-            return "[AIエラー] プレースホルダまたはテンプレート用単語が含まれています"
+        Args:
+            input_path: アカウントの入力 CSV のパス
+            
+        Returns:
+            商品情報と短縮 URL を含むエントリのリスト
+        """
+        account = os.path.basename(input_path).replace("_input.csv", "")
+        changed = self._changed_products(account)
+        products = []
+        with open(input_path, "r", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            for row in reader:
+                try:
+                    product = Product.from_row(row)
+                    if product is None:
+                        continue
+                    products.append(product)
+                except Exception as e:
+                    print(f"[ERROR] 行の処理に失敗しました: {row}")
+                    import traceback
+                    traceback.print_exc()
+                    continue
+
+        # OGP 対応 HTML をまとめて生成し、短縮 URL を取得（HTMLタイトルにも反映させる）
+        # 変化の無い商品も、公開済みのポストのリンク先として今回の実行で使用中のページに記録する
+        # （本文が同一のページは書き込まずにスキップされる）
+        short_urls = self.page_writer.write_all(products, self.run_id)
+        # 新着・変化のあった商品のみを対象にする場合は、それ以外の商品を AI 生成・ポスト出力から除外
+        return [
+            AffiliateEntry(product, short_url)
+            for product, short_url in zip(products, short_urls)
+            if short_url is not None and (changed is None or product.item_key in changed)
+        ]
+
+    def _write_posts(self, output_path: str, entries: List[AffiliateEntry], account: str) -> None:
+        """投稿順をランダムに入れ替えて、アカウントの出力ファイルに保存します。
         
-        # ===== Step 6: 外国語エラー判定 =====
-        if not re.search(r'[ぁ-んァ-ン一-龥]', text):
-             return "[AIエラー] 日本語が含まれていません"
-
-        # ===== Step 7: ハッシュタグの前に改行を挿入 =====
-        if "#" in text:
-            text = text.replace(" #", "\\n#").replace("　#", "\\n#")
-            text = re.sub(r'([^\\n])#', r'\1\\n#', text)
-
-        # ===== Step 8: URL を結合（\\n を確実に挿入） =====
-        return f"{text}\\n{short_url}"
+        storage.format が parquet / arrow の場合は、商品情報・生成結果・ステータス・試行回数を
+        列指向ストアにも保存します。
+        """
+        posts = [e.post or "" for e in entries]
+        random.shuffle(posts)
+        with open(output_path, "w", encoding="utf-8") as f:
+            for p in posts:
+                # 改行文字の二重エスケープ等を補正して保存
+                safe_post = p.replace("\\\\n", "\\n")
+                f.write(safe_post + "\n")
+
+        print(f"{output_path} を作成しました！")
+
+        generated_at = datetime.now()
+        write_safely(self.columnar_store, DATASET_AFFILIATE_POSTS, account, [
+            dict(
+                asdict(e.product),
+                short_url=e.short_url,
+                post=e.post,
+                status="failed" if self._is_failed(e.post) else "done",
+                attempts=e.attempts,
+                generated_at=generated_at
+            )
+            for e in entries
+        ])
+
+    def publish_html(self) -> None:
+        """HTML ファイルを GitHub Pages 等で公開するため、変更したページをコミットして Git プッシュを実行します。
+
+        作業ツリー全体ではなく、今回（および前回までに公開に失敗した分）の書き込み・削除したページだけを対象にします。
+        """
+        try:
+            print("GitHub へ変更を送信中...")
+            self.publisher.publish()
+        except Exception as e:
+            print(f"GitHub push エラー（無視して続行します）: {e}")
 
-    def generate(self) -> None:
-        """全アカウントのアフィリエイト投稿文を生成し、GitHub へプッシュします。"""
+    def generate(self, accounts: List[str] | None = None, cleanup: bool = True, publish: bool = True) -> Dict[str, str]:
+        """全アカウントのアフィリエイト投稿文を生成し、GitHub へプッシュします。
+        
+        generation_policy.yaml の generation_engine が "async" の場合は、
+        全アカウントの商品を非同期エンジンで同時にスケジュールします。
+        
+        Args:
+            accounts: 処理対象のアカウント名（None の場合は入力 CSV がある全アカウント）
+            cleanup: 生成前に古い HTML のクリーンアップを行うかどうか
+            publish: 生成後に HTML を Git で公開するかどうか
+                     （ステージを並行実行する場合は、呼び出し側で一度だけ行います）
+            
+        Returns:
+            出力に成功したアカウント名から出力パスへのマッピング
+        """
         self.logger.info("アフィリエイトポスト生成を開始します")
         # 前処理: 古い HTML のクリーンアップ
-        self.cleanup_html()
+        if cleanup:
+            self.cleanup_html()
 
         # data/input フォルダ内の全ての CSV を対象にループ
         input_files = glob.glob("../data/input/*_input.csv")
+        if accounts is not None:
+            input_files = [
+                p for p in input_files
+                if os.path.basename(p).replace("_input.csv", "") in accounts
+            ]
         self.logger.debug(f"{len(input_files)} 件の入力 CSV を検出しました")
 
+        if self.config.get("generation_engine") == "async":
+            outputs = self._generate_async(input_files)
+            if publish:
+                self.publish_html()
+            print("全アカウントのアフィリエイト投稿文生成が完了しました！")
+            return outputs
+
+        outputs: Dict[str, str] = {}
         for input_path in input_files:
             filename = os.path.basename(input_path)
             account = filename.replace("_input.csv", "")
             self.logger.info(f"アカウント '{account}' を処理中")
 
             output_path = f"../data/output/{account}_affiliate_posts.txt"
-            entries = []
 
             # 入力 CSV を読み込み、リダイレクト HTML を生成
-            with open(input_path, "r", encoding="utf-8") as f:
-                reader = csv.reader(f)
-                for row in reader:
-                    try:
-                        if len(row) < 3:
-                            continue
-                        product_name = row[0]
-                        affiliate_url = row[1]
-                        image_url = row[2]
-                        price = row[3] if len(row) > 3 else ""
-                        review_avg = row[4] if len(row) > 4 else "0.0"
-                        review_cnt = row[5] if len(row) > 5 else "0"
-                        point_rate = row[6] if len(row) > 6 else "1"
-
-                        # OGP 対応 HTML を生成し、短縮 URL を取得（HTMLタイトルにも反映させる）
-                        short_url = generate_short_url(
-                            affiliate_url, 
-                            product_name, 
-                            image_url,
-                            price=price,
-                            review_average=review_avg,
-                            point_rate=point_rate
-                        )
-                        entries.append({
-                            "product_name": product_name,
-                            "short_url": short_url,
-                            "price": price,
-                            "review_avg": review_avg,
-                            "review_cnt": review_cnt,
-                            "point_rate": point_rate,
-                            "post": None
-                        })
-                    except Exception as e:
-                        print(f"[ERROR] 行の処理に失敗しました: {row}")
-                        import traceback
-                        traceback.print_exc()
-                        continue
+            entries = self._load_entries(input_path)
 
-            # 各商品に対して AI 投稿文を並列生成
-            with ThreadPoolExecutor(max_workers=5) as executor:
+            # batch_size が 2 以上の場合は複数商品を 1 リクエストにまとめる
+            if self.config["affiliate_post_generation"].get("batch_size", 1) > 1:
+                self.generate_post_texts_batched(entries)
+                self._write_posts(output_path, entries, account)
+                outputs[account] = output_path
+                continue
+
+            # 各商品に対して AI 投稿文を並列生成（並列数は同時実行予算 rate_limit.max_concurrent に合わせる）
+            max_workers = (self.config["affiliate_post_generation"].get("rate_limit") or {}).get("max_concurrent", 5)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
                 def process_entry(entry):
                     try:
-                        return self.generate_post_text(
-                            entry["product_name"], 
-                            entry["short_url"],
-                            price=entry["price"],
-                            review_average=entry["review_avg"],
-                            review_count=entry["review_cnt"],
-                            point_rate=entry["point_rate"]
-                        )
+                        return self.generate_post_text(entry.product, entry.short_url)
                     except Exception as ex:
-                        self.logger.error(f"生成エラー: {entry['product_name']} - {ex}")
+                        self.logger.error(f"生成エラー: {entry.product.name} - {ex}")
                         return "[AIエラー] 生成に失敗しました"
 
                 # 並列実行して結果を格納
                 posts = list(executor.map(process_entry, entries))
                 for i, post in enumerate(posts):
-                    entries[i]["post"] = post
+                    entries[i].post = post
+                    entries[i].attempts = 1
 
             # 失敗（空文字等）したエントリの再試行処理
-            def _is_failed(p: str | None) -> bool:
-                if p is None:
-                    return True
-                s = str(p).strip()
-                return s == "" or s.startswith("[AIエラー]")
-
-            failed_idxs = [i for i, e in enumerate(entries) if _is_failed(e.get("post"))]
+            failed_idxs = [i for i, e in enumerate(entries) if self._is_failed(e.post)]
             if failed_idxs:
                 retry_passes = self.config["affiliate_post_generation"].get("retry_passes", 3)
                 for rp in range(1, retry_passes + 1):
                     print(f"[再試行パス {rp}/{retry_passes}] 失敗した生成の再実行中: {len(failed_idxs)} 件")
                     for idx in failed_idxs[:]:
                         e = entries[idx]
+                        e.attempts += 1
                         try:
-                            new_post = self.generate_post_text(e["product_name"], e["short_url"])
-                            if not _is_failed(new_post):
-                                entries[idx]["post"] = new_post
+                            new_post = self.generate_post_text(e.product, e.short_url, use_cache=False)
+                            if not self._is_failed(new_post):
+                                entries[idx].post = new_post
                                 failed_idxs.remove(idx)
                         except Exception as ex:
-                            print(f"[ERROR] 再試行エラー: {e['product_name']}")
+                            print(f"[ERROR] 再試行エラー: {e.product.name}")
 
-            # 投稿順をランダムに入れ替えて保存
-            posts = [e.get("post") or "" for e in entries]
-            random.shuffle(posts)
-            with open(output_path, "w", encoding="utf-8") as f:
-                for p in posts:
-                    # 改行文字の二重エスケープ等を補正して保存
-                    safe_post = p.replace("\\\\n", "\\n")
-                    f.write(safe_post + "\n")
+            self._write_posts(output_path, entries, account)
+            outputs[account] = output_path
 
-            print(f"{output_path} を作成しました！")
-
-        # HTML ファイルを GitHub Pages 等で公開するため、Git プッシュを実行
-        try:
-            print("GitHub へ変更を送信中...")
-            subprocess.run(["git", "add", "-A"], check=True)
-            subprocess.run(["git", "commit", "-m", "AI auto post update"], check=True)
-            subprocess.run(["git", "push"], check=True)
-        except Exception as e:
-            print(f"GitHub push エラー（無視して続行します）: {e}")
+        if publish:
+            self.publish_html()
 
         print("全アカウントのアフィリエイト投稿文生成が完了しました！")
+        return outputs
+
+    async def _generate_entry_async(self, entry: AffiliateEntry, engine: AsyncGenerationEngine) -> str:
+        """1 商品分の投稿文を非同期に生成し、失敗時は retry_passes 回まで再生成します。"""
+        section = self.config["affiliate_post_generation"]
+        prompt = self._build_post_prompt(entry.product)
+        entry.attempts += 1
+        post = self._finalize_post_text(await engine.generate(prompt, section), entry.short_url)
+        retry_passes = section.get("retry_passes", 3)
+        for _ in range(retry_passes):
+            if not self._is_failed(post):
+                break
+            entry.attempts += 1
+            post = self._finalize_post_text(await engine.generate(prompt, section, use_cache=False), entry.short_url)
+        return post
+
+    async def _generate_batch_async(self, batch: List[AffiliateEntry], engine: AsyncGenerationEngine) -> List[str]:
+        """複数商品分の投稿文をまとめて非同期に生成し、失敗した商品のみを再リクエストします。"""
+        section = self.config["affiliate_post_generation"]
+        posts: List[str] = ["[AIエラー] 生成に失敗しました"] * len(batch)
+        targets = list(range(len(batch)))
+        retry_passes = section.get("retry_passes", 3)
+        for attempt in range(retry_passes + 1):
+            sub_batch = [batch[i] for i in targets]
+            for entry in sub_batch:
+                entry.attempts += 1
+            text = await engine.generate(self._build_batch_prompt(sub_batch), section, json_mode=True, use_cache=(attempt == 0))
+            for i, post in zip(targets, self._parse_batch_posts(text, sub_batch)):
+                posts[i] = post
+            targets = [i for i in targets if self._is_failed(posts[i])]
+            if not targets:
+                break
+        return posts
+
+    def _generate_async(self, input_files: List[str]) -> Dict[str, str]:
+        """全アカウントの商品を非同期エンジンへ一括投入し、完了したアカウントから出力します。"""
+        engine = AsyncGenerationEngine(self.client, self.logger)
+        outputs: Dict[str, str] = {}
+        batch_size = max(1, int(self.config["affiliate_post_generation"].get("batch_size", 1)))
+        entries_by_account: Dict[str, List[AffiliateEntry]] = {}
+        jobs: Dict[str, List[Any]] = {}
+        for input_path in input_files:
+            account = os.path.basename(input_path).replace("_input.csv", "")
+            self.logger.info(f"アカウント '{account}' の生成を予約します")
+            entries = self._load_entries(input_path)
+            entries_by_account[account] = entries
+            if batch_size > 1:
+                jobs[account] = [
+                    (lambda batch=entries[i:i + batch_size]: self._generate_batch_async(batch, engine))
+                    for i in range(0, len(entries), batch_size)
+                ]
+            else:
+                jobs[account] = [
+                    (lambda entry=entry: self._generate_entry_async(entry, engine))
+                    for entry in entries
+                ]
+
+        def on_account_done(account: str, results: List[Any]) -> None:
+            entries = entries_by_account[account]
+            if batch_size > 1:
+                # バッチ単位の結果を商品単位に展開（失敗したバッチは件数分のエラーで埋める）
+                posts: List[Any] = []
+                for i, result in enumerate(results):
+                    size = len(entries[i * batch_size:(i + 1) * batch_size])
+                    posts.extend(result if result is not None else [None] * size)
+                results = posts
+            for entry, post in zip(entries, results):
+                entry.post = post if post is not None else "[AIエラー] 生成に失敗しました"
+            output_path = f"../data/output/{account}_affiliate_posts.txt"
+            self._write_posts(output_path, entries, account)
+            outputs[account] = output_path
+
+        engine.run(jobs, on_account_done)
+        return outputs
 
 
 def main() -> None:
@@ -3,26 +3,57 @@ AI 支援モジュール。
 AI クライアントの生成と、再試行ロジックを含むコンテンツ生成を担当します。
 """
 from google import genai
-import threading
+from google.genai import types
+import asyncio
+import json
+import re
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 import retry_helper
+from rate_limiter import TokenBucketRateLimiter, get_rate_limiter, estimate_tokens
+from response_cache import ResponseCache, get_response_cache
 
 
-# === 15 RPM 制限回避用（Gemini無料枠対策） ===
-_api_lock = threading.Lock()
-_last_api_call_time = 0.0
-API_CALL_INTERVAL_SECONDS = 4.1
+def _usage_tokens(response: Any) -> int:
+    """レスポンスの usage_metadata から実際の消費トークン数を取得します（取得できない場合は 0）。"""
+    usage = getattr(response, "usage_metadata", None)
+    return int(getattr(usage, "total_token_count", 0) or 0)
 
-def _enforce_rate_limit():
-    """グローバルロックを用いて、API呼び出し間の最低インターバルを保証する"""
-    global _last_api_call_time
-    with _api_lock:
-        now = time.time()
-        elapsed = now - _last_api_call_time
-        if elapsed < API_CALL_INTERVAL_SECONDS:
-            time.sleep(API_CALL_INTERVAL_SECONDS - elapsed)
-        _last_api_call_time = time.time()
+
+# ```json ... ``` のようなコードフェンスを除去するためのパターン
+_CODE_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def parse_json_response(text: str) -> Any:
+    """JSON モードで生成された応答を解析します。
+
+    モデルがコードフェンスや前置きを付けて返す場合にも対応するため、
+    最初の '[' または '{' から最後の ']' または '}' までを抽出して解析します。
+
+    Args:
+        text: AI が返した応答テキスト
+
+    Returns:
+        解析結果（list / dict 等）。解析できない場合は None
+    """
+    if not text:
+        return None
+    body = _CODE_FENCE_PATTERN.sub("", text.strip())
+    starts = [i for i in (body.find("["), body.find("{")) if i >= 0]
+    end = max(body.rfind("]"), body.rfind("}"))
+    if not starts or end < 0:
+        return None
+    try:
+        return json.loads(body[min(starts):end + 1])
+    except ValueError:
+        return None
+
+
+def _content_config(json_mode: bool) -> types.GenerateContentConfig | None:
+    """生成リクエストの追加設定を返します。JSON モードでは構造化出力を要求します。"""
+    if json_mode:
+        return types.GenerateContentConfig(response_mime_type="application/json")
+    return None
 
 
 def create_ai_client(api_key: str) -> genai.Client:
@@ -37,7 +68,113 @@ def create_ai_client(api_key: str) -> genai.Client:
     return genai.Client(api_key=api_key)
 
 
-def generate_with_retry(client: genai.Client, prompt: str, config: Dict[str, Any]) -> str:
+def _extract_text(response: Any, attempt: int) -> str:
+    """正常な応答からテキストを取り出し、成功メトリクスを記録します。"""
+    try:
+        retry_helper.metrics_log("ai_success", {"attempts": attempt})
+    except Exception:
+        pass
+    if hasattr(response, "text") and response.text:
+        return response.text.strip()
+    # text 属性がない場合のフォールバック（候補から直接取得）
+    return response.candidates[0].content.parts[0].text.strip()
+
+
+def _handle_error(err_text: str, attempt: int, max_retries: int, limiter: TokenBucketRateLimiter, config: Dict[str, Any]) -> float | None:
+    """生成エラーを記録し、次の試行までの待機秒数を返します。
+
+    Args:
+        err_text: 発生したエラーのテキスト
+        attempt: 現在の試行回数
+        max_retries: 最大試行回数
+        limiter: モデルごとの共有リミッター
+        config: 再試行設定を含む辞書
+
+    Returns:
+        次の試行までの待機秒数。最大リトライに到達した場合は None
+    """
+    try:
+        retry_helper.metrics_log("ai_error", {"attempt": attempt, "error": err_text})
+    except Exception:
+        pass
+
+    # 最大リトライ回数に達したか確認
+    if attempt == max_retries:
+        print("[!] 最大リトライ到達。空の結果を返します。")
+        try:
+            retry_helper.metrics_log("ai_final_failure", {"attempts": attempt, "error": err_text})
+        except Exception:
+            pass
+        return None
+
+    # レート制限 (429等) によるエラーかどうかを判定
+    is_rate_limit = retry_helper.should_retry_on_error(err_text)
+    
+    if is_rate_limit:
+        # 以降のリクエスト全体の送信ペースを自動的に落とす
+        if "429" in err_text or "resource_exhausted" in err_text.lower():
+            limiter.on_rate_limited()
+        try:
+            retry_helper.metrics_log("ai_rate_limit", {"attempt": attempt})
+        except Exception:
+            pass
+
+    # 待機時間を計算
+    backoff_result = retry_helper.calculate_backoff(attempt, is_rate_limit, config)
+    
+    # calculate_backoff がタプル (backoff, jitter, sleep_time) か単一の数値を返すかに対応
+    if isinstance(backoff_result, tuple):
+        backoff, jitter, sleep_time = backoff_result
+    else:
+        sleep_time = backoff_result
+        backoff = None
+    
+    retry_helper.log_retry_attempt(attempt, max_retries, err_text, sleep_time, backoff)
+    return sleep_time
+
+
+def _lookup_cache(config: Dict[str, Any], model_name: str, prompt: str, json_mode: bool, use_cache: bool, cache_slot: int | None = None) -> Tuple[ResponseCache | None, str, str | None]:
+    """応答キャッシュを参照し、(キャッシュ, キー, ヒットした応答) を返します。
+
+    同じプロンプトから複数件の異なる応答を得る場合は、cache_slot（何件目か）をキーに含めて
+    件ごとに別のエントリとして扱います。
+    """
+    try:
+        cache = get_response_cache(config)
+    except Exception:
+        cache = None
+    if cache is None:
+        return None, "", None
+    params: Dict[str, Any] = {"json_mode": json_mode}
+    if cache_slot is not None:
+        params["slot"] = cache_slot
+    key = ResponseCache.make_key(model_name, prompt, params)
+    if not use_cache:
+        return cache, key, None
+    try:
+        cached = cache.get(key)
+    except Exception:
+        # キャッシュの破損等で生成自体を止めないよう、参照失敗はミスとして扱う
+        cached = None
+    if cached:
+        try:
+            retry_helper.metrics_log("ai_cache_hit", {"model": model_name})
+        except Exception:
+            pass
+    return cache, key, cached
+
+
+def _store_cache(cache: ResponseCache | None, key: str, text: str) -> None:
+    """空でない応答をキャッシュに保存します（保存失敗は無視）。"""
+    if cache is None or not text:
+        return
+    try:
+        cache.put(key, text)
+    except Exception:
+        pass
+
+
+def generate_with_retry(client: genai.Client, prompt: str, config: Dict[str, Any], json_mode: bool = False, use_cache: bool = True, cache_slot: int | None = None) -> str:
     """
     指数バックオフとジッター再試行ロジックを用いて、AI からコンテンツを生成します。
     
@@ -45,12 +182,25 @@ def generate_with_retry(client: genai.Client, prompt: str, config: Dict[str, Any
         client: Google 外部 AI クライアント
         prompt: 生成用のプロンプトテキスト
         config: generation_policy.yaml から読み込まれた再試行設定を含む辞書
-                期待されるキー: max_retries, model_name, retry_base_backoff 等
+                期待されるキー: max_retries, model_name, retry_base_backoff, rate_limit 等
+        json_mode: True の場合は JSON 形式 (application/json) の応答を要求します
+        use_cache: False の場合はキャッシュを参照せずに再生成します（結果は上書き保存）。
+                   検証に失敗した応答の再生成時に指定します
+        cache_slot: 同じプロンプトで複数件を生成する場合の何件目か。キャッシュのキーに含め、
+                    件ごとに異なる応答を保存します（None の場合はプロンプトのみで識別）
     
     Returns:
         生成されたテキスト。すべての再試行が失敗した場合は空文字列を返します。
     """
     max_retries = config.get("max_retries", 8)
+    model_name = config.get("model_name", "gemini-2.0-flash")
+    # response_cache が有効なセクションでは、同じ入力の応答を API 呼び出しなしで再利用
+    cache, cache_key, cached = _lookup_cache(config, model_name, prompt, json_mode, use_cache, cache_slot)
+    if cached:
+        return cached
+    # モデルごとに共有される RPM / TPM / 同時実行数の予算
+    limiter = get_rate_limiter(model_name, config)
+    estimated_tokens = estimate_tokens(prompt, config)
     
     for attempt in range(1, max_retries + 1):
         try:
@@ -60,69 +210,90 @@ def generate_with_retry(client: genai.Client, prompt: str, config: Dict[str, Any
             except Exception:
                 pass
             
-            # APIの呼び出し間隔を厳密に管理 (429エラー防止)
-            _enforce_rate_limit()
+            # 予算内で同時実行枠とレート枠を確保してから AI への生成リクエストを実行 (429エラー防止)
+            with limiter.slot(estimated_tokens):
+                response = client.models.generate_content(
+                    model=model_name,
+                    contents=prompt,
+                    config=_content_config(json_mode)
+                )
 
-            # AI への生成リクエスト実行
-            model_name = config.get("model_name", "gemini-2.0-flash")
-            response = client.models.generate_content(
-                model=model_name,
-                contents=prompt
-            )
+            actual_tokens = _usage_tokens(response)
+            if actual_tokens:
+                limiter.record_tokens(actual_tokens - estimated_tokens)
+            limiter.on_success()
 
             # 正常な応答の処理
-            if hasattr(response, "text") and response.text:
-                try:
-                    retry_helper.metrics_log("ai_success", {"attempts": attempt})
-                except Exception:
-                    pass
-                return response.text.strip()
-            else:
-                # text 属性がない場合のフォールバック（候補から直接取得）
-                try:
-                    retry_helper.metrics_log("ai_success", {"attempts": attempt})
-                except Exception:
-                    pass
-                return response.candidates[0].content.parts[0].text.strip()
+            text = _extract_text(response, attempt)
+            _store_cache(cache, cache_key, text)
+            return text
 
         except Exception as e:
-            # エラー情報の取得とログ記録
-            err_text = str(e)
-            
+            # エラー情報の取得とログ記録、待機時間の計算
+            sleep_time = _handle_error(str(e), attempt, max_retries, limiter, config)
+            if sleep_time is None:
+                return ""
+            time.sleep(sleep_time)
+
+    return ""
+
+
+async def generate_with_retry_async(client: genai.Client, prompt: str, config: Dict[str, Any], json_mode: bool = False, use_cache: bool = True, cache_slot: int | None = None) -> str:
+    """
+    generate_with_retry の非同期版。genai の非同期クライアント (client.aio) を使用します。
+
+    同期版と同じモデル別リミッターを共有するため、スレッドと非同期タスクが混在しても
+    RPM / TPM / 同時実行数の予算は全体で守られます。
+    
+    Args:
+        client: Google 外部 AI クライアント
+        prompt: 生成用のプロンプトテキスト
+        config: generation_policy.yaml から読み込まれた再試行設定を含む辞書
+        json_mode: True の場合は JSON 形式 (application/json) の応答を要求します
+        use_cache: False の場合はキャッシュを参照せずに再生成します（結果は上書き保存）。
+                   検証に失敗した応答の再生成時に指定します
+        cache_slot: 同じプロンプトで複数件を生成する場合の何件目か。キャッシュのキーに含め、
+                    件ごとに異なる応答を保存します（None の場合はプロンプトのみで識別）
+    
+    Returns:
+        生成されたテキスト。すべての再試行が失敗した場合は空文字列を返します。
+    """
+    max_retries = config.get("max_retries", 8)
+    model_name = config.get("model_name", "gemini-2.0-flash")
+    # response_cache が有効なセクションでは、同じ入力の応答を API 呼び出しなしで再利用
+    cache, cache_key, cached = _lookup_cache(config, model_name, prompt, json_mode, use_cache, cache_slot)
+    if cached:
+        return cached
+    limiter = get_rate_limiter(model_name, config)
+    estimated_tokens = estimate_tokens(prompt, config)
+
+    for attempt in range(1, max_retries + 1):
+        try:
             try:
-                retry_helper.metrics_log("ai_error", {"attempt": attempt, "error": err_text})
+                retry_helper.metrics_log("ai_request_start", {"attempt": attempt})
             except Exception:
                 pass
 
-            # 最大リトライ回数に達したか確認
-            if attempt == max_retries:
-                print("[!] 最大リトライ到達。空の結果を返します。")
-                try:
-                    retry_helper.metrics_log("ai_final_failure", {"attempts": attempt, "error": err_text})
-                except Exception:
-                    pass
-                return ""
+            async with limiter.slot_async(estimated_tokens):
+                response = await client.aio.models.generate_content(
+                    model=model_name,
+                    contents=prompt,
+                    config=_content_config(json_mode)
+                )
 
-            # レート制限 (429等) によるエラーかどうかを判定
-            is_rate_limit = retry_helper.should_retry_on_error(err_text)
-            
-            if is_rate_limit:
-                try:
-                    retry_helper.metrics_log("ai_rate_limit", {"attempt": attempt})
-                except Exception:
-                    pass
-
-            # 待機時間を計算し、スリープを実行
-            backoff_result = retry_helper.calculate_backoff(attempt, is_rate_limit, config)
-            
-            # calculate_backoff がタプル (backoff, jitter, sleep_time) か単一の数値を返すかに対応
-            if isinstance(backoff_result, tuple):
-                backoff, jitter, sleep_time = backoff_result
-            else:
-                sleep_time = backoff_result
-                backoff = None
-            
-            retry_helper.log_retry_attempt(attempt, max_retries, err_text, sleep_time, backoff)
-            time.sleep(sleep_time)
+            actual_tokens = _usage_tokens(response)
+            if actual_tokens:
+                limiter.record_tokens(actual_tokens - estimated_tokens)
+            limiter.on_success()
+
+            text = _extract_text(response, attempt)
+            _store_cache(cache, cache_key, text)
+            return text
+
+        except Exception as e:
+            sleep_time = _handle_error(str(e), attempt, max_retries, limiter, config)
+            if sleep_time is None:
+                return ""
+            await asyncio.sleep(sleep_time)
 
     return ""
@@ -0,0 +1,112 @@
+"""
+非同期生成エンジンモジュール。
+全アカウント・全テーマの AI 呼び出しを 1 つのイベントループ上で同時にスケジュールし、
+モデル別の共有レート予算のもとで結果をアカウントごとに返します。
+"""
+import asyncio
+import logging
+from typing import Dict, List, Any, Callable, Awaitable, Optional, Tuple
+from ai_helpers import generate_with_retry_async
+
+
+# アカウントごとのジョブ: 引数なしで呼び出すとコルーチンを返す関数のリスト
+JobFactory = Callable[[], Awaitable[Any]]
+
+
+class AsyncGenerationEngine:
+    """genai の非同期クライアントを用いて、大量のプロンプトを並行実行するエンジン。
+
+    同時実行数と送信ペースは rate_limiter のモデル別予算で制御されるため、
+    エンジン側ではジョブをすべて一度に投入するだけで、アカウントを増やすほど
+    予算いっぱいまでスループットが上がります。
+    """
+
+    def __init__(self, client, logger: Optional[logging.Logger] = None):
+        """初期化。
+
+        Args:
+            client: Google 外部 AI クライアント（client.aio を使用）
+            logger: 進捗を記録するロガー
+        """
+        self.client = client
+        self.logger = logger or logging.getLogger(__name__)
+
+    async def generate(self, prompt: str, config: Dict[str, Any], json_mode: bool = False, use_cache: bool = True, cache_slot: Optional[int] = None) -> str:
+        """共有レート予算のもとで 1 件のプロンプトを生成します。
+
+        Args:
+            prompt: 生成用のプロンプトテキスト
+            config: generation_policy.yaml のセクション辞書
+            json_mode: True の場合は JSON 形式の応答を要求します
+            use_cache: False の場合は応答キャッシュを参照せずに再生成します
+            cache_slot: 同じプロンプトで複数件を生成する場合の何件目か（キャッシュのキーに含めます）
+
+        Returns:
+            生成されたテキスト。失敗時は空文字列
+        """
+        return await generate_with_retry_async(self.client, prompt, config, json_mode=json_mode, use_cache=use_cache, cache_slot=cache_slot)
+
+    def run(
+        self,
+        jobs: Dict[str, List[JobFactory]],
+        on_account_done: Optional[Callable[[str, List[Any]], None]] = None
+    ) -> Dict[str, List[Any]]:
+        """全アカウントのジョブを同時にスケジュールし、完了まで待機します。
+
+        Args:
+            jobs: アカウント名からジョブのリストへのマッピング
+            on_account_done: アカウントのジョブがすべて完了した時点で呼ばれるコールバック
+                             (アカウント名, 投入順の結果リスト) を受け取ります
+
+        Returns:
+            アカウント名から投入順の結果リストへのマッピング。
+            例外で失敗したジョブの結果は None になります。
+        """
+        return asyncio.run(self._run_all(jobs, on_account_done))
+
+    async def _run_job(self, account: str, index: int, job: JobFactory) -> Tuple[str, int, Any]:
+        """1 件のジョブを実行し、例外はログに記録して None として返します。"""
+        try:
+            return account, index, await job()
+        except Exception as e:
+            self.logger.error(f"非同期ジョブでエラーが発生しました: {account} #{index + 1} - {e}")
+            return account, index, None
+
+    async def _run_all(
+        self,
+        jobs: Dict[str, List[JobFactory]],
+        on_account_done: Optional[Callable[[str, List[Any]], None]]
+    ) -> Dict[str, List[Any]]:
+        """すべてのジョブをタスク化し、完了順に結果をアカウントへ振り分けます。"""
+        results: Dict[str, List[Any]] = {account: [None] * len(js) for account, js in jobs.items()}
+        remaining: Dict[str, int] = {account: len(js) for account, js in jobs.items()}
+
+        # ジョブが 0 件のアカウントは即座に完了扱い
+        for account, count in remaining.items():
+            if count == 0 and on_account_done:
+                on_account_done(account, [])
+
+        tasks = [
+            asyncio.create_task(self._run_job(account, i, job))
+            for account, js in jobs.items()
+            for i, job in enumerate(js)
+        ]
+        total = len(tasks)
+        self.logger.info(f"非同期生成を開始します: {len(jobs)} アカウント / {total} ジョブ")
+
+        done_count = 0
+        for finished in asyncio.as_completed(tasks):
+            account, index, result = await finished
+            results[account][index] = result
+            remaining[account] -= 1
+            done_count += 1
+            self.logger.debug(f"ジョブ完了 ({done_count}/{total}): {account} #{index + 1}")
+
+            # アカウント単位で結果が揃い次第、呼び出し側へストリーミング
+            if remaining[account] == 0 and on_account_done:
+                try:
+                    on_account_done(account, results[account])
+                except Exception as e:
+                    self.logger.error(f"アカウント '{account}' の出力処理に失敗しました: {e}")
+
+        return results
@@ -0,0 +1,183 @@
+"""
+チェックポイント管理モジュール。
+パイプラインの実行ごとに、ステージ・アカウント単位の処理状況と出力ファイルのハッシュを
+マニフェスト (JSON) として記録し、失敗した単位のみを再実行 (--resume) できるようにします。
+"""
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+
+DEFAULT_CHECKPOINT_DIR: str = "../data/checkpoints"
+
+STATUS_DONE = "done"
+STATUS_PARTIAL = "partial"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+
+def file_sha256(path: str) -> Optional[str]:
+    """ファイル内容の SHA-256 を返します。ファイルが存在しない場合は None。"""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def count_post_lines(path: str) -> Dict[str, int]:
+    """ポスト出力ファイルの総件数と、生成に失敗した件数を数えます。
+
+    Args:
+        path: 1 行 1 ポストの出力ファイル
+
+    Returns:
+        {"total": 総件数, "failed": "[AIエラー]" で始まる、または空の行の件数}
+    """
+    total = 0
+    failed = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            total += 1
+            text = line.strip()
+            if not text or text.startswith("[AIエラー]"):
+                failed += 1
+    return {"total": total, "failed": failed}
+
+
+class RunCheckpoint:
+    """1 回のパイプライン実行に対応するチェックポイントマニフェスト。
+
+    マニフェストはステージ → アカウント → 状態 (status, output, sha256, items) の階層で保存され、
+    更新のたびに一時ファイル経由で原子的に書き出されます。
+    """
+
+    def __init__(self, run_id: str, checkpoint_dir: str = DEFAULT_CHECKPOINT_DIR, data: Optional[Dict[str, Any]] = None):
+        """初期化。
+
+        Args:
+            run_id: 実行 ID（マニフェストのファイル名に使用）
+            checkpoint_dir: マニフェストを保存するディレクトリ
+            data: 既存マニフェストの内容（再開時）
+        """
+        self.run_id = run_id
+        self.checkpoint_dir = checkpoint_dir
+        self.path = os.path.join(checkpoint_dir, f"run_{run_id}.json")
+        self._lock = threading.Lock()
+        self.data: Dict[str, Any] = data or {
+            "run_id": run_id,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "status": "running",
+            "stages": {}
+        }
+
+    @classmethod
+    def start_new(cls, checkpoint_dir: str = DEFAULT_CHECKPOINT_DIR) -> "RunCheckpoint":
+        """新しい実行のマニフェストを作成して保存します。"""
+        run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        checkpoint = cls(run_id, checkpoint_dir)
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def load_latest(cls, checkpoint_dir: str = DEFAULT_CHECKPOINT_DIR) -> Optional["RunCheckpoint"]:
+        """完了していない直近の実行マニフェストを読み込みます。
+
+        Returns:
+            再開可能なマニフェスト。存在しない場合は None
+        """
+        if not os.path.isdir(checkpoint_dir):
+            return None
+        manifests = sorted(
+            f for f in os.listdir(checkpoint_dir)
+            if f.startswith("run_") and f.endswith(".json")
+        )
+        if not manifests:
+            return None
+        path = os.path.join(checkpoint_dir, manifests[-1])
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("status") == "completed":
+            return None
+        return cls(data["run_id"], checkpoint_dir, data)
+
+    def save(self) -> None:
+        """マニフェストを一時ファイル経由で原子的に書き出します。"""
+        with self._lock:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def _set_unit(self, stage: str, account: str, unit: Dict[str, Any]) -> None:
+        """ステージ・アカウント単位の状態を更新して保存します。"""
+        unit["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            self.data["stages"].setdefault(stage, {})[account] = unit
+        self.save()
+
+    def get_unit(self, stage: str, account: str) -> Dict[str, Any]:
+        """ステージ・アカウント単位の状態を取得します（未記録の場合は空の辞書）。"""
+        with self._lock:
+            return dict(self.data["stages"].get(stage, {}).get(account, {}))
+
+    def is_done(self, stage: str, account: str) -> bool:
+        """単位が完了済みで、記録時の出力ファイルが変更されずに残っているかを判定します。
+
+        対象外としてスキップした単位 (skipped) も完了済みとして扱います。
+        """
+        unit = self.get_unit(stage, account)
+        if unit.get("status") == STATUS_SKIPPED:
+            return True
+        if unit.get("status") != STATUS_DONE:
+            return False
+        output = unit.get("output")
+        if output and file_sha256(output) != unit.get("sha256"):
+            return False
+        return True
+
+    def pending(self, stage: str, accounts: List[str]) -> List[str]:
+        """指定したアカウントのうち、再実行が必要な（未完了または失敗した）ものを返します。"""
+        return [a for a in accounts if not self.is_done(stage, a)]
+
+    def mark_done(self, stage: str, account: str, output: Optional[str] = None, items: Optional[Dict[str, int]] = None) -> None:
+        """単位の完了を記録します。失敗件数を含む場合は partial として記録し、再開時の対象にします。
+
+        Args:
+            stage: ステージ名
+            account: アカウント名
+            output: 出力ファイルのパス
+            items: {"total": 件数, "failed": 失敗件数} の集計
+        """
+        status = STATUS_PARTIAL if items and items.get("failed") else STATUS_DONE
+        self._set_unit(stage, account, {
+            "status": status,
+            "output": output,
+            "sha256": file_sha256(output) if output else None,
+            "items": items or {}
+        })
+
+    def mark_failed(self, stage: str, account: str, error: str) -> None:
+        """単位の失敗を記録します。"""
+        self._set_unit(stage, account, {"status": STATUS_FAILED, "error": error})
+
+    def mark_skipped(self, stage: str, account: str, reason: str) -> None:
+        """入力が無い等の理由でステージの対象外としたことを記録します（失敗としては扱いません）。"""
+        self._set_unit(stage, account, {"status": STATUS_SKIPPED, "reason": reason})
+
+    def is_skipped(self, stage: str, account: str) -> bool:
+        """単位が対象外としてスキップされたかを判定します。"""
+        return self.get_unit(stage, account).get("status") == STATUS_SKIPPED
+
+    def complete(self) -> None:
+        """実行全体の完了を記録します。完了済みのマニフェストは再開の対象になりません。"""
+        with self._lock:
+            self.data["status"] = "completed"
+            self.data["completed_at"] = datetime.now().isoformat(timespec="seconds")
+        self.save()
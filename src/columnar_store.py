@@ -0,0 +1,230 @@
+"""
+列指向ストレージモジュール。
+ステージ間で受け渡す商品情報・生成済みポストを、型付きの列を持つ Parquet / Arrow IPC ファイルとして
+data/input・data/output の CSV / テキストと並行して保存し、複数回の実行をまたいだ集計を
+1 回のスキャンで行えるようにします（pyarrow がインストールされている場合のみ有効）。
+"""
+import os
+import glob
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.dataset as ds  # type: ignore
+    import pyarrow.ipc as ipc  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:  # 列指向ストレージは任意機能
+    pa = None
+
+
+DEFAULT_COLUMNAR_DIR: str = "../data/columnar"
+
+# storage.format の値 → ファイル拡張子（csv は列指向ストレージを使用しない）
+_EXTENSIONS: Dict[str, str] = {
+    "parquet": "parquet",
+    "arrow": "arrow",
+}
+
+DATASET_PRODUCTS = "products"
+DATASET_AFFILIATE_POSTS = "affiliate_posts"
+DATASET_NORMAL_POSTS = "normal_posts"
+
+
+def _schemas() -> Dict[str, Any]:
+    """データセットごとのスキーマ（pyarrow の読み込み後に作成）。"""
+    product_fields = [
+        ("name", pa.string()),
+        ("url", pa.string()),
+        ("image_url", pa.string()),
+        ("price", pa.int64()),
+        ("review_average", pa.float64()),
+        ("review_count", pa.int64()),
+        ("point_rate", pa.int32()),
+    ]
+    return {
+        DATASET_PRODUCTS: pa.schema(product_fields + [
+            ("fetched_at", pa.timestamp("s")),
+        ]),
+        DATASET_AFFILIATE_POSTS: pa.schema(product_fields + [
+            ("short_url", pa.string()),
+            ("post", pa.string()),
+            ("status", pa.string()),
+            ("attempts", pa.int32()),
+            ("generated_at", pa.timestamp("s")),
+        ]),
+        DATASET_NORMAL_POSTS: pa.schema([
+            ("post", pa.string()),
+            ("status", pa.string()),
+            ("generated_at", pa.timestamp("s")),
+        ]),
+    }
+
+
+class ColumnarStore:
+    """データセット / account=<アカウント> / run=<実行ID> / data.<拡張子> の Hive 形式で保存する列指向ストア。
+
+    アカウントと実行 ID はパーティション列として扱われるため、データセット全体をスキャンすると
+    全アカウント・全実行の履歴を 1 つのテーブルとして、必要な列だけ読み込めます。
+    """
+
+    def __init__(self, base_dir: str = DEFAULT_COLUMNAR_DIR, fmt: str = "parquet"):
+        """初期化。
+
+        Args:
+            base_dir: データセットを保存するディレクトリ
+            fmt: ファイル形式 ("parquet" または "arrow")
+        """
+        if pa is None:
+            raise RuntimeError("列指向ストレージを使用するには pyarrow をインストールしてください")
+        if fmt not in _EXTENSIONS:
+            raise ValueError(f"未対応のファイル形式です: {fmt}")
+        self.base_dir = base_dir
+        self.fmt = fmt
+        self.schemas = _schemas()
+
+    def _partition_dir(self, dataset: str, account: str) -> str:
+        return os.path.join(self.base_dir, dataset, f"account={account}")
+
+    def write(self, dataset: str, account: str, records: List[Dict[str, Any]], run_id: Optional[str] = None) -> str:
+        """レコードをデータセットのスキーマに沿って型付きで保存します。
+
+        Args:
+            dataset: データセット名（DATASET_* 定数）
+            account: アカウント名（パーティション）
+            records: 列名 → 値の辞書のリスト（スキーマに無い列は無視されます）
+            run_id: 実行 ID（省略時は現在時刻）
+
+        Returns:
+            保存したファイルのパス
+        """
+        schema = self.schemas[dataset]
+        run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        table = pa.Table.from_pylist(records, schema=schema)
+
+        partition_dir = os.path.join(self._partition_dir(dataset, account), f"run={run_id}")
+        os.makedirs(partition_dir, exist_ok=True)
+        path = os.path.join(partition_dir, f"data.{_EXTENSIONS[self.fmt]}")
+        # "." で始まる一時ファイルはデータセットのスキャン対象外
+        tmp_path = os.path.join(partition_dir, f".data.{_EXTENSIONS[self.fmt]}.tmp")
+        if self.fmt == "parquet":
+            pq.write_table(table, tmp_path, compression="zstd")
+        else:
+            with pa.OSFile(tmp_path, "wb") as sink, ipc.new_file(sink, schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        return path
+
+    def _read_file(self, path: str, columns: Optional[List[str]]) -> Any:
+        if path.endswith(".parquet"):
+            return pq.read_table(path, columns=columns)
+        with pa.memory_map(path, "r") as source:
+            table = ipc.open_file(source).read_all()
+        return table.select(columns) if columns else table
+
+    def read_latest(self, dataset: str, account: str, columns: Optional[List[str]] = None) -> Any:
+        """アカウントの最新の実行分を、指定した列だけ読み込みます。
+
+        Returns:
+            pyarrow.Table。保存済みのファイルが無い場合は None
+        """
+        files = sorted(
+            glob.glob(os.path.join(self._partition_dir(dataset, account), "run=*", f"data.{_EXTENSIONS[self.fmt]}"))
+        )
+        if not files:
+            return None
+        return self._read_file(files[-1], columns)
+
+    def scan(self, dataset: str, columns: Optional[List[str]] = None, filter: Any = None) -> Any:
+        """データセットの全アカウント・全実行分を 1 つのテーブルとして読み込みます。
+
+        Args:
+            dataset: データセット名
+            columns: 読み込む列（account / run のパーティション列も指定可能）
+            filter: pyarrow.dataset の式（例: ds.field("status") == "failed"）
+
+        Returns:
+            pyarrow.Table
+        """
+        dataset_dir = os.path.join(self.base_dir, dataset)
+        if not os.path.isdir(dataset_dir):
+            return self.schemas[dataset].empty_table()
+        source = ds.dataset(
+            dataset_dir,
+            format="parquet" if self.fmt == "parquet" else "ipc",
+            partitioning="hive",
+            exclude_invalid_files=True
+        )
+        return source.to_table(columns=columns, filter=filter)
+
+
+# ディレクトリ・形式ごとに共有されるストア
+_stores: Dict[tuple, ColumnarStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_columnar_store(policy: Dict[str, Any]) -> Optional[ColumnarStore]:
+    """generation_policy.yaml の storage セクションに対応する共有ストアを取得します。
+
+    storage.format が "parquet" または "arrow" の場合のみ有効です。既定の "csv" では
+    従来どおり CSV / テキストのみを出力します。pyarrow が無い場合は警告を出して CSV のみで続行します。
+
+    Args:
+        policy: generation_policy.yaml 全体の辞書。storage キー配下の format, dir を参照します
+
+    Returns:
+        共有の ColumnarStore インスタンス。無効の場合は None
+    """
+    settings = policy.get("storage") or {}
+    fmt = settings.get("format", "csv")
+    if fmt == "csv":
+        return None
+    if pa is None:
+        print("[WARN] pyarrow がインストールされていないため、列指向ストレージへの保存をスキップします")
+        return None
+    key = (settings.get("dir", DEFAULT_COLUMNAR_DIR), fmt)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = ColumnarStore(base_dir=key[0], fmt=fmt)
+            _stores[key] = store
+        return store
+
+
+def write_safely(store: Optional[ColumnarStore], dataset: str, account: str, records: List[Dict[str, Any]]) -> None:
+    """列指向ストアへの保存を試み、失敗しても CSV / テキスト側の処理を止めないようにします。"""
+    if store is None:
+        return
+    try:
+        path = store.write(dataset, account, records)
+        print(f"  [INFO] 列指向ストアに保存しました → {path}")
+    except Exception as e:
+        print(f"  [WARN] 列指向ストアへの保存に失敗しました ({dataset}/{account}): {e}")
+
+
+def main() -> None:
+    """保存済みの履歴をアカウント・ステータスごとに集計して表示します。"""
+    from di_container import get_container
+
+    parser = argparse.ArgumentParser(description="列指向ストアに保存された生成履歴を集計します")
+    parser.add_argument("dataset", nargs="?", default=DATASET_AFFILIATE_POSTS,
+                        choices=[DATASET_PRODUCTS, DATASET_AFFILIATE_POSTS, DATASET_NORMAL_POSTS])
+    args = parser.parse_args()
+
+    store = get_columnar_store(get_container().get_generation_policy())
+    if store is None:
+        print("storage.format が parquet / arrow ではないため、集計対象がありません")
+        return
+
+    keys = ["account"] if args.dataset == DATASET_PRODUCTS else ["account", "status"]
+    table = store.scan(args.dataset, columns=keys + ["run"])
+    summary = table.group_by(keys).aggregate([("run", "count"), ("run", "count_distinct")])
+    for row in summary.sort_by([(k, "ascending") for k in keys]).to_pylist():
+        label = " / ".join(str(row[k]) for k in keys)
+        print(f"{label}: {row['run_count']} 件（{row['run_count_distinct']} 回の実行）")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,10 @@ rktn プロジェクト用 依存性の注入 (DI) モジュール。
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 import logging
+import threading
 from config_loader import load_generation_policy, load_secrets, load_accounts, load_themes
 from ai_helpers import create_ai_client
+from http_helpers import create_http_session
 from logging_provider import DefaultLoggerProvider, LoggerProvider
 
 
@@ -94,6 +96,38 @@ class DefaultAIClientProvider(AIClientProvider):
         return self._client
 
 
+class HttpSessionProvider(ABC):
+    """HTTP セッションを供給するための抽象インターフェース。"""
+    
+    @abstractmethod
+    def get_session(self):
+        """共有の HTTP セッションを取得します。"""
+        pass
+
+
+class DefaultHttpSessionProvider(HttpSessionProvider):
+    """生成ポリシーの rakuten_api 設定から接続プール付きセッションを生成するデフォルト実装。"""
+    
+    def __init__(self, config_provider: ConfigProvider):
+        """設定プロバイダーを指定して初期化します。"""
+        self.config_provider = config_provider
+        self._session = None
+        self._lock = threading.Lock()
+    
+    def get_session(self):
+        """接続プールのサイズや再試行回数を設定から読み取り、セッションを初期化して返します。"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    api_config = self.config_provider.get_generation_policy().get("rakuten_api", {}) or {}
+                    self._session = create_http_session(
+                        pool_size=api_config.get("pool_size", 10),
+                        connect_retries=api_config.get("connect_retries", 3),
+                        backoff_factor=api_config.get("connect_backoff_factor", 0.5)
+                    )
+        return self._session
+
+
 class DIContainer:
     """アプリケーション全体の依存関係を集約管理するコンテナ。"""
     
@@ -101,7 +135,8 @@ class DIContainer:
         self,
         config_provider: Optional[ConfigProvider] = None,
         ai_client_provider: Optional[AIClientProvider] = None,
-        logger_provider: Optional[LoggerProvider] = None
+        logger_provider: Optional[LoggerProvider] = None,
+        http_session_provider: Optional[HttpSessionProvider] = None
     ):
         """
         各プロバイダーを初期化します。指定がない場合はデフォルトの実装が使用されます。
@@ -109,6 +144,7 @@ class DIContainer:
         self.config_provider = config_provider or DefaultConfigProvider()
         self.ai_client_provider = ai_client_provider or DefaultAIClientProvider(self.config_provider)
         self.logger_provider = logger_provider or DefaultLoggerProvider()
+        self.http_session_provider = http_session_provider or DefaultHttpSessionProvider(self.config_provider)
     
     def get_config_provider(self) -> ConfigProvider:
         """設定プロバイダーを取得します。"""
@@ -122,6 +158,14 @@ class DIContainer:
         """ロギングプロバイダーを取得します。"""
         return self.logger_provider
     
+    def get_http_session_provider(self) -> HttpSessionProvider:
+        """HTTP セッションプロバイダーを取得します。"""
+        return self.http_session_provider
+    
+    def get_http_session(self):
+        """シングルトンとして管理されている HTTP セッションを取得します。"""
+        return self.http_session_provider.get_session()
+    
     def get_ai_client(self):
         """シングルトンとして管理されている AI クライアントを取得します。"""
         return self.ai_client_provider.get_client()
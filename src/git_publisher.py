@@ -0,0 +1,220 @@
+"""
+Git 公開モジュール。
+リダイレクトページのマニフェストに記録された未公開の変更（書き込み・削除したファイル）だけを
+ステージして 1 回のコミットにまとめ、プッシュを同期またはバックグラウンドで行います。
+コミット・プッシュに失敗した変更はマニフェストに残り、次回の公開時に再試行されます。
+"""
+import os
+import time
+import logging
+import argparse
+import threading
+import subprocess
+from typing import Dict, List, Any, Optional
+from page_manifest import PageManifest
+
+
+PUSH_SYNC = "sync"
+PUSH_BACKGROUND = "background"
+
+# マニフェストのメタ情報のキー
+_META_PUSH_PENDING = "publish.push_pending"
+_META_LAST_ERROR = "publish.last_error"
+
+
+class GitPublisher:
+    """未公開の変更を 1 コミットにまとめて Git リポジトリへ公開するクラス。
+
+    作業ツリー全体はステージせず、マニフェストに記録されたファイルだけをコミット対象にします。
+    bare_repo を指定した場合は、リモートの代わりにローカルの bare リポジトリへプッシュします（動作確認用）。
+    """
+
+    def __init__(
+        self,
+        manifest: PageManifest,
+        repo_dir: Optional[str] = None,
+        remote: str = "origin",
+        branch: Optional[str] = None,
+        push_mode: str = PUSH_SYNC,
+        bare_repo: Optional[str] = None,
+        message: str = "AI auto post update",
+        logger: Optional[logging.Logger] = None
+    ):
+        """初期化。
+
+        Args:
+            manifest: 未公開の変更を記録しているマニフェスト
+            repo_dir: Git リポジトリのディレクトリ（None の場合はカレントディレクトリを含むリポジトリ）
+            remote: プッシュ先のリモート名
+            branch: プッシュ先のブランチ（None の場合は現在のブランチ）
+            push_mode: "sync"（公開処理の中でプッシュ）または "background"（別スレッドでプッシュ）
+            bare_repo: 動作確認用のローカル bare リポジトリのパス（指定時は remote より優先し、無ければ作成）
+            message: コミットメッセージ
+            logger: 進捗を記録するロガー
+        """
+        if push_mode not in (PUSH_SYNC, PUSH_BACKGROUND):
+            raise ValueError(f"未対応のプッシュ方式です: {push_mode}")
+        self.manifest = manifest
+        self.repo_dir = repo_dir
+        self.remote = remote
+        self.branch = branch
+        self.push_mode = push_mode
+        self.bare_repo = bare_repo
+        self.message = message
+        self.logger = logger or logging.getLogger(__name__)
+        self._push_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _git(self, *args: str, input: Optional[str] = None) -> str:
+        command = ["git"] + (["-C", self.repo_dir] if self.repo_dir else []) + list(args)
+        result = subprocess.run(command, input=input, capture_output=True, text=True, check=True)
+        return result.stdout
+
+    def _toplevel(self) -> str:
+        return self._git("rev-parse", "--show-toplevel").strip()
+
+    def _commit(self, paths: List[str]) -> bool:
+        """変更のあったファイルだけをステージして 1 回コミットします。
+
+        Returns:
+            コミットを作成した場合は True（ステージ後に差分が無かった場合は False）
+        """
+        root = self._toplevel()
+        relative = {path: os.path.relpath(path, root).replace(os.sep, "/") for path in paths}
+        existing = [relative[p] for p in paths if os.path.exists(p)]
+        deleted = [relative[p] for p in paths if not os.path.exists(p)]
+
+        # パスの数が多くてもコマンドラインの長さに収まるよう、パスは標準入力から NUL 区切りで渡す
+        if existing:
+            self._git("-C", root, "add", "--pathspec-from-file=-", "--pathspec-file-nul", input="\0".join(existing))
+        if deleted:
+            self._git("-C", root, "rm", "--cached", "--ignore-unmatch", "--quiet",
+                      "--pathspec-from-file=-", "--pathspec-file-nul", input="\0".join(deleted))
+
+        targets = set(relative.values())
+        staged = [p for p in self._git("-C", root, "diff", "--cached", "--name-only", "-z").split("\0") if p in targets]
+        if not staged:
+            return False
+        # コミット対象を今回のファイルに限定する（他にステージ済みの変更があっても含めない）
+        self._git("-C", root, "commit", "--quiet", "-m", self.message,
+                  "--pathspec-from-file=-", "--pathspec-file-nul", input="\0".join(staged))
+        return True
+
+    def ensure_bare_repo(self) -> None:
+        """動作確認用の bare リポジトリが無ければ作成します。"""
+        if self.bare_repo and not os.path.exists(self.bare_repo):
+            subprocess.run(["git", "init", "--bare", "--quiet", self.bare_repo], capture_output=True, check=True)
+
+    def _push(self) -> bool:
+        """プッシュを実行し、結果をマニフェストに記録します。"""
+        try:
+            branch = self.branch or self._git("rev-parse", "--abbrev-ref", "HEAD").strip()
+            if self.bare_repo:
+                self.ensure_bare_repo()
+                target = os.path.abspath(self.bare_repo)
+            else:
+                target = self.remote
+            started = time.monotonic()
+            self._git("push", "--quiet", target, f"HEAD:refs/heads/{branch}")
+            self.manifest.set_meta(_META_PUSH_PENDING, None)
+            self.manifest.set_meta(_META_LAST_ERROR, None)
+            self.logger.info(f"プッシュが完了しました ({target} {branch}, {time.monotonic() - started:.1f} 秒)")
+            return True
+        except Exception as e:
+            error = e.stderr.strip() if isinstance(e, subprocess.CalledProcessError) and e.stderr else str(e)
+            self.manifest.set_meta(_META_PUSH_PENDING, "1")
+            self.manifest.set_meta(_META_LAST_ERROR, error)
+            print(f"GitHub push エラー（次回の公開時に再試行します）: {error}")
+            self.logger.warning(f"プッシュに失敗しました（次回再試行）: {error}")
+            return False
+
+    def publish(self) -> bool:
+        """未公開の変更をコミットし、プッシュします。
+
+        前回のプッシュが失敗している場合は、新しい変更が無くてもプッシュを再試行します。
+        push_mode が "background" の場合、プッシュの完了を待たずに戻ります（wait で待機可能）。
+
+        Returns:
+            コミットまたはプッシュを開始した場合は True
+        """
+        with self._lock:
+            # 前回のバックグラウンドのプッシュが残っている場合は完了を待つ
+            self.wait()
+            paths = self.manifest.pending_changes()
+            committed = False
+            if paths:
+                try:
+                    committed = self._commit(paths)
+                except Exception as e:
+                    error = e.stderr.strip() if isinstance(e, subprocess.CalledProcessError) and e.stderr else str(e)
+                    self.manifest.set_meta(_META_LAST_ERROR, error)
+                    print(f"Git コミットエラー（次回の公開時に再試行します）: {error}")
+                    self.logger.warning(f"コミットに失敗しました（次回再試行）: {error}")
+                    return False
+                self.manifest.clear_changes(paths)
+                self.logger.info(f"{len(paths)} 件の変更をコミットしました" if committed else "コミット対象の差分はありません")
+            if not committed and not self.manifest.get_meta(_META_PUSH_PENDING):
+                return False
+
+            self.manifest.set_meta(_META_PUSH_PENDING, "1")
+            if self.push_mode == PUSH_BACKGROUND:
+                self._push_thread = threading.Thread(target=self._push, name="git-publisher-push")
+                self._push_thread.start()
+            else:
+                self._push()
+            return True
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """バックグラウンドのプッシュの完了を待ちます。"""
+        thread = self._push_thread
+        if thread is not None:
+            thread.join(timeout)
+            if not thread.is_alive():
+                self._push_thread = None
+
+
+def get_git_publisher(policy: Dict[str, Any], manifest: PageManifest, logger: Optional[logging.Logger] = None) -> GitPublisher:
+    """generation_policy.yaml の publish セクションに対応する公開処理を作成します。
+
+    Args:
+        policy: generation_policy.yaml 全体の辞書。publish キー配下の push, remote, branch, bare_repo, message を参照します
+        manifest: 未公開の変更を記録しているマニフェスト
+        logger: 進捗を記録するロガー
+
+    Returns:
+        GitPublisher インスタンス
+    """
+    settings = policy.get("publish") or {}
+    return GitPublisher(
+        manifest,
+        repo_dir=settings.get("repo_dir"),
+        remote=settings.get("remote", "origin"),
+        branch=settings.get("branch"),
+        push_mode=settings.get("push", PUSH_SYNC),
+        bare_repo=settings.get("bare_repo"),
+        message=settings.get("message", "AI auto post update"),
+        logger=logger
+    )
+
+
+def main() -> None:
+    """未公開の変更（前回失敗したコミット・プッシュを含む）を公開します。"""
+    from di_container import get_container
+    from page_manifest import get_page_manifest
+
+    parser = argparse.ArgumentParser(description="未公開のリダイレクトページの変更をコミット・プッシュします")
+    parser.add_argument("--bare-repo", help="リモートの代わりにプッシュするローカルの bare リポジトリ（動作確認用）")
+    args = parser.parse_args()
+
+    policy = get_container().get_generation_policy()
+    manifest = get_page_manifest(policy)
+    publisher = get_git_publisher(policy, manifest)
+    publisher.push_mode = PUSH_SYNC
+    if args.bare_repo:
+        publisher.bare_repo = args.bare_repo
+    print(f"未公開の変更: {len(manifest.pending_changes())} 件")
+    publisher.publish()
+
+
+if __name__ == "__main__":
+    main()
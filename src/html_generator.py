@@ -3,11 +3,20 @@ HTML 生成モジュール。
 OGP タグ（SNSでのプレビュー用）を含むリダイレクト HTML ページの作成を担当します。
 """
 import os
+import json
 import string
+import threading
 import random
+import tempfile
 import html as html_module
-from typing import Optional
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, List, Tuple
 import config_loader
+from product import Product
+from short_id import ShortIdAllocator, base36_digest
+from page_manifest import PageManifest, content_hash
+from html_layout import PageLayout
 
 # テスト環境などでモック化しやすくするため、モジュールレベルのラップ関数を提供します。
 def load_secrets():
@@ -26,121 +35,504 @@ def random_filename(length: int = 6) -> str:
     return ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
 
 
-def create_redirect_html(
-    url: str,
-    filename: str,
-    title: str = "商品詳細はこちら",
-    image_url: str = "",
-    output_dir: str = "../html",
-    price: str = "",
-    review_average: str = "0.0",
-    point_rate: str = "1"
-) -> None:
+# リダイレクトページのテンプレート（モジュール読み込み時に一度だけ作成）
+_REDIRECT_TEMPLATE = string.Template("""<!DOCTYPE html>
+<html lang="ja">
+  <head>
+    <meta charset="utf-8">
+    <meta http-equiv="X-UA-Compatible" content="IE=edge">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <title>${title}</title>
+    <meta property="og:title" content="${title}">
+    <meta property="og:description" content="${description}">
+    <meta property="og:image" content="${image_url}">
+    <meta property="og:type" content="product">
+    <meta property="og:url" content="${url}">
+    <meta name="twitter:card" content="summary_large_image">
+    <meta name="twitter:title" content="${title}">
+    <meta name="twitter:description" content="${description}">
+    <meta name="twitter:image" content="${image_url}">
+    <script>
+      // ブラウザでの転送処理
+      window.location.replace("${url}");
+    </script>
+  </head>
+  <body></body>
+</html>
+""")
+
+
+def redirect_fields(product: Product) -> Dict[str, str]:
     """
-    SNS でのプレビュー（OGP）に対応したリダイレクト HTML ページを作成します。
+    リダイレクト先の URL と OGP 項目（タイトル・説明・画像）を組み立てます（HTML エスケープ前）。
     
     Args:
-        url: 転送先のリダイレクト URL
-        filename: 保存するファイル名（拡張子なし）
-        title: OGP タグに使用する商品名（ベース）
-        image_url: OGP タグ（og:image）に使用する画像 URL
-        output_dir: HTML ファイルを保存する出力ディレクトリ
-        price: 価格情報
-        review_average: レビュー評価点
-        point_rate: ポイント倍率
+        product: 転送先 URL・商品名（OGP タイトルのベース）・画像・価格・評価を含む商品情報
+        
+    Returns:
+        title, description, image_url, url をキーとする辞書
     """
+    title = product.name or "商品詳細はこちら"
+
     # 魅力を伝えるためのプレフィックスを作成
     prefix_elements = []
-    if float(review_average) >= 4.0:
-        prefix_elements.append(f"★{review_average}")
-    if int(point_rate) > 1:
-        prefix_elements.append(f"pt{point_rate}倍")
+    if product.review_average >= 4.0:
+        prefix_elements.append(f"★{product.review_text}")
+    if product.point_rate > 1:
+        prefix_elements.append(f"pt{product.point_rate}倍")
     
     prefix = f"【{' / '.join(prefix_elements)}】" if prefix_elements else ""
     
-    # XSS を防止するため、属性値をエスケープします。
     # タイトルを装飾 (例: 【★4.8】商品名 - 楽天)
     decorated_title = f"{prefix}{title}"
-    safe_title = html_module.escape(decorated_title)
-    safe_image_url = html_module.escape(image_url) if image_url else ""
     
-    og_description = f"楽天 - {safe_title}"
-    if price:
-        og_description = f"価格: {price}円 | {og_description}"
+    og_description = f"楽天 - {decorated_title}"
+    if product.price_text:
+        og_description = f"価格: {product.price_text}円 | {og_description}"
+
+    return {
+        "title": decorated_title,
+        "description": og_description,
+        "image_url": product.image_url,
+        "url": product.url,
+    }
+
+
+def render_redirect_html(product: Product) -> str:
+    """
+    SNS でのプレビュー（OGP）に対応したリダイレクト HTML の内容を組み立てます。
     
-    # HTML コンテンツのテンプレート生成
-    html_content = f"""<!DOCTYPE html>
+    Args:
+        product: 転送先 URL・商品名（OGP タイトルのベース）・画像・価格・評価を含む商品情報
+        
+    Returns:
+        HTML 文字列
+    """
+    fields = redirect_fields(product)
+    # XSS を防止するため、属性値をエスケープします。
+    return _REDIRECT_TEMPLATE.substitute(
+        title=html_module.escape(fields["title"]),
+        description=html_module.escape(fields["description"]),
+        image_url=html_module.escape(fields["image_url"]),
+        url=fields["url"]
+    )
+
+
+def write_file_atomic(path: str, content: str) -> None:
+    """同じディレクトリの一時ファイルに書き込んでから置き換え、書きかけのファイルが公開されないようにします。"""
+    directory, name = os.path.split(path)
+    # 同じページを複数スレッドが同時に書き込んでも衝突しないよう、一時ファイル名は都度一意にする
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or ".")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def create_redirect_html(
+    product: Product,
+    filename: str,
+    output_dir: str = "../html",
+    layout: PageLayout | None = None
+) -> None:
+    """
+    SNS でのプレビュー（OGP）に対応したリダイレクト HTML ページを作成します。
+    
+    Args:
+        product: 転送先 URL・商品名（OGP タイトルのベース）・画像・価格・評価を含む商品情報
+        filename: 保存するファイル名（拡張子なし）
+        output_dir: HTML ファイルを保存する出力ディレクトリ
+        layout: ページの配置（指定した場合は output_dir より優先。None の場合は output_dir 直下）
+    """
+    layout = layout or PageLayout(output_dir)
+    try:
+        path = layout.path(filename)
+        # ディレクトリ（シャード配置の場合はサブディレクトリ）が存在しない場合は作成
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 指定されたファイル名で UTF-8 保存
+        write_file_atomic(path, render_redirect_html(product))
+    except Exception as e:
+        print(f"[ERROR] ファイル保存失敗: {e}")
+
+
+class RedirectPageWriter:
+    """リダイレクトページを一括生成するライタ。
+
+    base_url は生成時に一度だけ受け取り、ページの書き込みはワーカープールで並列に、
+    一時ファイル + rename による原子的な置き換えで行います。
+    id_allocator を指定した場合、ファイル名は転送先 URL ごとに一意で安定した短縮 ID になり、
+    同じ商品には実行をまたいで同じリンクが割り当てられます。
+    manifest を指定した場合、書き込んだページと今回使用したページを実行 ID とともに記録し（保持期間の索引）、
+    skip_unchanged が True であれば本文が前回の書き込みと同一のページは書き込みを省略するため、
+    公開先へのコミットには実際に変更されたページだけが含まれます。
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        output_dir: str = "../html",
+        max_workers: int = 8,
+        id_allocator: ShortIdAllocator | None = None,
+        manifest: PageManifest | None = None,
+        skip_unchanged: bool = True,
+        layout: PageLayout | None = None
+    ):
+        """初期化。
+        
+        Args:
+            base_url: 公開先のベース URL（secrets.yaml の base_url）
+            output_dir: HTML ファイルを保存するディレクトリ
+            max_workers: 書き込みを並列に行うワーカー数
+            id_allocator: 短縮 ID の割り当てに使用する索引（None の場合はランダムなファイル名）
+            manifest: 書き込み済みページの本文のハッシュと使用した実行を記録するマニフェスト
+            skip_unchanged: マニフェスト上の本文が同一のページの書き込みを省略するかどうか
+            layout: ページの配置（None の場合は output_dir 直下に置く従来の配置）
+        """
+        self.base_url = base_url.rstrip("/")
+        self.layout = layout or PageLayout(output_dir)
+        self.output_dir = self.layout.output_dir
+        self.max_workers = max(1, max_workers)
+        self.id_allocator = id_allocator
+        self.manifest = manifest
+        self.skip_unchanged = skip_unchanged and manifest is not None
+
+    def _path(self, filename: str) -> str:
+        return self.layout.path(filename)
+
+    def _allocate_filenames(self, products: List[Product], digests: List[str]) -> List[str]:
+        """商品ごとのファイル名（拡張子なし）を決定します。"""
+        if self.id_allocator is not None:
+            return self.id_allocator.allocate_many([product.url for product in products])
+        filenames = []
+        assigned: Dict[str, str] = {}
+        for digest in digests:
+            # ランダムなファイル名の場合も、同じ本文のページには同じファイル名を使用する
+            filename = assigned.get(digest)
+            if filename is None and self.manifest is not None:
+                filename = self.manifest.find_by_hash(digest)
+                if filename and self.layout.existing_path(filename) is None:
+                    filename = None
+            if filename is None:
+                filename = random_filename()
+                while self.layout.existing_path(filename) or filename in filenames:
+                    filename = random_filename()
+            assigned[digest] = filename
+            filenames.append(filename)
+        return filenames
+
+    def _is_unchanged(self, filename: str, digest: str, recorded: Dict[str, str]) -> bool:
+        """マニフェスト上の本文が同一で、ファイルも（移行前の配置を含めて）残っているかどうか。"""
+        return recorded.get(filename) == digest and self.layout.existing_path(filename) is not None
+
+    def _relocate(self, filename: str, move: bool) -> Optional[str]:
+        """移行前の配置に残っているページを、現在の配置へ移動（move=True）または削除します。
+
+        配置を切り替えた後にページが両方の配置に重複して残らないようにするための処理です。
+
+        Returns:
+            移動・削除したページの元のパス（移行前の配置に無い場合や、失敗した場合は None）
+        """
+        old_path = self.layout.alternate_path(filename)
+        if old_path == self._path(filename) or not os.path.exists(old_path):
+            return None
+        try:
+            if move:
+                path = self._path(filename)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(old_path, path)
+            else:
+                os.remove(old_path)
+        except OSError as e:
+            print(f"[WARN] 移行前の配置のページを整理できませんでした: {old_path} - {e}")
+            return None
+        # 移動元のシャードのディレクトリが空になった場合は削除
+        parent = os.path.dirname(old_path)
+        if os.path.abspath(parent) != os.path.abspath(self.output_dir) and not os.listdir(parent):
+            os.rmdir(parent)
+        return old_path
+
+    def _write(self, job: Tuple[str, str]) -> bool:
+        filename, content = job
+        try:
+            path = self._path(filename)
+            if self.layout.sharded:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_file_atomic(path, content)
+            return True
+        except Exception as e:
+            print(f"[ERROR] ファイル保存失敗: {filename}.html - {e}")
+            return False
+
+    def write_all(self, products: List[Product], run_id: Optional[str] = None) -> List[Optional[str]]:
+        """商品ごとにリダイレクトページを生成し、公開用の短縮風 URL を返します。
+        
+        Args:
+            products: ページを作成する商品のリスト
+            run_id: 保持期間の索引に記録する実行 ID（省略時は現在時刻）
+            
+        Returns:
+            products と同じ順序の URL のリスト（書き込みに失敗した商品は None）
+        """
+        if not products:
+            return []
+        os.makedirs(self.output_dir, exist_ok=True)
+        contents = [render_redirect_html(product) for product in products]
+        digests = [content_hash(content) for content in contents]
+        filenames = self._allocate_filenames(products, digests)
+
+        # 同じ転送先の商品が複数含まれていても、ページの書き込みは 1 回にする
+        pages: Dict[str, Tuple[str, str]] = {}
+        for filename, content, digest in zip(filenames, contents, digests):
+            pages.setdefault(filename, (content, digest))
+
+        # 前回と同じ本文のページは書き込まない
+        recorded = self.manifest.hashes(list(pages)) if self.skip_unchanged else {}
+        written: Dict[str, bool] = {}
+        # 本文が同一で移行前の配置にだけ残っているページは、書き直さずに現在の配置へ移動する
+        relocated: List[str] = []
+        for filename, (_, digest) in pages.items():
+            if not self._is_unchanged(filename, digest, recorded):
+                continue
+            if not os.path.exists(self._path(filename)):
+                old_path = self._relocate(filename, move=True)
+                if old_path is None:
+                    continue
+                relocated.extend((old_path, self._path(filename)))
+            written[filename] = True
+        unchanged = len(written)
+        jobs = {filename: content for filename, (content, _) in pages.items() if filename not in written}
+        if jobs:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as executor:
+                written.update(zip(jobs, executor.map(self._write, jobs.items())))
+            # 書き直したページの、移行前の配置に残る古いコピーを削除
+            for filename in jobs:
+                old_path = self._relocate(filename, move=False) if written[filename] else None
+                if old_path:
+                    relocated.append(old_path)
+        if self.manifest is not None:
+            self.manifest.record_run(
+                run_id or datetime.now().strftime("%Y%m%d_%H%M%S"),
+                [(filename, pages[filename][1]) for filename in jobs if written[filename]],
+                [filename for filename in pages if filename not in jobs]
+            )
+            self.manifest.mark_changed(
+                [self._path(filename) for filename in jobs if written[filename]] + relocated
+            )
+        print(f"[INFO] リダイレクトページ: {len(jobs)} 件を書き込み、{unchanged} 件は変更なし")
+        return [
+            self.layout.url(self.base_url, filename) if written[filename] else None
+            for filename in filenames
+        ]
+
+
+# 単一マニフェスト方式で出力するファイル
+LINKS_FILENAME = "links.json"
+DEFAULT_RESOLVER_PAGE = "go.html"
+
+# 単一マニフェスト方式の転送ページ（links.json から転送先を引いて移動する）
+_RESOLVER_TEMPLATE = string.Template("""<!DOCTYPE html>
 <html lang="ja">
   <head>
     <meta charset="utf-8">
     <meta http-equiv="X-UA-Compatible" content="IE=edge">
     <meta name="viewport" content="width=device-width, initial-scale=1">
-    <title>{safe_title}</title>
-    <meta property="og:title" content="{safe_title}">
-    <meta property="og:description" content="{og_description}">
-    <meta property="og:image" content="{safe_image_url}">
-    <meta property="og:type" content="product">
-    <meta property="og:url" content="{url}">
-    <meta name="twitter:card" content="summary_large_image">
-    <meta name="twitter:title" content="{safe_title}">
-    <meta name="twitter:description" content="{og_description}">
-    <meta name="twitter:image" content="{safe_image_url}">
+    <meta name="robots" content="noindex">
+    <title>商品詳細はこちら</title>
     <script>
-      // ブラウザでの転送処理
-      window.location.replace("{url}");
+      // ブラウザでの転送処理（?<短縮ID> の転送先を links.json から取得）
+      (function () {
+        var id = window.location.search.slice(1);
+        if (!/^[0-9a-z]+$$/.test(id)) return;
+        fetch("${links}", { cache: "no-cache" })
+          .then(function (res) { return res.json(); })
+          .then(function (links) {
+            var link = links[id];
+            if (!link) return;
+            document.title = link.t;
+            window.location.replace(link.u);
+          });
+      })();
     </script>
   </head>
   <body></body>
 </html>
-"""
-    try:
-        # ディレクトリが存在しない場合は作成
-        os.makedirs(output_dir, exist_ok=True)
-        # 指定されたファイル名で UTF-8 保存
-        with open(f"{output_dir}/{filename}.html", "w", encoding="utf-8") as f:
-            f.write(html_content)
-    except Exception as e:
-        print(f"[ERROR] ファイル保存失敗: {e}")
+""")
+
+
+class LinkManifestWriter:
+    """リンクごとの HTML を作らず、短縮 ID → 転送先 URL・OGP 項目を 1 つの links.json にまとめて出力するライタ。
+
+    公開 URL は {base_url}/{転送ページ}?{短縮ID} の形式で、転送ページ（既定は go.html）が
+    links.json を参照して転送します。1 回の実行で増えるのはリンク数に比例した JSON のエントリだけで、
+    links.json は内容が変わった場合のみ書き換えます。
+    SNS のクローラーはスクリプトを実行しないため、リンクのプレビュー（OGP）は商品ごとには表示されません。
+    RedirectPageWriter と同じインターフェース（write_all）を持ちます。
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        output_dir: str = "../html",
+        id_allocator: ShortIdAllocator | None = None,
+        manifest: PageManifest | None = None,
+        resolver_page: str = DEFAULT_RESOLVER_PAGE
+    ):
+        """初期化。
+        
+        Args:
+            base_url: 公開先のベース URL（secrets.yaml の base_url）
+            output_dir: links.json と転送ページを保存するディレクトリ
+            id_allocator: 短縮 ID の割り当てに使用する索引（None の場合は転送先 URL のハッシュ）
+            manifest: 使用したリンクを実行 ID とともに記録するマニフェスト（保持期間の索引）
+            resolver_page: 転送ページのファイル名
+        """
+        self.base_url = base_url.rstrip("/")
+        self.layout = PageLayout(output_dir)
+        self.output_dir = output_dir
+        self.id_allocator = id_allocator
+        self.manifest = manifest
+        self.resolver_page = resolver_page
+        self._lock = threading.Lock()
+
+    @property
+    def links_path(self) -> str:
+        return os.path.join(self.output_dir, LINKS_FILENAME)
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        try:
+            with open(self.links_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_if_changed(self, path: str, content: str) -> bool:
+        """内容が変わる場合のみファイルを書き込み、未公開の変更として記録します。"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                if f.read() == content:
+                    return False
+        except FileNotFoundError:
+            pass
+        write_file_atomic(path, content)
+        if self.manifest is not None:
+            self.manifest.mark_changed([path])
+        return True
+
+    def _save(self, links: Dict[str, Dict[str, str]]) -> bool:
+        # 差分が最小になるよう、キー順・区切り文字を固定し 1 リンク 1 行で出力する
+        lines = [
+            f"{json.dumps(key)}:{json.dumps(links[key], ensure_ascii=False, separators=(',', ':'))}"
+            for key in sorted(links)
+        ]
+        content = "{\n" + ",\n".join(lines) + "\n}\n"
+        resolver = _RESOLVER_TEMPLATE.substitute(links=LINKS_FILENAME)
+        self._save_if_changed(os.path.join(self.output_dir, self.resolver_page), resolver)
+        return self._save_if_changed(self.links_path, content)
+
+    def _allocate_ids(self, products: List[Product]) -> List[str]:
+        if self.id_allocator is not None:
+            return self.id_allocator.allocate_many([product.url for product in products])
+        return [base36_digest(product.url) for product in products]
+
+    def _prune(self, links: Dict[str, Dict[str, str]]) -> None:
+        """保持期間の索引から削除されたリンクを取り除きます。"""
+        if self.manifest is None:
+            return
+        live = self.manifest.filenames()
+        for key in [key for key in links if key not in live]:
+            del links[key]
+
+    def prune(self) -> int:
+        """保持期間の索引から削除されたリンクを links.json から取り除きます。
+
+        Returns:
+            取り除いたリンク数
+        """
+        with self._lock:
+            if not os.path.exists(self.links_path):
+                return 0
+            links = self._load()
+            before = len(links)
+            self._prune(links)
+            self._save(links)
+            return before - len(links)
+
+    def write_all(self, products: List[Product], run_id: Optional[str] = None) -> List[Optional[str]]:
+        """商品ごとのリンクを links.json に登録し、公開用の URL を返します。
+        
+        Args:
+            products: リンクを作成する商品のリスト
+            run_id: 保持期間の索引に記録する実行 ID（省略時は現在時刻）
+            
+        Returns:
+            products と同じ順序の URL のリスト（書き込みに失敗した場合はすべて None）
+        """
+        if not products:
+            return []
+        os.makedirs(self.output_dir, exist_ok=True)
+        ids = self._allocate_ids(products)
+        with self._lock:
+            links = self._load()
+            written: List[Tuple[str, str]] = []
+            kept: List[str] = []
+            for link_id, product in zip(ids, products):
+                fields = redirect_fields(product)
+                entry = {"u": fields["url"], "t": fields["title"], "d": fields["description"], "i": fields["image_url"]}
+                digest = content_hash(json.dumps(entry, ensure_ascii=False, sort_keys=True))
+                if links.get(link_id) == entry:
+                    if link_id not in kept:
+                        kept.append(link_id)
+                else:
+                    links[link_id] = entry
+                    written.append((link_id, digest))
+            if self.manifest is not None:
+                self.manifest.record_run(run_id or datetime.now().strftime("%Y%m%d_%H%M%S"), written, kept)
+            self._prune(links)
+            try:
+                self._save(links)
+            except Exception as e:
+                print(f"[ERROR] ファイル保存失敗: {LINKS_FILENAME} - {e}")
+                return [None] * len(products)
+        print(f"[INFO] リンクマニフェスト: {len(written)} 件を追加・更新、{len(kept)} 件は変更なし")
+        return [f"{self.base_url}/{self.resolver_page}?{link_id}" for link_id in ids]
 
 
 def generate_short_url(
-    affiliate_url: str,
-    product_name: str,
-    image_url: str,
+    product: Product,
     output_dir: str = "../html",
-    price: str = "",
-    review_average: str = "0.0",
-    point_rate: str = "1"
+    layout: PageLayout | None = None,
+    id_allocator: ShortIdAllocator | None = None
 ) -> str:
     """
     リダイレクト HTML を生成し、対応する「短縮風 URL」を返します。
     
+    複数の商品をまとめて処理する場合は、secrets.yaml の読み込みが 1 回で済む RedirectPageWriter を使用してください。
+    
     Args:
-        affiliate_url: 転送先のアフィリエイト URL
-        product_name: OGP タイトルに使用する商品名
-        image_url: 商品画像 URL
+        product: 転送先のアフィリエイト URL と OGP に使用する商品情報
         output_dir: HTML ファイルを保存するディレクトリ
-        price: 価格情報
-        review_average: レビュー評価点
-        point_rate: ポイント倍率
+        layout: ページの配置（None の場合は output_dir 直下に置く従来の配置）
+        id_allocator: 短縮 ID の割り当て（指定した場合は転送先 URL ごとに固定の ID を使用。
+                      None の場合は既存のページと重複しないランダムなファイル名）
     
     Returns:
-        str: 公開用の URL フォーマット {BASE_URL}/{filename}.html
+        str: 公開用の URL フォーマット {BASE_URL}/{filename}.html（シャード配置の場合は {BASE_URL}/{shard}/{filename}.html）
     """
     secrets = load_secrets()
     BASE_URL = secrets.get("base_url", "")
+    layout = layout or PageLayout(output_dir)
 
-    # ランダムなファイル名を決定して HTML を生成
-    filename = random_filename()
-    create_redirect_html(
-        affiliate_url, 
-        filename, 
-        product_name, 
-        image_url, 
-        output_dir,
-        price=price,
-        review_average=review_average,
-        point_rate=point_rate
-    )
+    # 既存のページを上書きしないファイル名を決定して HTML を生成
+    if id_allocator is not None:
+        filename = id_allocator.allocate(product.url)
+    else:
+        filename = random_filename()
+        while layout.existing_path(filename):
+            filename = random_filename()
+    create_redirect_html(product, filename, layout=layout)
     
-    return f"{BASE_URL}/{filename}.html"
+    return layout.url(BASE_URL, filename)
@@ -0,0 +1,162 @@
+"""
+リダイレクトページの配置モジュール。
+リダイレクトページを html/ 直下に置く従来の配置（flat）と、ファイル名の先頭文字ごとの
+サブディレクトリに分けて置く配置（sharded, 例: html/ab/abc123.html）を切り替え、
+ファイルパス・公開 URL の組み立てと、既存ページの配置の移行を行います。
+"""
+import os
+import argparse
+from dataclasses import dataclass
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+
+LAYOUT_FLAT = "flat"
+LAYOUT_SHARDED = "sharded"
+DEFAULT_SHARD_LENGTH: int = 2
+
+
+@dataclass(frozen=True)
+class PageLayout:
+    """リダイレクトページの配置。ファイル名（拡張子なし）からパスと公開 URL を求めます。"""
+    output_dir: str = "../html"
+    layout: str = LAYOUT_FLAT
+    shard_length: int = DEFAULT_SHARD_LENGTH
+
+    def __post_init__(self):
+        if self.layout not in (LAYOUT_FLAT, LAYOUT_SHARDED):
+            raise ValueError(f"未対応のページ配置です: {self.layout}")
+
+    @property
+    def sharded(self) -> bool:
+        return self.layout == LAYOUT_SHARDED
+
+    def _shard(self, filename: str) -> Optional[str]:
+        if not self.sharded or len(filename) <= self.shard_length:
+            return None
+        return filename[:self.shard_length]
+
+    def relative_path(self, filename: str) -> str:
+        """出力ディレクトリからの相対パス（URL と同じ "/" 区切り）。例: "ab/abc123.html" """
+        shard = self._shard(filename)
+        return f"{shard}/{filename}.html" if shard else f"{filename}.html"
+
+    def path(self, filename: str) -> str:
+        """ページのファイルパス。"""
+        return os.path.join(self.output_dir, *self.relative_path(filename).split("/"))
+
+    def url(self, base_url: str, filename: str) -> str:
+        """ページの公開 URL。"""
+        return f"{base_url.rstrip('/')}/{self.relative_path(filename)}"
+
+    def existing_path(self, filename: str) -> Optional[str]:
+        """ページが存在するパスを返します。
+
+        現在の配置のパスに無い場合は、移行前の配置（もう一方の配置）のパスも確認します。
+        どちらにも無い場合は None。
+        """
+        for path in (self.path(filename), self.alternate_path(filename)):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def alternate_path(self, filename: str) -> str:
+        """移行前の配置（もう一方の配置）でのページのファイルパス。"""
+        return self._other().path(filename)
+
+    def _other(self) -> "PageLayout":
+        return PageLayout(self.output_dir, LAYOUT_FLAT if self.sharded else LAYOUT_SHARDED, self.shard_length)
+
+    def iter_pages(self) -> Iterator[Tuple[str, str]]:
+        """出力ディレクトリ直下と、シャードのサブディレクトリにあるページの (ファイル名, パス) を列挙します。
+
+        どちらの配置のページも列挙するため、配置の移行や索引への取り込みに使用します。
+        """
+        if not os.path.isdir(self.output_dir):
+            return
+        for entry in os.scandir(self.output_dir):
+            if entry.is_dir() and len(entry.name) == self.shard_length:
+                for sub in os.scandir(entry.path):
+                    if sub.is_file() and sub.name.endswith(".html") and sub.name.startswith(entry.name):
+                        yield sub.name[:-len(".html")], sub.path
+            elif entry.is_file() and entry.name.endswith(".html"):
+                yield entry.name[:-len(".html")], entry.path
+
+
+def get_page_layout(policy: Dict[str, Any], output_dir: str = "../html") -> PageLayout:
+    """generation_policy.yaml の redirect_pages セクションに対応するページ配置を返します。
+
+    Args:
+        policy: generation_policy.yaml 全体の辞書。redirect_pages キー配下の layout, shard_length を参照します
+        output_dir: リダイレクトページの出力ディレクトリ
+
+    Returns:
+        PageLayout インスタンス
+    """
+    settings = policy.get("redirect_pages") or {}
+    return PageLayout(
+        output_dir,
+        settings.get("layout", LAYOUT_FLAT),
+        int(settings.get("shard_length", DEFAULT_SHARD_LENGTH))
+    )
+
+
+def migrate(layout: PageLayout, excluded_files: Tuple[str, ...] = ("index.html",), dry_run: bool = False) -> int:
+    """出力ディレクトリ内のページを、指定した配置のパスへ移動します。
+
+    Args:
+        layout: 移行先の配置
+        excluded_files: 移動しないファイル名（出力ディレクトリ直下のもの）
+        dry_run: True の場合は移動せずに件数のみを返します
+
+    Returns:
+        移動した（dry_run の場合は移動対象の）ページ数
+    """
+    moved = 0
+    root = os.path.abspath(layout.output_dir)
+    for filename, path in list(layout.iter_pages()):
+        parent = os.path.dirname(os.path.abspath(path))
+        if parent == root and os.path.basename(path) in excluded_files:
+            continue
+        target = layout.path(filename)
+        if os.path.abspath(path) == os.path.abspath(target):
+            continue
+        moved += 1
+        if dry_run:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        # 移動元のサブディレクトリが空になった場合は削除
+        if parent != root and not os.listdir(parent):
+            os.rmdir(parent)
+    return moved
+
+
+def main() -> None:
+    """既存のリダイレクトページを、設定（または引数）の配置へ移行します。"""
+    from di_container import get_container
+
+    parser = argparse.ArgumentParser(description="リダイレクトページの配置 (flat / sharded) を移行します")
+    parser.add_argument("--to", choices=[LAYOUT_FLAT, LAYOUT_SHARDED],
+                        help="移行先の配置（省略時は redirect_pages.layout の設定値）")
+    parser.add_argument("--output-dir", default="../html", help="リダイレクトページの出力ディレクトリ")
+    parser.add_argument("--dry-run", action="store_true", help="移動せずに対象件数のみを表示します")
+    args = parser.parse_args()
+
+    policy = get_container().get_generation_policy()
+    layout = get_page_layout(policy, args.output_dir)
+    if args.to:
+        layout = PageLayout(layout.output_dir, args.to, layout.shard_length)
+    excluded = tuple((policy.get("html_cleanup") or {}).get("excluded_files", ["index.html"]))
+
+    count = migrate(layout, excluded, dry_run=args.dry_run)
+    if args.dry_run:
+        print(f"{count} 件のページが {layout.layout} 配置への移動対象です")
+        return
+    print(f"{count} 件のページを {layout.layout} 配置へ移動しました")
+    if count:
+        print("[WARN] 移行前の配置の URL で公開済みのリンクは、移動したページを参照できなくなります"
+              "（新しい URL は次回の生成から使用されます）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+HTTP 応答キャッシュモジュール。
+楽天 API の応答を、認証情報を除いて正規化したエンドポイント URL をキーとして SQLite に永続化し、
+API の種類 (ファミリー) ごとの TTL と、ETag / Last-Modified による条件付き再検証に対応します。
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import urlparse, parse_qsl, urlencode
+from typing import Dict, Any, Optional, Mapping
+
+
+DEFAULT_HTTP_CACHE_PATH: str = "../data/cache/rakuten_responses.sqlite3"
+DEFAULT_TTL_SECONDS: int = 60 * 60
+
+# API ファミリーごとの既定 TTL（秒）。ランキング・検索は毎時、マスタ系は日次で更新される想定
+DEFAULT_FAMILY_TTL_SECONDS: Dict[str, int] = {
+    "IchibaItem/Search": 60 * 60,
+    "IchibaItem/Ranking": 60 * 60,
+    "Travel/HotelRanking": 60 * 60,
+    "Travel/KeywordHotelSearch": 60 * 60,
+    "Travel/GetAreaClass": 24 * 60 * 60,
+}
+
+# キャッシュキーから除外するクエリパラメータ（認証情報・応答内容に影響しないもの）
+_IGNORED_PARAMS = frozenset(["applicationId", "accessKey", "affiliateId", "format"])
+
+# /api/<サービス>/<操作>/<バージョン> 形式のパスからファミリー名を取り出すパターン
+_FAMILY_PATTERN = re.compile(r"/api/([^/]+)/([^/]+)/")
+
+
+def normalize_url(url: str) -> str:
+    """キャッシュキー用に URL を正規化します。
+
+    認証情報を除外し、クエリパラメータを名前順に並べ替えるため、
+    accounts.yaml 上の記述順が異なる同一リクエストも同じキーになります。
+
+    Args:
+        url: 新仕様への変換後のエンドポイント URL
+
+    Returns:
+        正規化された URL
+    """
+    parsed = urlparse(url)
+    params = sorted(
+        (k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if k not in _IGNORED_PARAMS
+    )
+    return parsed._replace(netloc=parsed.netloc.lower(), query=urlencode(params), fragment="").geturl()
+
+
+def endpoint_family(url: str) -> str:
+    """URL から API ファミリー名（例: "IchibaItem/Ranking"）を求めます。判別できない場合は空文字列。"""
+    match = _FAMILY_PATTERN.search(urlparse(url).path)
+    return f"{match.group(1)}/{match.group(2)}" if match else ""
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """キャッシュ済みの応答 1 件。"""
+    url: str
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    fresh: bool
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """条件付きリクエスト用のヘッダー (If-None-Match / If-Modified-Since) を返します。"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpResponseCache:
+    """API ファミリーごとの TTL と条件付き再検証に対応した、スレッドセーフな HTTP 応答キャッシュ。"""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_HTTP_CACHE_PATH,
+        ttl_seconds: Optional[Mapping[str, float]] = None,
+        default_ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        offline: bool = False
+    ):
+        """キャッシュを初期化し、必要であればデータベースを作成します。
+
+        Args:
+            path: SQLite ファイルのパス
+            ttl_seconds: API ファミリー名から有効期間（秒）へのマッピング（既定値を上書き）
+            default_ttl_seconds: ファミリー別の指定がない場合の有効期間（秒）
+            offline: True の場合はネットワークに接続せず、期限切れを含むキャッシュのみで応答します
+        """
+        self.path = path
+        self.ttl_seconds: Dict[str, float] = dict(DEFAULT_FAMILY_TTL_SECONDS)
+        self.ttl_seconds.update(ttl_seconds or {})
+        self.default_ttl_seconds = default_ttl_seconds
+        self.offline = offline
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS http_responses (
+                    key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    family TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL
+                )"""
+            )
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        """正規化した URL の SHA-256 をキーとして返します。"""
+        return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+    def ttl_for(self, url: str) -> float:
+        """URL の API ファミリーに対応する有効期間（秒）を返します。"""
+        return float(self.ttl_seconds.get(endpoint_family(url), self.default_ttl_seconds))
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """キャッシュ済みの応答を取得します。期限切れの場合も再検証用に返し、fresh=False とします。
+
+        Args:
+            url: 新仕様への変換後のエンドポイント URL
+
+        Returns:
+            キャッシュ済みの応答。存在しない場合は None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM http_responses WHERE key = ?",
+                (self.make_key(url),)
+            ).fetchone()
+        if row is None:
+            return None
+        body, etag, last_modified, fetched_at = row
+        fresh = time.time() - fetched_at <= self.ttl_for(url)
+        return CachedResponse(url, body, etag, last_modified, fetched_at, fresh)
+
+    def put(self, url: str, body: str, headers: Optional[Mapping[str, str]] = None) -> None:
+        """応答本文と検証用ヘッダー (ETag / Last-Modified) を保存します。
+
+        Args:
+            url: 新仕様への変換後のエンドポイント URL
+            body: 応答本文（JSON テキスト）
+            headers: 応答ヘッダー
+        """
+        headers = headers or {}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_responses "
+                "(key, url, family, body, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.make_key(url), normalize_url(url), endpoint_family(url), body,
+                    headers.get("ETag"), headers.get("Last-Modified"), time.time()
+                )
+            )
+
+    def touch(self, url: str) -> None:
+        """304 Not Modified を受け取った際に、保存済み応答の取得時刻を更新して有効期間を延長します。"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE http_responses SET fetched_at = ? WHERE key = ?",
+                (time.time(), self.make_key(url))
+            )
+
+    def purge_expired(self, grace_seconds: float = 0.0) -> int:
+        """有効期間に grace_seconds を加えても期限切れのエントリを削除します。
+
+        Args:
+            grace_seconds: 再検証用に期限切れ後も保持する秒数
+
+        Returns:
+            削除したエントリ数
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute("SELECT key, url, fetched_at FROM http_responses").fetchall()
+        expired = [(key,) for key, url, fetched_at in rows if now - fetched_at > self.ttl_for(url) + grace_seconds]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM http_responses WHERE key = ?", expired)
+        return len(expired)
+
+
+# パスごとに共有されるキャッシュ
+_caches: Dict[str, HttpResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_http_cache(api_config: Dict[str, Any]) -> Optional[HttpResponseCache]:
+    """rakuten_api セクションの cache 設定に対応する共有キャッシュを取得します。
+
+    Args:
+        api_config: generation_policy.yaml の rakuten_api セクション辞書。cache キー配下の
+                    enabled, path, default_ttl_seconds, ttl_seconds (ファミリー名 → 秒), offline を参照します
+
+    Returns:
+        共有の HttpResponseCache インスタンス。無効の場合は None
+    """
+    settings = api_config.get("cache") or {}
+    if not settings.get("enabled", False):
+        return None
+    path = settings.get("path", DEFAULT_HTTP_CACHE_PATH)
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = HttpResponseCache(
+                path=path,
+                ttl_seconds=settings.get("ttl_seconds") or {},
+                default_ttl_seconds=float(settings.get("default_ttl_seconds", DEFAULT_TTL_SECONDS)),
+                offline=bool(settings.get("offline", False))
+            )
+            _caches[path] = cache
+        return cache
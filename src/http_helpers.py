@@ -0,0 +1,45 @@
+"""
+HTTP 支援モジュール。
+楽天 API 等へのリクエストで共有する、接続プール付き HTTP セッションの生成を担当します。
+"""
+import requests  # type: ignore
+from requests.adapters import HTTPAdapter  # type: ignore
+from urllib3.util.retry import Retry  # type: ignore
+
+
+def create_http_session(pool_size: int = 10, connect_retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
+    """Keep-Alive による接続再利用と、接続エラー時の自動再試行を備えたセッションを作成します。
+
+    urllib3 の接続プールはスレッドセーフなため、作成したセッションは複数スレッドから共有できます。
+    再試行は接続確立の失敗（DNS / TCP / TLS）のみを対象とし、HTTP ステータスによる再試行は
+    呼び出し側のレート制御に任せます。
+
+    Args:
+        pool_size: ホストごとに保持する接続数（並列ワーカー数以上を推奨）
+        connect_retries: 接続エラー時の再試行回数
+        backoff_factor: 再試行間隔の指数バックオフ係数（秒）
+
+    Returns:
+        requests.Session: 設定済みのセッション
+    """
+    retry = Retry(
+        total=connect_retries,
+        connect=connect_retries,
+        read=0,
+        status=0,
+        backoff_factor=backoff_factor,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+        pool_block=True
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # 大きな JSON レスポンスの転送量を抑えるため、圧縮転送を明示的に要求
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
@@ -1,11 +1,21 @@
 import os
 import csv
-import requests  # type: ignore
+import json
 import time
-from concurrent.futures import ThreadPoolExecutor
-from urllib.parse import urlparse, parse_qs
+import threading
+from dataclasses import asdict
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, Future
 from typing import Dict, List, Tuple, Any
+from email.utils import parsedate_to_datetime
 from di_container import get_container, DIContainer
+from rate_limiter import get_request_governor
+from http_cache import get_http_cache
+from rakuten_endpoints import EndpointResolver, ResolvedEndpoint
+from product import Product
+from columnar_store import get_columnar_store, write_safely, DATASET_PRODUCTS
+from product_store import get_product_store
+from rakuten_extractors import extract_items, stream_items, supports_streaming
 
 
 class InputCSVGenerator:
@@ -21,6 +31,20 @@ class InputCSVGenerator:
         """
         self.container = container or get_container()
         self.accounts = self.container.get_accounts()
+        # 全ジャンル URL を起動時に検証し、新仕様のエンドポイントへ解決しておく（不正な URL は ValueError）
+        self.endpoints = EndpointResolver(self.accounts, self.DEFAULT_ITEM_NUM)
+        # 楽天 API 呼び出し設定（タイムアウト等）と、接続プール付きの共有セッション
+        self.api_config = self.container.get_generation_policy().get("rakuten_api", {}) or {}
+        self.timeout = self.api_config.get("timeout", 10)
+        self.session = self.container.get_http_session()
+        # エンドポイント URL 単位の応答キャッシュ（rakuten_api.cache.enabled が True の場合のみ）
+        self.http_cache = get_http_cache(self.api_config)
+        # storage.format が parquet / arrow の場合のみ有効な列指向ストア（CSV と並行して保存）
+        self.columnar_store = get_columnar_store(self.container.get_generation_policy())
+        # 商品の価格・レビュー履歴と前回からの変化を記録するストア（product_store.enabled が True の場合のみ）
+        self.product_store = get_product_store(self.container.get_generation_policy())
+        # 大きな応答を逐次解析するか（ijson がインストールされている場合のみ有効）
+        self.streaming = bool(self.api_config.get("streaming", False))
         self.secrets = self.container.get_secrets()        # APIキーなどの取得
         self.application_id = self.secrets.get("rakuten_application_id")
         self.access_key = self.secrets.get("rakuten_access_key")
@@ -28,112 +52,136 @@ class InputCSVGenerator:
         # Referer/Origin は新仕様で必須。一元管理のため rakuten_origin を優先使用
         self.referer = self.secrets.get("rakuten_origin")
         self.origin = self.referer.rstrip("/")
+        # applicationId 単位の送信間隔を、全アカウント・全スレッドで共有して保証する
+        self.governor = get_request_governor(
+            f"rakuten:{self.application_id}",
+            self.api_config.get("requests_per_second", 1.0)
+        )
+        # 全アカウントで共有する取得ワーカーと、エンドポイント URL ごとの取得結果（重複リクエスト排除用）
+        self._fetch_executor: ThreadPoolExecutor | None = None
+        self._fetch_futures: Dict[str, Future] = {}
+        self._fetch_lock = threading.Lock()
+        # 実行中の generate の数（ステージの並行実行時は複数スレッドから同時に呼ばれる）
+        self._active_generations = 0
 
     
-    def remove_dup(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """取得したアイテムリストから重複を排除します。
-        
-        Args:
-            items: アイテムのリスト
-            
-        Returns:
-            重複排除後のアイテムリスト
-        """
-        seen = set()
-        result = []
-
-        for entry in items:
-            # API の種類によって、情報の階層構造（'Item', 'Hotel', 'hotel', 'Ranking' 等）が異なります。
-            item = entry.get("Item") or entry.get("Hotel") or entry.get("hotel") or entry.get("Ranking") or entry
-            
-            # 抽出対象がリストの場合（楽天トラベル KeywordSearch 等）の基本情報取得
-            base_info = {}
-            if isinstance(item, list):
-                for sub in item:
-                    if "hotelBasicInfo" in sub or "basicInfo" in sub:
-                        base_info = sub.get("hotelBasicInfo") or sub.get("basicInfo")
-                        break
-            elif isinstance(item, dict) and "Ranking" in entry: # 楽天トラベルランキングの場合
-                hotels = item.get("hotels", [])
-                if hotels and isinstance(hotels, list):
-                    h_item = hotels[0].get("hotel", {})
-                    if isinstance(h_item, list):
-                        for sub in h_item:
-                            if "hotelBasicInfo" in sub or "basicInfo" in sub:
-                                base_info = sub.get("hotelBasicInfo") or sub.get("basicInfo")
-                                break
-            else:
-                base_info = item.get("hotelBasicInfo") or item.get("basicInfo") or item
-            
-            # 商品名またはホテル名をキーとして重複を判定
-            title = base_info.get("hotelName") or base_info.get("itemName") or base_info.get("title", "")
-            
-            if title and title not in seen:
-                seen.add(title)
-                result.append(entry)
-        return result
+    @staticmethod
+    def _retry_after_seconds(response: Any, default: float) -> float:
+        """Retry-After ヘッダー（秒数または HTTP 日付）から待機秒数を求めます。"""
+        value = response.headers.get("Retry-After") if response is not None else None
+        if not value:
+            return default
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+        except (TypeError, ValueError):
+            return default
 
-    def fetch_items(self, url: str, genre_name: str) -> List[Tuple[Any, ...]]:
-        """指定された API URL からアイテム情報を取得します。
+    def _get(self, url: str, params: Dict[str, Any], headers: Dict[str, str] | None = None, stream: bool = False) -> Any:
+        """共有ガバナーで送信間隔を守りながら GET を実行し、429 の場合は Retry-After に従って再試行します。
         
         Args:
-            url: API リクエスト用 URL
-            genre_name: ジャンル名（カテゴリ名）
+            url: リクエスト先 URL
+            params: クエリパラメータ
+            headers: 追加のリクエストヘッダー
+            stream: True の場合は本文を読み込まずにレスポンスを返します（ストリーミング解析用）
             
         Returns:
-            (タイトル, 商品URL, 画像URL, 価格, レビュー平均, レビュー数, ポイント倍率) のタプルのリスト
+            最後に受信したレスポンス
         """
-        # 1. URL から 'hits' パラメータ（取得件数）を抽出
-        parsed_url = urlparse(url)
-        query_params = parse_qs(parsed_url.query)
-        
-        # URL に &hits=10 等が指定されていればそれを使用し、なければデフォルト値 (5) を使用
-        target_count = int(query_params.get('hits', [self.DEFAULT_ITEM_NUM])[0])
-
-        # 2. API リクエストの実行
-        # 2026年新仕様に基づき、ドメインとエンドポイントを更新
-        # サービス種類に応じたプレフィックスを付与
-        endpoint_mapping = {
-            "IchibaItem/Search": "ichibams",
-            "IchibaItem/Ranking": "ichibaranking", # Ranking は専用プレフィックス
-            "BooksTotal/Search": "services",      # Books は services のまま
-            "BooksCD/Search": "services",
-            "BooksDVD/Search": "services",
-            "BooksGame/Search": "services",
-            "BooksMagazine/Search": "services",
-            "Travel/HotelRanking": "engine",      # Travel は engine
-            "Travel/KeywordHotelSearch": "engine",
-            "Travel/GetAreaClass": "engine",
-        }
-        
-        new_endpoint = url.replace("app.rakuten.co.jp", "openapi.rakuten.co.jp")
-        
-        # 楽天市場ランキングのバージョン更新 (20170628 -> 20220601)
-        if "IchibaItem/Ranking/20170628" in new_endpoint:
-            new_endpoint = new_endpoint.replace("20170628", "20220601")
-
-        for old_path, prefix in endpoint_mapping.items():
-            if old_path in new_endpoint and f"{prefix}/api/" not in new_endpoint:
-                new_endpoint = new_endpoint.replace("services/api/", f"{prefix}/api/")
-                break
-
-
-        params = {
+        max_retries = self.api_config.get("rate_limit_retries", 3)
+        default_wait = self.api_config.get("rate_limit_wait_seconds", 2.0)
+        response = None
+        for attempt in range(max_retries + 1):
+            self.governor.acquire()
+            response = self.session.get(url, params=params, headers=headers, timeout=self.timeout, stream=stream)
+            if response.status_code != 429 or attempt == max_retries:
+                return response
+            response.close()
+            wait = self._retry_after_seconds(response, default_wait * (attempt + 1))
+            print(f"  [WARN] レート制限 (429) を受信しました。{wait:.1f}秒後に再試行します")
+            # 他スレッドを含む全体の送信を後ろ倒しにする
+            self.governor.defer(wait)
+        return response
+
+    def _request_params(self) -> Dict[str, Any]:
+        """全エンドポイント共通のクエリパラメータ（認証情報）を返します。"""
+        return {
             "format": "json",
             "applicationId": self.application_id,
             "accessKey": self.access_key,
             "affiliateId": self.affiliate_id,
         }
 
-        headers = {
+    def _request_headers(self) -> Dict[str, str]:
+        """新仕様で必須の Referer / Origin ヘッダーを返します。"""
+        return {
             "Referer": self.referer,
             "Origin": self.origin
         }
 
-        time.sleep(1)  # 短時間での連続アクセスによる API 負荷を軽減
+    def _stream_items(self, endpoint: ResolvedEndpoint) -> List[Product] | None:
+        """応答本文を逐次解析しながらアイテムを抽出し、必要な件数が揃った時点で接続を閉じます。
+        
+        Args:
+            endpoint: 解決済みのエンドポイント
+            
+        Returns:
+            抽出したアイテムのリスト。失敗した場合は None（呼び出し側で通常の取得に切り替えます）
+        """
+        try:
+            response = self._get(endpoint.url, params=self._request_params(), headers=self._request_headers(), stream=True)
+        except Exception as e:
+            print(f"  [ERROR] APIリクエスト失敗 ({endpoint.url}): {e}")
+            return None
+        try:
+            if response.status_code != 200:
+                print(f"  [ERROR] Error Response: {response.status_code}")
+                return None
+            # gzip 転送の場合も展開済みの本文を読み出す
+            response.raw.decode_content = True
+            return stream_items(response.raw, endpoint.shape, endpoint.hits)
+        except Exception as e:
+            print(f"  [WARN] ストリーミング解析に失敗しました。通常の取得に切り替えます: {e}")
+            return None
+        finally:
+            response.close()
+
+    def _fetch_json(self, url: str, new_endpoint: str) -> Any:
+        """エンドポイントから JSON を取得します。HTTP キャッシュが有効な場合は有効期間内の応答を再利用し、
+        期限切れの応答は ETag / Last-Modified による条件付きリクエストで再検証します。
+        
+        Args:
+            url: accounts.yaml に記載された旧仕様の API URL（フォールバック用）
+            new_endpoint: 新仕様のエンドポイント URL（キャッシュキー）
+            
+        Returns:
+            デコード済みの JSON。取得できなかった場合は None
+        """
+        cached = self.http_cache.get(new_endpoint) if self.http_cache else None
+        if cached and (cached.fresh or self.http_cache.offline):
+            print(f"  [CACHE] キャッシュ済みの応答を使用します ({new_endpoint[:60]}...)")
+            return json.loads(cached.body)
+        if self.http_cache and self.http_cache.offline:
+            print(f"  [CACHE] オフラインモードのため取得をスキップします（キャッシュなし: {new_endpoint}）")
+            return None
+
+        params = self._request_params()
+        headers = self._request_headers()
+        if cached:
+            headers.update(cached.conditional_headers())
+
         try:
-            # 新仕様のエンドポイントとヘッダーを使用してリクエスト
-            response = requests.get(new_endpoint, params=params, headers=headers, timeout=10)
+            # 新仕様のエンドポイントとヘッダーを使用してリクエスト（送信間隔は共有ガバナーで管理）
+            response = self._get(new_endpoint, params=params, headers=headers)
+            if cached and response.status_code == 304:
+                # 変更なし: 保存済みの応答をそのまま使い、有効期間を延長
+                self.http_cache.touch(new_endpoint)
+                return json.loads(cached.body)
             if response.status_code != 200:
                 print(f"  [ERROR] Error Response: {response.text}")
             response.raise_for_status()
@@ -142,104 +190,157 @@ class InputCSVGenerator:
             print(f"  [ERROR] APIリクエスト失敗 ({new_endpoint}): {e}")
 
             # 旧仕様へのフォールバック（移行期間中のみ有効な可能性があるため、エラーログを残す）
-            try:
-                print(f"  [INFO] 旧エンドポイントで再試行します...")
-                response = requests.get(url, params=params, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-            except Exception as e2:
-                print(f"  [ERROR] 旧仕様再試行も失敗: {e2}")
-                return []
-        
+            # 応答は実際に取得した旧仕様の URL をキーとしてキャッシュし、新仕様の応答と混同しない
+            return self._fetch_legacy_json(url, params)
+
+        if self.http_cache:
+            self.http_cache.put(new_endpoint, response.text, response.headers)
+        return data
+
+    def _fetch_legacy_json(self, url: str, params: Dict[str, Any]) -> Any:
+        """旧仕様の URL から JSON を取得します。HTTP キャッシュは旧仕様の URL をキーとして使用します。
 
-        # 3. データの抽出（様々な API レスポンス構造に対応）
-        raw_items = []
-        if isinstance(data, dict):
-            if "Items" in data:
-                raw_items = data.get("Items", [])
-            elif "items" in data:
-                raw_items = data.get("items", [])
-            if "Rankings" in data: # 楽天トラベルランキングAPI用
-                for r in data.get("Rankings", []):
-                    hotels = r.get("Ranking", {}).get("hotels", [])
-                    raw_items.extend(hotels)
-            elif "hotels" in data: # 楽天トラベルキーワード検索API用
-                raw_items = data.get("hotels", [])
-            elif "hits" in data and isinstance(data.get("hits"), list):
-                raw_items = data.get("hits", [])
-            elif "result" in data and isinstance(data.get("result"), dict) and "items" in data.get("result"):
-                raw_items = data.get("result", {}).get("items", [])
-            elif "data" in data and isinstance(data.get("data"), list):
-                raw_items = data.get("data", [])
-            else:
-                if isinstance(data, list):
-                    raw_items = data
-
-        # 重複排除を実行
-        unique_items = self.remove_dup(raw_items)
-
-        results = []
-        for entry in unique_items:
-            # 指定された取得件数に達したら終了
-            if len(results) >= target_count:
-                break
-                
-            # 階層構造の解析
-            if "Ranking" in entry:
-                hotels_list = entry["Ranking"].get("hotels", [])
-                if hotels_list and isinstance(hotels_list, list):
-                    item_data = hotels_list[0].get("hotel", entry)
-                else:
-                    item_data = entry
-            else:
-                item_data = entry.get("hotel") or entry.get("Hotel") or entry.get("Item") or entry
-
-            # リスト形式（トラベル等）または辞書形式からの情報抽出
-            base_info = {}
-            if isinstance(item_data, list):
-                for sub in item_data:
-                    if "hotelBasicInfo" in sub:
-                        base_info = sub["hotelBasicInfo"]
-                        break
-                    elif "basicInfo" in sub:
-                        base_info = sub["basicInfo"]
-                        break
-            else:
-                base_info = item_data.get("hotelBasicInfo") or item_data.get("basicInfo") or item_data
-
-            # 共通項目（タイトル、URL）の取得
-            title = base_info.get("hotelName") or base_info.get("itemName") or base_info.get("title") or ""
-            url_link = base_info.get("hotelInformationUrl") or base_info.get("affiliateUrl") or ""
-
-            # --- 画像URLの取得（複数のキーパターンに対応） ---
-            image_url = base_info.get("hotelImageUrl") or base_info.get("imageUrl") or ""
-            if not image_url:
-                medium_images = base_info.get("mediumImageUrls", [])
-                if medium_images and isinstance(medium_images, list):
-                    image_url = medium_images[0].get("imageUrl", "")
+        Args:
+            url: accounts.yaml に記載された旧仕様の API URL
+            params: リクエストパラメータ
+
+        Returns:
+            デコード済みの JSON。取得できなかった場合は None
+        """
+        cached = self.http_cache.get(url) if self.http_cache else None
+        headers = cached.conditional_headers() if cached else {}
+        try:
+            print(f"  [INFO] 旧エンドポイントで再試行します...")
+            response = self._get(url, params=params, headers=headers or None)
+            if cached and response.status_code == 304:
+                self.http_cache.touch(url)
+                return json.loads(cached.body)
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e2:
+            print(f"  [ERROR] 旧仕様再試行も失敗: {e2}")
+            return None
+
+        if self.http_cache:
+            self.http_cache.put(url, response.text, response.headers)
+        return data
+
+    def fetch_items(self, url: str, genre_name: str) -> List[Product]:
+        """指定された API URL からアイテム情報を取得します。
+        
+        Args:
+            url: API リクエスト用 URL
+            genre_name: ジャンル名（カテゴリ名）
             
-            if not image_url:
-                images = item_data.get("images") or item_data.get("imageUrls") or []
-                if isinstance(images, list) and images:
-                    if isinstance(images[0], dict):
-                        image_url = images[0].get("url") or images[0].get("imageUrl") or ""
-                    else:
-                        image_url = images[0]
-
-            # --- 価格・レビュー・ポイント情報の取得 ---
-            price = base_info.get("itemPrice") or base_info.get("hotelMinCharge") or base_info.get("price") or ""
-            review_average = base_info.get("reviewAverage") or 0.0
-            review_count = base_info.get("reviewCount") or 0
-            point_rate = base_info.get("pointRate") or 1
-
-            if title and url_link:
-                results.append((title, url_link, image_url, price, review_average, review_count, point_rate))
-
-        return results
-
-    def generate(self) -> None:
-        """全アカウントのジャンル設定に基づき、入力用 CSV を生成します。"""
+        Returns:
+            取得した商品 (Product) のリスト
+        """
+        # 1. 起動時に解決済みのエンドポイント（新仕様の URL と取得件数）を参照
+        endpoint = self.endpoints.resolve(url)
+        target_count = endpoint.hits
+        new_endpoint = endpoint.url
+
+        # 2. 大きな応答は逐次解析し、必要な件数に達した時点で読み込みを止める
+        #    (rakuten_api.streaming が有効かつ ijson が利用可能で、HTTP キャッシュを使わない場合のみ)
+        if self.streaming and self.http_cache is None and supports_streaming(endpoint.shape):
+            rows = self._stream_items(endpoint)
+            if rows is not None:
+                return rows
+
+        # 3. API リクエストの実行（HTTP キャッシュが有効な場合は再検証のみ）
+        data = self._fetch_json(url, new_endpoint)
+        if data is None:
+            return []
+
+        # 4. 応答形式に対応する抽出処理で、正規化・重複排除・件数の打ち切りを 1 パスで実行
+        return extract_items(data, endpoint.shape, target_count)
+
+    def _record_history(self, account: str, products: List[Product], run_id: str) -> None:
+        """取得結果を商品履歴ストアに登録し、前回からの変化の内訳を表示します。"""
+        try:
+            changes = self.product_store.upsert(account, products, run_id)
+        except Exception as e:
+            print(f"  [WARN] 商品履歴の保存に失敗しました: {e}")
+            return
+        counts: Dict[str, int] = {}
+        for change in changes.values():
+            counts[change] = counts.get(change, 0) + 1
+        summary = ", ".join(f"{kind}: {count}" for kind, count in sorted(counts.items()))
+        print(f"  [INFO] 前回からの変化 → {summary}")
+
+    def fetch_items_shared(self, url: str, genre_name: str) -> Future:
+        """エンドポイント URL 単位で 1 回だけ取得を予約し、結果の Future を返します。
+        
+        同じ URL（新仕様への変換後）を複数のアカウントが購読している場合でも API へのリクエストは 1 回で、
+        すべての呼び出し元が同じ Future を共有します。ステージを並行実行する場合も
+        同一インスタンス内であれば重複を排除できます。
+        
+        Args:
+            url: accounts.yaml に記載された API URL
+            genre_name: ジャンル名（カテゴリ名）
+            
+        Returns:
+            fetch_items の結果を返す Future
+        """
+        key = self.endpoints.resolve(url).url
+        with self._fetch_lock:
+            future = self._fetch_futures.get(key)
+            if future is None:
+                if self._fetch_executor is None:
+                    # 送信間隔は共有ガバナーが保証するため、ワーカー数は応答待ちの重ね合わせにのみ影響する
+                    self._fetch_executor = ThreadPoolExecutor(max_workers=self.api_config.get("max_workers", 3))
+
+                def fetch_task() -> List[Product]:
+                    print(f"  {genre_name} を取得中… (URL: {url[:50]}...)")
+                    return self.fetch_items(url, genre_name)
+
+                future = self._fetch_executor.submit(fetch_task)
+                self._fetch_futures[key] = future
+            return future
+
+    def generate(self, accounts: List[str] | None = None) -> Dict[str, str]:
+        """全アカウントのジャンル設定に基づき、入力用 CSV を生成します。
+        
+        対象アカウント全体から一意なリクエスト URL の集合を作り、各 URL を共有のレート予算のもとで
+        1 回だけ取得して、購読しているすべてのアカウントへ結果を振り分けます。
+        
+        Args:
+            accounts: 処理対象のアカウント名（None の場合は全アカウント）
+            
+        Returns:
+            CSV の保存に成功したアカウント名から出力パスへのマッピング
+        """
+        with self._fetch_lock:
+            self._active_generations += 1
+        try:
+            return self._generate(accounts)
+        finally:
+            self._shutdown_fetch_executor()
+
+    def _shutdown_fetch_executor(self) -> None:
+        """実行中の generate が無くなった時点で、取得用のスレッドプールを終了します。
+
+        取得済みの結果は保持するため、同じインスタンスで後から generate を呼んでも重複は排除されます
+        （スレッドプールは次の取得時に作り直します）。
+        """
+        with self._fetch_lock:
+            self._active_generations -= 1
+            if self._active_generations or self._fetch_executor is None:
+                return
+            executor, self._fetch_executor = self._fetch_executor, None
+        executor.shutdown(wait=True)
+
+    def _generate(self, accounts: List[str] | None) -> Dict[str, str]:
+        """generate の本体。"""
+        outputs: Dict[str, str] = {}
+        run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+        # 1. 全アカウントのジャンル取得を一括で予約（同じ URL は 1 回のみ取得）
+        scheduled: Dict[str, List[Tuple[str, Future]]] = {}
+        total_requests = 0
         for account, data in self.accounts.items():
+            if accounts is not None and account not in accounts:
+                continue
             genres = data.get("genres")
 
             # ジャンル設定がないアカウントはスキップ
@@ -247,33 +348,30 @@ class InputCSVGenerator:
                 print(f"\n=== {account} はジャンル設定がないためスキップ ===")
                 continue
 
+            scheduled[account] = [
+                (name, self.fetch_items_shared(url, name)) for name, url in genres.items()
+            ]
+            total_requests += len(genres)
+
+        unique_requests = len({id(f) for tasks in scheduled.values() for _, f in tasks})
+        print(f"\n[INFO] 取得対象: {total_requests} ジャンル → 重複排除後 {unique_requests} リクエスト")
+
+        # 2. アカウントごとに結果を集約して CSV を保存
+        for account, tasks in scheduled.items():
             print("\n" + "!" * 50)
             print(f"!!! アクセス中のアカウント: {account}")
-            print(f"!!! 取得ジャンル: {list(genres.keys()) if genres else 'None'}")
+            print(f"!!! 取得ジャンル: {[name for name, _ in tasks]}")
             print("!" * 50 + "\n")
             account_items = []
 
-            # ジャンル名とURLのペアをリスト化
-            genre_tasks = list(genres.items())
-            
-            # APIの負荷制限を考慮し、アカウント内のジャンル取得を最大3並列で実行
-            # (楽天APIの1秒に1リクエスト制限を尊重しつつスループットを上げる)
-            with ThreadPoolExecutor(max_workers=3) as executor:
-
-                # genre_name, url の順でタプルを受け取る fetch_items_wrapper を定義
-                def fetch_items_wrapper(genre_info):
-                    name, url = genre_info
-                    print(f"  {name} を取得中… (URL: {url[:50]}...)")
-                    # 各スレッド内で適度な待機を入れ、APIの密度を分散
-                    time.sleep(0.5) 
-                    return self.fetch_items(url, name)
-
-                # 並列実行
-                future_results = list(executor.map(fetch_items_wrapper, genre_tasks))
-                
-                for items in future_results:
-                    print(f"    -> {len(items)}件取得しました")
-                    account_items.extend(items)
+            for name, future in tasks:
+                try:
+                    items = future.result()
+                except Exception as e:
+                    print(f"  [ERROR] {name} の取得に失敗しました: {e}")
+                    items = []
+                print(f"    -> {name}: {len(items)}件取得しました")
+                account_items.extend(items)
 
             if not account_items:
                 print(f"  [SKIP] 取得データが0件のため保存しません")
@@ -287,13 +385,23 @@ class InputCSVGenerator:
                 os.makedirs(os.path.dirname(output_path), exist_ok=True)
                 with open(output_path, "w", encoding="utf-8", newline="") as f:
                     writer = csv.writer(f)
-                    for row in account_items:
-                        writer.writerow(row)
+                    for product in account_items:
+                        writer.writerow(product.to_row())
                 print(f"  [SUCCESS] {output_path} を生成（合計: {len(account_items)}件）")
+                outputs[account] = output_path
             except Exception as e:
                 print(f"  [ERROR] ファイル保存失敗: {e}")
+                continue
+
+            fetched_at = datetime.now()
+            write_safely(self.columnar_store, DATASET_PRODUCTS, account, [
+                dict(asdict(product), fetched_at=fetched_at) for product in account_items
+            ])
+            if self.product_store:
+                self._record_history(account, account_items, run_id)
 
         print("\nすべてのアカウントの CSV 生成処理が完了しました！")
+        return outputs
 
 
 def main() -> None:
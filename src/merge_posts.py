@@ -37,15 +37,25 @@ class PostMerger:
 
         return merged
 
-    def merge(self) -> None:
-        """全アカウントのアフィリエイトポストと通常ポストをマージし、中間ファイルを削除します。"""
+    def merge(self, accounts: List[str] | None = None) -> Dict[str, str]:
+        """全アカウントのアフィリエイトポストと通常ポストをマージし、中間ファイルを削除します。
+        
+        Args:
+            accounts: 処理対象のアカウント名（None の場合は全アカウント）
+            
+        Returns:
+            マージに成功したアカウント名から出力パスへのマッピング
+        """
         base_path = "../data/output"
+        outputs: Dict[str, str] = {}
 
         if not os.path.exists(base_path):
             print(f"[ERROR] 出力フォルダが見つかりません: {base_path}")
-            return
+            return outputs
 
         for account in self.accounts.keys():
+            if accounts is not None and account not in accounts:
+                continue
             aff_file = os.path.join(base_path, f"{account}_affiliate_posts.txt")
             post_file = os.path.join(base_path, f"{account}_posts.txt")
 
@@ -77,6 +87,9 @@ class PostMerger:
             os.remove(post_file)
 
             print(f"[DONE] {account}: merged.txt を作成し、中間ファイルを削除しました")
+            outputs[account] = output_file
+
+        return outputs
 
 
 def main() -> None:
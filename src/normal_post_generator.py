@@ -1,10 +1,15 @@
 import time
+import asyncio
 import random
 import logging
+from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any
 from di_container import get_container, DIContainer
-from ai_helpers import generate_with_retry
+from ai_helpers import generate_with_retry, parse_json_response
+from async_generation_engine import AsyncGenerationEngine
+from columnar_store import get_columnar_store, write_safely, DATASET_NORMAL_POSTS
+from post_sanitizer import NORMAL_POST_SANITIZER
 
 
 class NormalPostGenerator:
@@ -22,7 +27,133 @@ class NormalPostGenerator:
         self.themes = self.container.get_themes()
         self.client = self.container.get_ai_client()
         self.logger: logging.Logger = self.container.get_logger(__name__)
+        # storage.format が parquet / arrow の場合のみ有効な列指向ストア
+        self.columnar_store = get_columnar_store(self.config)
     
+    @staticmethod
+    def _is_failed(p: str | None) -> bool:
+        """生成に失敗（空文字やエラーメッセージ）したポストかどうかを判定します。"""
+        if p is None:
+            return True
+        s = str(p).strip()
+        return s == "" or s.startswith("[AIエラー]")
+
+    def _clean_post_text(self, text: str) -> str:
+        """AI の生成結果を整形し、不適切な出力はエラーメッセージに置き換えます。
+        
+        Args:
+            text: AI が返した生のテキスト
+            
+        Returns:
+            整形済みのポスト文案、または "[AIエラー]" で始まるエラーメッセージ
+        """
+        return NORMAL_POST_SANITIZER.sanitize(text).as_post()
+
+    @staticmethod
+    def _build_batch_prompt(prompt: str, count: int) -> str:
+        """テーマのプロンプトに、複数件を JSON 配列で返すよう求める指示を付け加えます。"""
+        return f"""{prompt}
+
+上記の条件で、内容が互いに異なる投稿文を {count} 件作成してください。
+出力は JSON 配列のみとし、各要素を 1 件の投稿文（文字列）としてください。
+各投稿文の中で改行が必要な場合は \\n を使用してください。
+"""
+
+    def _parse_batch_posts(self, text: str, count: int) -> List[str]:
+        """JSON 配列の応答を解析し、各要素を整形・検証したポストのリストを返します。
+        
+        Args:
+            text: AI が返した JSON 配列の応答
+            count: 要求した件数
+            
+        Returns:
+            整形済みのポスト（失敗した要素はエラーメッセージ）のリスト。
+            応答の件数が不足する場合も、要求した件数分の要素を返します。
+        """
+        data = parse_json_response(text)
+        items = [item for item in data if isinstance(item, str)] if isinstance(data, list) else []
+        posts = [self._clean_post_text(item) for item in items[:count]]
+        posts.extend(["[AIエラー] バッチ応答に含まれていません"] * (count - len(posts)))
+        return posts
+
+    def _fill_batch_slots(self, posts: List[str], batch_results: List[str]) -> None:
+        """失敗しているスロットへ、バッチで再生成した成功ポストを順に埋めます。"""
+        failed_idxs = [i for i, p in enumerate(posts) if self._is_failed(p)]
+        for idx, text in zip(failed_idxs, [t for t in batch_results if not self._is_failed(t)]):
+            posts[idx] = text
+
+    def generate_posts_for_theme_batched(self, theme_key: str) -> List[str]:
+        """1 回のリクエストで複数件のポストを JSON 配列として生成します。
+        
+        posts_per_theme 件を batch_size 件ずつのリクエストにまとめ、
+        検証に失敗したスロットの件数分だけを再リクエストします。
+        
+        Args:
+            theme_key: テーマの名称またはキー
+            
+        Returns:
+            生成されたポスト文案（改行を \\n に変換済み）のリスト
+        """
+        section = self.config["normal_post_generation"]
+        prompt = self.themes[theme_key]
+        posts_per_theme = section["posts_per_theme"]
+        batch_size = max(1, int(section.get("batch_size", 1)))
+
+        # 同じプロンプトのバッチが同じキャッシュ応答を共有しないよう、バッチの番号をキャッシュのキーに含める
+        def generate_batch(slot: int, count: int, use_cache: bool = True) -> List[str]:
+            print(f"生成中: {theme_key} → {count}件（バッチ）")
+            self.logger.debug(f"テーマ '{theme_key}' のポストを {count} 件まとめて生成中")
+            text = generate_with_retry(
+                self.client, self._build_batch_prompt(prompt, count), section,
+                json_mode=True, use_cache=use_cache, cache_slot=slot
+            )
+            return self._parse_batch_posts(text, count)
+
+        counts = [min(batch_size, posts_per_theme - i) for i in range(0, posts_per_theme, batch_size)]
+        max_workers = (section.get("rate_limit") or {}).get("max_concurrent", 5)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            posts = [p for batch in executor.map(generate_batch, range(len(counts)), counts) for p in batch]
+
+        # 失敗したスロットの件数分だけをまとめて再リクエスト
+        retry_passes = section["retry_passes"]
+        for rp in range(1, retry_passes + 1):
+            failed_count = sum(1 for p in posts if self._is_failed(p))
+            if not failed_count:
+                break
+            print(f"[再試行パス {rp}/{retry_passes}] 失敗したスロットを再生成します: {failed_count} 件")
+            self.logger.info(f"再試行パス {rp}/{retry_passes}: 失敗したスロット {failed_count} 件")
+            self._fill_batch_slots(posts, generate_batch(len(counts) + rp - 1, failed_count, use_cache=False))
+
+        return posts
+
+    async def generate_posts_for_theme_batched_async(self, theme_key: str, engine: AsyncGenerationEngine) -> List[str]:
+        """generate_posts_for_theme_batched の非同期版。"""
+        section = self.config["normal_post_generation"]
+        prompt = self.themes[theme_key]
+        posts_per_theme = section["posts_per_theme"]
+        batch_size = max(1, int(section.get("batch_size", 1)))
+
+        async def generate_batch(slot: int, count: int, use_cache: bool = True) -> List[str]:
+            text = await engine.generate(
+                self._build_batch_prompt(prompt, count), section,
+                json_mode=True, use_cache=use_cache, cache_slot=slot
+            )
+            return self._parse_batch_posts(text, count)
+
+        counts = [min(batch_size, posts_per_theme - i) for i in range(0, posts_per_theme, batch_size)]
+        batches = await asyncio.gather(*(generate_batch(slot, c) for slot, c in enumerate(counts)))
+        posts = [p for batch in batches for p in batch]
+
+        retry_passes = section["retry_passes"]
+        for rp in range(1, retry_passes + 1):
+            failed_count = sum(1 for p in posts if self._is_failed(p))
+            if not failed_count:
+                break
+            self.logger.info(f"再試行パス {rp}/{retry_passes}: {theme_key} の失敗したスロット {failed_count} 件")
+            self._fill_batch_slots(posts, await generate_batch(len(counts) + rp - 1, failed_count, use_cache=False))
+
+        return posts
+
     def generate_posts_for_theme(self, theme_key: str) -> List[str]:
         """特定のテーマに基づいて複数のポスト文案を生成します。
         
@@ -32,63 +163,30 @@ class NormalPostGenerator:
         Returns:
             生成されたポスト文案（改行を \\n に変換済み）のリスト
         """
+        # batch_size が 2 以上の場合は複数件を 1 リクエストにまとめる
+        if self.config["normal_post_generation"].get("batch_size", 1) > 1:
+            return self.generate_posts_for_theme_batched(theme_key)
+
         prompt = self.themes[theme_key]
         posts = []
         
         def generate_single_post(index):
             print(f"生成中: {theme_key} → {index+1}/{posts_per_theme}")
             self.logger.debug(f"テーマ '{theme_key}' のポスト生成中 ({index+1}/{posts_per_theme})")
-            text = generate_with_retry(self.client, prompt, self.config["normal_post_generation"])
-            
-            # ===== Step 1: 改行をリテラル形式に統一 =====
-            text = text.replace("\r\n", "\\n").replace("\n", "\\n")
-            
-            # ===== Step 2: 不要な文字列（ノイズ）の除去 =====
-            import re
-            text = re.sub(r'^【.*?】', '', text)
-            text = re.sub(r'^例[1-9]：', '', text)
-            text = re.sub(r'^例：', '', text)
-            text = re.sub(r'上記例を参考にして.*', '', text)
-            text = re.sub(r'他に\d+パターン.*', '', text)
-            
-            # ===== Step 3: \\n のノーマライズ =====
-            # AI が \\n（二重エスケープ）を出力する場合があるため \n に統一
-            text = text.replace("\\\\n", "\\n")
-            while "\\n\\n\\n" in text:
-                text = text.replace("\\n\\n\\n", "\\n\\n")
-            while text.startswith("\\n"):
-                text = text[2:]
-            while text.endswith("\\n"):
-                text = text[:-2]
-            text = text.strip()
-            
-            # ===== Step 4: プレースホルダ検知 =====
-            placeholder_pattern = r'\[.*?\]|【.*?】|〇{2,}|○{2,}|◯{2,}|[X]{2,}|[x]{2,}|[△]{2,}|[Δ]{2,}|[×]{2,}'
-            template_words = ["ブランド名", "商品名", "店舗名", "会社名", "カテゴリー", "〇〇", "○○"]
-            if re.search(placeholder_pattern, text) or any(w in text for w in template_words):
-                return "[AIエラー] プレースホルダまたはテンプレート用単語が含まれています"
-                
-            # ===== Step 5: 外国語エラー判定 =====
-            if not re.search(r'[ぁ-んァ-ン一-龥]', text):
-                 return "[AIエラー] 日本語が含まれていません"
-            
-            return text
+            # 同じプロンプトの各件が同じキャッシュ応答を共有しないよう、件の番号をキャッシュのキーに含める
+            text = generate_with_retry(self.client, prompt, self.config["normal_post_generation"], cache_slot=index)
+            return self._clean_post_text(text)
 
         # 設定ファイルからテーマあたりの生成件数を取得
         posts_per_theme = self.config["normal_post_generation"]["posts_per_theme"]
 
-        # AIのレート制限を考慮し、並列数を制限（例：最大5並列）
-        with ThreadPoolExecutor(max_workers=5) as executor:
+        # AIのレート制限を考慮し、並列数を同時実行予算 (rate_limit.max_concurrent) に合わせる
+        max_workers = (self.config["normal_post_generation"].get("rate_limit") or {}).get("max_concurrent", 5)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
             posts = list(executor.map(generate_single_post, range(posts_per_theme)))
 
         # 生成に失敗（空文字やエラーメッセージ）したポストの再試行処理
-        def _is_failed(p: str | None) -> bool:
-            if p is None:
-                return True
-            s = str(p).strip()
-            return s == "" or s.startswith("[AIエラー]")
-
-        failed_idxs = [i for i, p in enumerate(posts) if _is_failed(p)]
+        failed_idxs = [i for i, p in enumerate(posts) if self._is_failed(p)]
         if failed_idxs:
             retry_passes = self.config["normal_post_generation"]["retry_passes"]
             for rp in range(1, retry_passes + 1):
@@ -96,10 +194,12 @@ class NormalPostGenerator:
                 self.logger.info(f"再試行パス {rp}/{retry_passes}: 失敗したポスト {len(failed_idxs)} 件")
                 for idx in failed_idxs[:]:
                     print(f"再試行: {theme_key} インデックス {idx+1}")
-                    text = generate_with_retry(self.client, prompt, self.config["normal_post_generation"])
-                    if text:
-                        text = text.replace("\n", "\\n")
-                    if not _is_failed(text):
+                    text = self._clean_post_text(
+                        generate_with_retry(
+                            self.client, prompt, self.config["normal_post_generation"], use_cache=False, cache_slot=idx
+                        ) or ""
+                    )
+                    if not self._is_failed(text):
                         posts[idx] = text
                         failed_idxs.remove(idx)
                 if not failed_idxs: # 全て成功したらループを抜ける
@@ -107,36 +207,130 @@ class NormalPostGenerator:
 
         return posts
 
-    def generate(self) -> None:
-        """全アカウントに対してポスト生成処理を実行します。"""
-        for account, data in self.accounts.items():
-            theme_list = data.get("themes", [])
+    async def generate_posts_for_theme_async(self, theme_key: str, engine: AsyncGenerationEngine) -> List[str]:
+        """generate_posts_for_theme の非同期版。共有レート予算のもとで全件を同時に投入します。
+        
+        Args:
+            theme_key: テーマの名称またはキー
+            engine: 非同期生成エンジン
+            
+        Returns:
+            生成されたポスト文案（改行を \\n に変換済み）のリスト
+        """
+        if self.config["normal_post_generation"].get("batch_size", 1) > 1:
+            return await self.generate_posts_for_theme_batched_async(theme_key, engine)
+
+        prompt = self.themes[theme_key]
+        section = self.config["normal_post_generation"]
+        posts_per_theme = section["posts_per_theme"]
+
+        async def generate_single_post(index: int, use_cache: bool = True) -> str:
+            return self._clean_post_text(await engine.generate(prompt, section, use_cache=use_cache, cache_slot=index))
+
+        posts = list(await asyncio.gather(*(generate_single_post(i) for i in range(posts_per_theme))))
+
+        # 失敗したスロットのみをまとめて再実行
+        failed_idxs = [i for i, p in enumerate(posts) if self._is_failed(p)]
+        retry_passes = section["retry_passes"]
+        for rp in range(1, retry_passes + 1):
+            if not failed_idxs:
+                break
+            self.logger.info(f"再試行パス {rp}/{retry_passes}: {theme_key} の失敗したポスト {len(failed_idxs)} 件")
+            retried = await asyncio.gather(*(generate_single_post(idx, use_cache=False) for idx in failed_idxs))
+            for idx, text in zip(failed_idxs[:], retried):
+                if not self._is_failed(text):
+                    posts[idx] = text
+                    failed_idxs.remove(idx)
+
+        return posts
+
+    def _select_themes(self, account: str, data: Dict[str, Any]) -> List[str]:
+        """アカウントごとに指定された件数のテーマをランダムに選択します。"""
+        theme_list = data.get("themes", [])
+        selected_count = self.config["normal_post_generation"]["selected_themes_per_account"]
+        selected_themes = random.sample(theme_list, min(selected_count, len(theme_list)))
+        print(f"選択されたテーマ: {selected_themes}")
+        self.logger.debug(f"選択済みテーマ: {selected_themes}")
+        return selected_themes
+
+    def _write_posts(self, account: str, all_posts: List[str]) -> str:
+        """ポストの順序をランダムに入れ替えて、アカウントの出力ファイルに書き出します。
+        
+        Returns:
+            出力ファイルのパス
+        """
+        # 順序をランダムに入れ替え
+        random.shuffle(all_posts)
+        output_path = f"../data/output/{account}_posts.txt"
+
+        # 結果をテキストファイルに出力
+        with open(output_path, "w", encoding="utf-8") as f:
+            for p in all_posts:
+                f.write(p + "\n")
+
+        print(f"{account} の通常ポスト {len(all_posts)}件を出力しました → {output_path}")
+
+        generated_at = datetime.now()
+        write_safely(self.columnar_store, DATASET_NORMAL_POSTS, account, [
+            {"post": p, "status": "failed" if self._is_failed(p) else "done", "generated_at": generated_at}
+            for p in all_posts
+        ])
+        return output_path
 
+    def generate(self, accounts: List[str] | None = None) -> Dict[str, str]:
+        """全アカウントに対してポスト生成処理を実行します。
+        
+        generation_policy.yaml の generation_engine が "async" の場合は、
+        全アカウント・全テーマのリクエストを非同期エンジンで同時にスケジュールします。
+        
+        Args:
+            accounts: 処理対象のアカウント名（None の場合は全アカウント）
+            
+        Returns:
+            出力に成功したアカウント名から出力パスへのマッピング
+        """
+        targets = {
+            account: data for account, data in self.accounts.items()
+            if accounts is None or account in accounts
+        }
+        if self.config.get("generation_engine") == "async":
+            return self._generate_async(targets)
+
+        outputs: Dict[str, str] = {}
+        for account, data in targets.items():
             print(f"\n=== {account} の通常ポスト生成開始 ===")
             self.logger.info(f"アカウント '{account}' の通常ポスト生成を開始します")
 
-            # アカウントごとに指定された件数のテーマをランダムに選択
-            selected_count = self.config["normal_post_generation"]["selected_themes_per_account"]
-            selected_themes = random.sample(theme_list, min(selected_count, len(theme_list)))
-            print(f"選択されたテーマ: {selected_themes}")
-            self.logger.debug(f"選択済みテーマ: {selected_themes}")
+            selected_themes = self._select_themes(account, data)
             all_posts = []
             for theme in selected_themes:
                 posts = self.generate_posts_for_theme(theme)
                 all_posts.extend(posts)
 
-            # 順序をランダムに入れ替え
-            random.shuffle(all_posts)
-            output_path = f"../data/output/{account}_posts.txt"
+            outputs[account] = self._write_posts(account, all_posts)
+
+        print("\nすべてのアカウントの通常ポスト生成が完了しました！")
+        return outputs
 
-            # 結果をテキストファイルに出力
-            with open(output_path, "w", encoding="utf-8") as f:
-                for p in all_posts:
-                    f.write(p + "\n")
+    def _generate_async(self, targets: Dict[str, Any]) -> Dict[str, str]:
+        """全アカウントのテーマを非同期エンジンへ一括投入し、完了したアカウントから出力します。"""
+        engine = AsyncGenerationEngine(self.client, self.logger)
+        outputs: Dict[str, str] = {}
+        jobs: Dict[str, List[Any]] = {}
+        for account, data in targets.items():
+            self.logger.info(f"アカウント '{account}' の通常ポスト生成を予約します")
+            jobs[account] = [
+                (lambda theme=theme: self.generate_posts_for_theme_async(theme, engine))
+                for theme in self._select_themes(account, data)
+            ]
 
-            print(f"{account} の通常ポスト {len(all_posts)}件を出力しました → {output_path}")
+        def on_account_done(account: str, results: List[Any]) -> None:
+            all_posts = [p for posts in results if posts for p in posts]
+            outputs[account] = self._write_posts(account, all_posts)
 
+        engine.run(jobs, on_account_done)
         print("\nすべてのアカウントの通常ポスト生成が完了しました！")
+        return outputs
 
 
 def main() -> None:
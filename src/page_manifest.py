@@ -0,0 +1,294 @@
+"""
+リダイレクトページのマニフェストモジュール。
+生成済みのリダイレクトページごとに、ファイル名・本文のハッシュ・最後に使用した実行 ID と日時を
+SQLite に記録し、内容が変わらないページの再書き込みの省略と、保持期間を過ぎたページの削除
+（出力ディレクトリの走査やファイルの更新日時に依存しない）に使用します。
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Optional, Set, Tuple
+from html_layout import PageLayout
+
+
+DEFAULT_PAGE_MANIFEST_PATH: str = "../data/redirect_pages.sqlite3"
+DEFAULT_SWEEP_BATCH_SIZE: int = 500
+
+# 索引の導入前から出力ディレクトリにあったページの実行 ID
+LEGACY_RUN_ID = ""
+
+
+def content_hash(content: str) -> str:
+    """ページ本文の SHA-256（16 進数）を返します。"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class PageManifest:
+    """リダイレクトページの書き込み記録と保持期間の索引を兼ねる、スレッドセーフなマニフェスト。
+
+    ページは実行 ID（"%Y%m%d_%H%M%S" 形式）ごとに記録され、書き込みを省略したページも
+    その実行で使用したページとして記録されます。
+    """
+
+    def __init__(self, path: str = DEFAULT_PAGE_MANIFEST_PATH):
+        """マニフェストを初期化し、必要であればデータベースを作成します。
+
+        Args:
+            path: SQLite ファイルのパス
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS pages (
+                    filename TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            # 保持期間の索引（作成日時と、最後に使用した実行）
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(pages)")}
+            if "used_at" not in columns:
+                self._conn.execute("ALTER TABLE pages ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+                self._conn.execute(f"ALTER TABLE pages ADD COLUMN run_id TEXT NOT NULL DEFAULT '{LEGACY_RUN_ID}'")
+                self._conn.execute("ALTER TABLE pages ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+                # 既存の記録は最後の書き込み日時を作成・使用日時とみなす
+                self._conn.execute("UPDATE pages SET created_at = updated_at, used_at = updated_at")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_pages_hash ON pages (content_hash)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_pages_used ON pages (used_at)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_pages_run ON pages (run_id)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS manifest_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            # 書き込み・削除したが、まだ公開（Git へのコミット）していないファイル
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pending_publish (path TEXT PRIMARY KEY, recorded_at REAL NOT NULL)"
+            )
+
+    def hashes(self, filenames: List[str]) -> Dict[str, str]:
+        """記録済みのファイル名について、本文のハッシュを返します（未記録のファイル名は含みません）。"""
+        result: Dict[str, str] = {}
+        with self._lock:
+            for filename in filenames:
+                row = self._conn.execute(
+                    "SELECT content_hash FROM pages WHERE filename = ?", (filename,)
+                ).fetchone()
+                if row is not None:
+                    result[filename] = row[0]
+        return result
+
+    def filenames(self) -> Set[str]:
+        """記録されているすべてのファイル名を返します。"""
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT filename FROM pages")}
+
+    def find_by_hash(self, digest: str) -> Optional[str]:
+        """同じ本文で記録済みのページのファイル名を返します（無い場合は None）。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT filename FROM pages WHERE content_hash = ? ORDER BY updated_at DESC LIMIT 1", (digest,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def record_run(self, run_id: str, written: List[Tuple[str, str]], kept: List[str]) -> None:
+        """1 回の一括書き込みの結果を 1 回のトランザクションで記録します。
+
+        Args:
+            run_id: 実行 ID
+            written: 書き込んだページの (ファイル名, 本文のハッシュ)
+            kept: 本文が同一のため書き込みを省略したページのファイル名
+        """
+        if not written and not kept:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT INTO pages (filename, content_hash, updated_at, created_at, run_id, used_at)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (filename) DO UPDATE SET
+                     content_hash = excluded.content_hash, updated_at = excluded.updated_at,
+                     run_id = excluded.run_id, used_at = excluded.used_at""",
+                [(filename, digest, now, now, run_id, now) for filename, digest in written]
+            )
+            self._conn.executemany(
+                "UPDATE pages SET run_id = ?, used_at = ? WHERE filename = ?",
+                [(run_id, now, filename) for filename in kept]
+            )
+
+    def forget(self, filenames: List[str]) -> None:
+        """削除したページの記録を取り除きます。"""
+        if not filenames:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM pages WHERE filename = ?", [(f,) for f in filenames])
+
+    def mark_changed(self, paths: Iterable[str]) -> None:
+        """書き込み・削除したファイルを未公開の変更として記録します（パスは絶対パスで保存）。"""
+        now = time.time()
+        rows = [(os.path.abspath(path), now) for path in paths]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO pending_publish (path, recorded_at) VALUES (?, ?)", rows)
+
+    def pending_changes(self) -> List[str]:
+        """未公開の変更があるファイルの絶対パスを返します。"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT path FROM pending_publish ORDER BY path")]
+
+    def clear_changes(self, paths: Iterable[str]) -> None:
+        """公開済みになったファイルを未公開の変更から取り除きます。"""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM pending_publish WHERE path = ?", [(p,) for p in paths])
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM manifest_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: Optional[str]) -> None:
+        """メタ情報を保存します（None の場合は削除）。"""
+        with self._lock, self._conn:
+            if value is None:
+                self._conn.execute("DELETE FROM manifest_meta WHERE key = ?", (key,))
+            else:
+                self._conn.execute("INSERT OR REPLACE INTO manifest_meta (key, value) VALUES (?, ?)", (key, value))
+
+    def adopt_existing(self, layout: PageLayout, excluded_files: Iterable[str] = ()) -> int:
+        """索引の導入前から出力ディレクトリにあるページを、一度だけ索引に取り込みます。
+
+        取り込んだページの使用日時には、その時点のファイルの更新日時を使用します。
+        2 回目以降の呼び出しでは出力ディレクトリを走査しません。
+
+        Returns:
+            取り込んだページ数
+        """
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM manifest_meta WHERE key = 'adopted'").fetchone():
+                return 0
+            rows = []
+            for filename, path in layout.iter_pages():
+                if f"{filename}.html" in excluded_files:
+                    continue
+                mtime = os.path.getmtime(path)
+                rows.append((filename, mtime, mtime, LEGACY_RUN_ID, mtime))
+            # 記録済みのページは上書きしない
+            before = self._conn.total_changes
+            self._conn.executemany(
+                """INSERT OR IGNORE INTO pages (filename, content_hash, updated_at, created_at, run_id, used_at)
+                   VALUES (?, '', ?, ?, ?, ?)""",
+                rows
+            )
+            adopted = self._conn.total_changes - before
+            self._conn.execute("INSERT INTO manifest_meta (key, value) VALUES ('adopted', ?)", (str(time.time()),))
+            return adopted
+
+    def expired(self, retention_seconds: float, now: Optional[float] = None) -> List[Tuple[str, str]]:
+        """削除対象のページと理由を返します。
+
+        次のいずれかに該当するページが対象です。
+        - 保持期間超過: 最後に使用されてから retention_seconds 以上経過している
+        - 当日内の古いセット: 本日の実行で使用されたが、最新の実行では使用されていない
+
+        Returns:
+            (ファイル名, 理由) のリスト
+        """
+        now = time.time() if now is None else now
+        today = datetime.fromtimestamp(now).strftime("%Y%m%d")
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(run_id) FROM pages WHERE run_id != ?", (LEGACY_RUN_ID,)
+            ).fetchone()
+            latest_run = row[0] if row and row[0] else None
+            rows = self._conn.execute(
+                """SELECT filename, CASE WHEN used_at < ? THEN '保持期間超過' ELSE '当日内の古いセット' END
+                   FROM pages
+                   WHERE used_at < ? OR (run_id >= ? AND run_id < ? AND run_id != ?)
+                   ORDER BY used_at""",
+                (now - retention_seconds, now - retention_seconds, today, latest_run or today, LEGACY_RUN_ID)
+            ).fetchall()
+        return [(filename, reason) for filename, reason in rows]
+
+    def sweep(
+        self,
+        layout: PageLayout,
+        retention_seconds: float,
+        batch_size: int = DEFAULT_SWEEP_BATCH_SIZE,
+        excluded_files: Iterable[str] = ()
+    ) -> List[Tuple[str, str]]:
+        """削除対象のページを索引から求め、batch_size 件ずつファイルの削除と記録の除去を行います。
+
+        処理量は削除対象のページ数に比例し、出力ディレクトリ内のファイル数には依存しません。
+        既に存在しないファイルは削除済みとして扱います。
+
+        Args:
+            layout: リダイレクトページの配置
+            retention_seconds: 保持期間（秒）
+            batch_size: 1 回のトランザクションで記録を除去するページ数
+            excluded_files: 削除しないファイル名（例: "index.html"）
+
+        Returns:
+            削除した (出力ディレクトリからの相対パス, 理由) のリスト
+        """
+        excluded = set(excluded_files)
+        targets = [
+            (filename, reason) for filename, reason in self.expired(retention_seconds)
+            if f"{filename}.html" not in excluded
+        ]
+        removed: List[Tuple[str, str]] = []
+        batch_size = max(1, batch_size)
+        for i in range(0, len(targets), batch_size):
+            done = []
+            deleted_paths = []
+            for filename, reason in targets[i:i + batch_size]:
+                path = layout.existing_path(filename)
+                try:
+                    if path is not None:
+                        os.remove(path)
+                        deleted_paths.append(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"削除失敗: {layout.relative_path(filename)} - {e}")
+                    continue
+                done.append(filename)
+                removed.append((layout.relative_path(filename), reason))
+            self.forget(done)
+            self.mark_changed(deleted_paths)
+        return removed
+
+
+# パスごとに共有されるマニフェスト
+_manifests: Dict[str, PageManifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def get_page_manifest(policy: Dict[str, Any]) -> PageManifest:
+    """generation_policy.yaml の redirect_pages セクションに対応する共有のマニフェストを取得します。
+
+    Args:
+        policy: generation_policy.yaml 全体の辞書。redirect_pages キー配下の manifest_path を参照します
+
+    Returns:
+        共有の PageManifest インスタンス
+    """
+    settings = policy.get("redirect_pages") or {}
+    path = settings.get("manifest_path", DEFAULT_PAGE_MANIFEST_PATH)
+    with _manifests_lock:
+        manifest = _manifests.get(path)
+        if manifest is None:
+            manifest = PageManifest(path)
+            _manifests[path] = manifest
+        return manifest
@@ -0,0 +1,169 @@
+"""
+ポスト文案の整形モジュール。
+AI の生成結果から不要な文字列を取り除き、改行を投稿用のリテラル \\n 形式に正規化したうえで、
+プレースホルダの残りや日本語以外の出力を検出します。パターンはモジュール読み込み時に一度だけ
+コンパイルし、通常ポスト・アフィリエイトポストの両方で同じ処理を使用します。
+"""
+import re
+import time
+import argparse
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+# 却下の理由
+REJECT_PLACEHOLDER = "placeholder"
+REJECT_NOT_JAPANESE = "not_japanese"
+
+# 却下の理由 → ポストの代わりに出力するエラーメッセージ
+REJECT_MESSAGES = {
+    REJECT_PLACEHOLDER: "[AIエラー] プレースホルダまたはテンプレート用単語が含まれています",
+    REJECT_NOT_JAPANESE: "[AIエラー] 日本語が含まれていません",
+}
+
+# 投稿用の改行（リテラル \n）
+NEWLINE = "\\n"
+
+_URL = re.compile(r'https?://[\w/:%#\$&\?\(\)~\.=\+\-]+')
+# 先頭の見出し・例示の番号（順に適用）
+_LEADING_NOISE = (
+    re.compile(r'^【.*?】'),
+    re.compile(r'^例[1-9]：'),
+    re.compile(r'^例：'),
+)
+# 指示文の復唱（以降をすべて除去）
+_TRAILING_NOISE = re.compile(r'(?:上記例を参考にして|他に\d+パターン).*')
+# 先頭・末尾の \n と、3 つ以上連続する \n（1 回の走査で処理）
+_NEWLINE_RUNS = re.compile(r'^(?:\\n)+|(?:\\n)+$|(?:\\n){3,}')
+_PLACEHOLDER = re.compile(
+    r'\[.*?\]|【.*?】|〇{2,}|○{2,}|◯{2,}|[X]{2,}|[x]{2,}|[△]{2,}|[Δ]{2,}|[×]{2,}'
+    r'|ブランド名|商品名|店舗名|会社名|カテゴリー'
+)
+_JAPANESE = re.compile(r'[ぁ-んァ-ン一-龥]')
+_HASHTAG = re.compile(r'([^\\n])#')
+
+
+@dataclass(frozen=True, slots=True)
+class SanitizeResult:
+    """整形結果。却下された場合は reason に理由 (REJECT_*) が入ります。"""
+    text: str
+    reason: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.reason is None
+
+    def as_post(self) -> str:
+        """投稿用の文案、または却下の理由に応じた "[AIエラー]" で始まるエラーメッセージを返します。"""
+        return self.text if self.reason is None else REJECT_MESSAGES[self.reason]
+
+
+class PostSanitizer:
+    """AI の生成結果を整形・検証する処理。
+
+    strip_urls を指定すると URL と [短縮URL] 等のプレースホルダを除去し（アフィリエイトポストでは
+    URL を後から結合するため）、break_hashtags を指定するとハッシュタグの前に改行を挿入します。
+    """
+
+    def __init__(self, strip_urls: bool = False, break_hashtags: bool = False):
+        """初期化。
+
+        Args:
+            strip_urls: 本文中の URL と短縮 URL のプレースホルダを除去するかどうか
+            break_hashtags: ハッシュタグの前に改行を挿入するかどうか
+        """
+        self.strip_urls = strip_urls
+        self.break_hashtags = break_hashtags
+
+    @staticmethod
+    def _newline_run(match: "re.Match[str]") -> str:
+        # 先頭・末尾の \n は除去し、途中の 3 つ以上の連続は 2 つに圧縮する
+        if match.start() == 0 or match.end() == len(match.string):
+            return ""
+        return NEWLINE * 2
+
+    def sanitize(self, text: str) -> SanitizeResult:
+        """生成結果を整形し、投稿に使用できるかを判定します。
+
+        Args:
+            text: AI が返した生のテキスト
+
+        Returns:
+            SanitizeResult
+        """
+        # 改行をリテラル形式に統一（行ずれ防止の最重要対策）
+        text = text.replace("\r\n", NEWLINE).replace("\n", NEWLINE)
+
+        # URL やプレースホルダの排除
+        if self.strip_urls:
+            text = _URL.sub("", text)
+            text = text.replace("[短縮URL]", NEWLINE).replace("【短縮URL】", NEWLINE)
+
+        # 不要な文字列（ノイズ）の除去
+        for pattern in _LEADING_NOISE:
+            text = pattern.sub("", text, count=1)
+        text = text.replace("本文：", "").replace("投稿内容：", "")
+        text = _TRAILING_NOISE.sub("", text, count=1)
+
+        # \n のノーマライズ（AI が \\n（二重エスケープ）を出力する場合があるため \n に統一）
+        text = text.replace("\\\\n", NEWLINE)
+        text = _NEWLINE_RUNS.sub(self._newline_run, text).strip()
+
+        # プレースホルダ / テンプレート用単語の検知
+        if _PLACEHOLDER.search(text):
+            return SanitizeResult(text, REJECT_PLACEHOLDER)
+        # 外国語エラー判定
+        if not _JAPANESE.search(text):
+            return SanitizeResult(text, REJECT_NOT_JAPANESE)
+
+        # ハッシュタグの前に改行を挿入
+        if self.break_hashtags and "#" in text:
+            text = text.replace(" #", "\\n#").replace("　#", "\\n#")
+            text = _HASHTAG.sub(r'\1\\n#', text)
+        return SanitizeResult(text)
+
+
+# 通常ポスト・アフィリエイトポストで共有する整形処理
+NORMAL_POST_SANITIZER = PostSanitizer()
+AFFILIATE_POST_SANITIZER = PostSanitizer(strip_urls=True, break_hashtags=True)
+
+# ベンチマーク用の生成結果の例
+_BENCHMARK_SAMPLES = [
+    "【投稿例】例1：今日は朝からカフェでのんびり。\n\n\n新しい豆の香りに癒されました☕ #カフェ #朝活",
+    "本文：秋の夜長に読みたい一冊📚\\n\\n\\n\\nページをめくる手が止まりません。 #読書 #おすすめ本\n上記例を参考にして他のパターンも",
+    "\n\nこの保湿クリーム、しっとり感が一日続きます✨ https://example.com/item?id=1 [短縮URL]\n\n",
+    "Great product for everyday use! #sale",
+    "〇〇で話題の商品名をチェック！ブランド名の新作です",
+]
+
+
+def benchmark(sanitizer: PostSanitizer, iterations: int = 20000, samples: Optional[List[str]] = None) -> float:
+    """整形処理のスループットを計測します。
+
+    Args:
+        sanitizer: 計測対象の整形処理
+        iterations: 整形する回数
+        samples: 整形するテキスト（省略時は組み込みの例を順に使用）
+
+    Returns:
+        1 秒あたりの整形件数
+    """
+    samples = samples or _BENCHMARK_SAMPLES
+    started = time.perf_counter()
+    for i in range(iterations):
+        sanitizer.sanitize(samples[i % len(samples)])
+    return iterations / (time.perf_counter() - started)
+
+
+def main() -> None:
+    """整形処理のスループットを表示します。"""
+    parser = argparse.ArgumentParser(description="ポスト文案の整形処理のスループットを計測します")
+    parser.add_argument("--iterations", type=int, default=20000, help="整形する回数")
+    args = parser.parse_args()
+
+    for label, sanitizer in (("normal", NORMAL_POST_SANITIZER), ("affiliate", AFFILIATE_POST_SANITIZER)):
+        print(f"{label}: {benchmark(sanitizer, args.iterations):,.0f} 件/秒")
+
+
+if __name__ == "__main__":
+    main()
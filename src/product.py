@@ -0,0 +1,124 @@
+"""
+商品レコードモジュール。
+楽天 API から取得した商品・ホテル情報を、取得・CSV 保存・HTML 生成・プロンプト作成の全工程で
+共通して扱う型付きのイミュータブルなレコードとして定義します。
+"""
+import math
+from dataclasses import dataclass
+from urllib.parse import urlparse, parse_qs
+from typing import Any, List, Sequence
+
+
+def _to_int(value: Any, default: int | None) -> int | None:
+    """数値または数値文字列（"1,280" や "3.0" を含む）を整数に変換します。
+
+    変換できない値と、無限大・NaN（"inf" や "1e999" を含む）は default。
+    """
+    if value is None or isinstance(value, bool):
+        return default
+    if isinstance(value, int):
+        return value
+    try:
+        number = float(str(value).replace(",", "").strip())
+        return int(number) if math.isfinite(number) else default
+    except (ValueError, OverflowError):
+        return default
+
+
+def _to_float(value: Any, default: float) -> float:
+    """数値または数値文字列を浮動小数点数に変換します。変換できない値と、無限大・NaN は default。"""
+    if value is None or isinstance(value, bool):
+        return default
+    try:
+        number = float(str(value).replace(",", "").strip())
+    except (ValueError, OverflowError):
+        return default
+    return number if math.isfinite(number) else default
+
+
+@dataclass(frozen=True, slots=True)
+class Product:
+    """商品（またはホテル）1 件分の情報。数値項目は生成時に一度だけ解析されます。"""
+    name: str
+    url: str
+    image_url: str = ""
+    price: int | None = None   # 不明な場合は None
+    review_average: float = 0.0
+    review_count: int = 0
+    point_rate: int = 1
+
+    @classmethod
+    def parse(
+        cls,
+        name: Any,
+        url: Any,
+        image_url: Any = "",
+        price: Any = None,
+        review_average: Any = 0.0,
+        review_count: Any = 0,
+        point_rate: Any = 1
+    ) -> "Product":
+        """API 応答や CSV の値（数値・文字列・空値が混在）から Product を作成します。
+
+        数値として解釈できない値は既定値に置き換えるため、不正な値が含まれていても例外になりません。
+        """
+        return cls(
+            name=str(name or "").strip(),
+            url=str(url or "").strip(),
+            image_url=str(image_url or "").strip(),
+            price=_to_int(price, None),
+            review_average=_to_float(review_average, 0.0),
+            review_count=_to_int(review_count, 0) or 0,
+            point_rate=max(1, _to_int(point_rate, 1) or 1),
+        )
+
+    @classmethod
+    def from_row(cls, row: Sequence[str]) -> "Product | None":
+        """入力 CSV の 1 行（商品名, 商品URL, 画像URL, 価格, レビュー平均, レビュー数, ポイント倍率）から作成します。
+
+        Returns:
+            Product。必須項目（商品名・商品URL・画像URL の列）が不足している場合は None
+        """
+        if len(row) < 3:
+            return None
+        return cls.parse(*row[:7])
+
+    def to_row(self) -> List[Any]:
+        """入力 CSV の 1 行に変換します（from_row と対になる形式）。"""
+        return [
+            self.name,
+            self.url,
+            self.image_url,
+            self.price_text,
+            self.review_average,
+            self.review_count,
+            self.point_rate,
+        ]
+
+    @property
+    def is_valid(self) -> bool:
+        """商品名と商品 URL が揃っているかどうか。"""
+        return bool(self.name and self.url)
+
+    @property
+    def item_key(self) -> str:
+        """商品を識別するキー（例: "item.rakuten.co.jp/shop/itemcode"）。
+
+        アフィリエイト URL の場合は転送先 (pc パラメータ) の商品ページ URL を、
+        それ以外は URL 自体を、クエリを除いたホスト + パスに正規化します。
+        """
+        parsed = urlparse(self.url)
+        target = parse_qs(parsed.query).get("pc")
+        if target:
+            parsed = urlparse(target[0])
+        return f"{parsed.netloc.lower()}{parsed.path.rstrip('/')}" or self.url
+
+    @property
+    def price_text(self) -> str:
+        """表示用の価格（不明な場合は空文字列）。"""
+        return "" if self.price is None else str(self.price)
+
+    @property
+    def review_text(self) -> str:
+        """表示用のレビュー平均点（例: "4.5"）。"""
+        return str(round(self.review_average, 2))
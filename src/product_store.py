@@ -0,0 +1,239 @@
+"""
+商品履歴ストアモジュール。
+取得した商品を商品キー（Product.item_key）単位で SQLite に蓄積し、価格・レビューの履歴と、
+前回の取得からの変化（新着・値下げ・評価上昇など）を記録します。
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Any, Optional, Set
+from product import Product
+
+
+DEFAULT_PRODUCT_STORE_PATH: str = "../data/products.sqlite3"
+
+# 変化の種類
+CHANGE_NEW = "new"
+CHANGE_PRICE_DOWN = "price_down"
+CHANGE_PRICE_UP = "price_up"
+CHANGE_REVIEW_UP = "review_up"
+CHANGE_POINT_UP = "point_up"
+CHANGE_UNCHANGED = "unchanged"
+
+
+def detect_change(previous: Optional[tuple], product: Product) -> str:
+    """前回の状態 (price, review_average, point_rate) と比較して変化の種類を判定します。
+
+    複数の変化がある場合は、投稿の訴求力が高いもの（値下げ → ポイント増 → 評価上昇 → 値上げ）を優先します。
+    レビュー件数は増え続けるのが通常のため、変化として扱いません。
+    """
+    if previous is None:
+        return CHANGE_NEW
+    prev_price, prev_review, prev_point = previous
+    if product.price is not None and prev_price is not None:
+        if product.price < prev_price:
+            return CHANGE_PRICE_DOWN
+    if product.point_rate > (prev_point or 1):
+        return CHANGE_POINT_UP
+    if product.review_average > (prev_review or 0.0):
+        return CHANGE_REVIEW_UP
+    if product.price is not None and prev_price is not None and product.price > prev_price:
+        return CHANGE_PRICE_UP
+    return CHANGE_UNCHANGED
+
+
+class ProductStore:
+    """アカウントごとの商品の最新状態と、価格・レビューの変化履歴を保持するスレッドセーフなストア。"""
+
+    def __init__(self, path: str = DEFAULT_PRODUCT_STORE_PATH):
+        """ストアを初期化し、必要であればデータベースを作成します。
+
+        Args:
+            path: SQLite ファイルのパス
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            # アカウント × 商品ごとの最新状態と、直近の取得での変化の種類
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS product_state (
+                    account TEXT NOT NULL,
+                    item_key TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    image_url TEXT NOT NULL,
+                    price INTEGER,
+                    review_average REAL NOT NULL,
+                    review_count INTEGER NOT NULL,
+                    point_rate INTEGER NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    last_run TEXT NOT NULL,
+                    change TEXT NOT NULL,
+                    PRIMARY KEY (account, item_key)
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_product_state_run ON product_state (account, last_run, change)"
+            )
+            # アカウント × 商品ごとの価格・レビューの履歴（いずれかの値が変化した時点で記録し、変化の種類を付与）
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS product_history (
+                    account TEXT NOT NULL,
+                    item_key TEXT NOT NULL,
+                    observed_at REAL NOT NULL,
+                    price INTEGER,
+                    review_average REAL NOT NULL,
+                    review_count INTEGER NOT NULL,
+                    point_rate INTEGER NOT NULL,
+                    change TEXT
+                )"""
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(product_history)")}
+            if "change" not in columns:
+                self._conn.execute("ALTER TABLE product_history ADD COLUMN change TEXT")
+            if "account" not in columns:
+                self._conn.execute("ALTER TABLE product_history ADD COLUMN account TEXT")
+                # 既存の履歴は、その商品を扱うアカウントが 1 つだけの場合に限りそのアカウントの履歴とみなす
+                self._conn.execute(
+                    """UPDATE product_history SET account = (
+                         SELECT MIN(s.account) FROM product_state s WHERE s.item_key = product_history.item_key
+                       )
+                       WHERE (SELECT COUNT(*) FROM product_state s WHERE s.item_key = product_history.item_key) = 1"""
+                )
+                self._conn.execute("DROP INDEX IF EXISTS idx_product_history_key")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_product_history_account_key "
+                "ON product_history (account, item_key, observed_at)"
+            )
+
+    def upsert(self, account: str, products: List[Product], run_id: str) -> Dict[str, str]:
+        """1 回の取得結果を登録し、商品ごとの変化の種類を返します。
+
+        Args:
+            account: アカウント名
+            products: 今回取得した商品
+            run_id: 取得の実行 ID（同じアカウントでは単調増加すること）
+
+        Returns:
+            商品キーから変化の種類 (CHANGE_*) へのマッピング
+        """
+        now = time.time()
+        changes: Dict[str, str] = {}
+        with self._lock, self._conn:
+            for product in products:
+                key = product.item_key
+                if key in changes:
+                    continue
+                previous = self._conn.execute(
+                    "SELECT price, review_average, point_rate FROM product_state WHERE account = ? AND item_key = ?",
+                    (account, key)
+                ).fetchone()
+                change = detect_change(previous, product)
+                changes[key] = change
+
+                # 変化の種類に関わらず、記録している値のいずれかが前回の履歴と異なれば履歴に残す
+                observed = (product.price, product.review_average, product.review_count, product.point_rate)
+                last = self._conn.execute(
+                    "SELECT price, review_average, review_count, point_rate FROM product_history "
+                    "WHERE account = ? AND item_key = ? ORDER BY observed_at DESC LIMIT 1",
+                    (account, key)
+                ).fetchone()
+                if last is None or tuple(last) != observed:
+                    self._conn.execute(
+                        "INSERT INTO product_history "
+                        "(account, item_key, observed_at, price, review_average, review_count, point_rate, change) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (account, key, now) + observed + (change,)
+                    )
+
+                values = (
+                    product.name, product.url, product.image_url, product.price,
+                    product.review_average, product.review_count, product.point_rate
+                )
+                self._conn.execute(
+                    """INSERT INTO product_state
+                        (account, item_key, name, url, image_url, price, review_average, review_count, point_rate,
+                         first_seen, last_seen, last_run, change)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (account, item_key) DO UPDATE SET
+                         name = excluded.name, url = excluded.url, image_url = excluded.image_url,
+                         price = excluded.price, review_average = excluded.review_average,
+                         review_count = excluded.review_count, point_rate = excluded.point_rate,
+                         last_seen = excluded.last_seen, last_run = excluded.last_run, change = excluded.change""",
+                    (account, key) + values + (now, now, run_id, change)
+                )
+        return changes
+
+    def changed_since_last_run(self, account: str, kinds: Optional[List[str]] = None) -> Set[str]:
+        """アカウントの直近の取得で、新着または変化のあった商品キーを返します。
+
+        Args:
+            account: アカウント名
+            kinds: 対象とする変化の種類（None の場合は unchanged 以外のすべて）
+
+        Returns:
+            商品キーの集合
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(last_run) FROM product_state WHERE account = ?", (account,)
+            ).fetchone()
+            if row is None or row[0] is None:
+                return set()
+            rows = self._conn.execute(
+                "SELECT item_key, change FROM product_state WHERE account = ? AND last_run = ? AND change != ?",
+                (account, row[0], CHANGE_UNCHANGED)
+            ).fetchall()
+        return {key for key, change in rows if kinds is None or change in kinds}
+
+    def history(self, account: str, item_key: str) -> List[Dict[str, Any]]:
+        """アカウントが扱う商品の価格・レビューの変化履歴を古い順に返します。
+
+        change は記録時の変化の種類 (CHANGE_*) です。投稿の訴求につながらない変化（評価の低下、
+        レビュー件数の変化、価格が不明になった場合など）は unchanged として記録されます。
+        移行前に記録された行では None。複数のアカウントが扱う商品の、アカウント列の追加前の履歴は含まれません。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT observed_at, price, review_average, review_count, point_rate, change FROM product_history "
+                "WHERE account = ? AND item_key = ? ORDER BY observed_at",
+                (account, item_key)
+            ).fetchall()
+        return [
+            {
+                "observed_at": r[0], "price": r[1], "review_average": r[2], "review_count": r[3],
+                "point_rate": r[4], "change": r[5]
+            }
+            for r in rows
+        ]
+
+
+# パスごとに共有されるストア
+_stores: Dict[str, ProductStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_product_store(policy: Dict[str, Any]) -> Optional[ProductStore]:
+    """generation_policy.yaml の product_store セクションに対応する共有ストアを取得します。
+
+    Args:
+        policy: generation_policy.yaml 全体の辞書。product_store キー配下の enabled, path を参照します
+
+    Returns:
+        共有の ProductStore インスタンス。無効の場合は None
+    """
+    settings = policy.get("product_store") or {}
+    if not settings.get("enabled", False):
+        return None
+    path = settings.get("path", DEFAULT_PRODUCT_STORE_PATH)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = ProductStore(path)
+            _stores[path] = store
+        return store
@@ -0,0 +1,152 @@
+"""
+楽天 API エンドポイント解決モジュール。
+accounts.yaml に記載されたジャンル URL を起動時に一括で検証し、2026年新仕様のエンドポイント、
+サービスプレフィックス、取得件数、応答形式の種別へ変換した結果をメモ化します。
+"""
+import re
+import threading
+from dataclasses import dataclass
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, Any, List
+
+
+# API ファミリー（サービス/操作）ごとの新仕様プレフィックスと応答形式の種別
+_ENDPOINT_TABLE: Dict[str, tuple] = {
+    "IchibaItem/Search": ("ichibams", "ichiba_items"),
+    "IchibaItem/Ranking": ("ichibaranking", "ichiba_items"),  # Ranking は専用プレフィックス
+    "BooksTotal/Search": ("services", "books_items"),        # Books は services のまま
+    "BooksCD/Search": ("services", "books_items"),
+    "BooksDVD/Search": ("services", "books_items"),
+    "BooksGame/Search": ("services", "books_items"),
+    "BooksMagazine/Search": ("services", "books_items"),
+    "Travel/HotelRanking": ("engine", "travel_ranking"),     # Travel は engine
+    "Travel/KeywordHotelSearch": ("engine", "travel_hotels"),
+    "Travel/GetAreaClass": ("engine", "generic"),
+}
+
+# 新仕様で廃止されたバージョンの置き換え（楽天市場ランキング 20170628 -> 20220601）
+_VERSION_REWRITES: Dict[tuple, str] = {
+    ("IchibaItem/Ranking", "20170628"): "20220601",
+}
+
+# 旧仕様ドメインから新仕様ドメインへの置き換え
+_HOST_REWRITES: Dict[str, str] = {
+    "app.rakuten.co.jp": "openapi.rakuten.co.jp",
+}
+
+# /<プレフィックス>/api/<サービス>/<操作>/<バージョン> 形式のパス
+_PATH_PATTERN = re.compile(
+    r"^/(?P<prefix>[^/]+)/api/(?P<service>[^/]+)/(?P<operation>[^/]+)(?P<rest>/[^?]*)?$"
+)
+
+# 楽天 API の hits パラメータの上限
+MAX_HITS: int = 30
+
+
+@dataclass(frozen=True)
+class ResolvedEndpoint:
+    """ジャンル URL 1 件の解決結果。"""
+    source_url: str  # accounts.yaml に記載された URL
+    url: str         # リクエスト先となる新仕様の URL
+    prefix: str      # サービスプレフィックス（ichibams, engine 等）
+    family: str      # API ファミリー（例: "IchibaItem/Ranking"）
+    hits: int        # 取得件数
+    shape: str       # 応答形式の種別（応答からアイテムを取り出す処理の選択に使用）
+
+
+class EndpointResolver:
+    """ジャンル URL を新仕様のエンドポイントへ変換し、結果をメモ化するリゾルバ。
+
+    起動時に accounts.yaml の全 URL を解決するため、設定の誤りは API へのリクエスト前に
+    まとめて検出されます。解決結果は URL ごとにキャッシュされ、以降の呼び出しは辞書参照のみです。
+    """
+
+    def __init__(self, accounts: Dict[str, Any] | None = None, default_hits: int = 5):
+        """初期化。accounts を指定した場合は全ジャンル URL を検証・解決します。
+
+        Args:
+            accounts: accounts.yaml の内容（アカウント名 → 設定）
+            default_hits: URL に hits 指定がない場合の取得件数
+
+        Raises:
+            ValueError: 不正な URL が含まれる場合（該当するアカウント・ジャンルをすべて列挙します）
+        """
+        self.default_hits = default_hits
+        self._resolved: Dict[str, ResolvedEndpoint] = {}
+        self._lock = threading.Lock()
+        if accounts:
+            self.preload(accounts)
+
+    def preload(self, accounts: Dict[str, Any]) -> None:
+        """全アカウントのジャンル URL を解決し、不正な URL があればまとめて例外を送出します。"""
+        errors: List[str] = []
+        for account, data in accounts.items():
+            for genre_name, url in ((data or {}).get("genres") or {}).items():
+                try:
+                    self.resolve(url)
+                except ValueError as e:
+                    errors.append(f"{account} / {genre_name}: {e}")
+        if errors:
+            raise ValueError("accounts.yaml のジャンル URL が不正です:\n  " + "\n  ".join(errors))
+
+    def resolve(self, url: str) -> ResolvedEndpoint:
+        """URL を解決します。解決済みの URL はキャッシュから返します。
+
+        Args:
+            url: accounts.yaml に記載された API URL
+
+        Returns:
+            解決結果
+
+        Raises:
+            ValueError: URL の形式が不正な場合
+        """
+        endpoint = self._resolved.get(url)
+        if endpoint is None:
+            endpoint = self._build(url)
+            with self._lock:
+                self._resolved[url] = endpoint
+        return endpoint
+
+    def _build(self, url: str) -> ResolvedEndpoint:
+        """URL を検証し、新仕様のエンドポイントを組み立てます。"""
+        if not isinstance(url, str) or not url.strip():
+            raise ValueError("URL が空です")
+        parsed = urlparse(url.strip())
+        if parsed.scheme not in ("http", "https") or not parsed.netloc:
+            raise ValueError(f"URL の形式が不正です: {url}")
+
+        host = parsed.netloc.lower()
+        # "evilrakuten.co.jp" のような別ドメインを受け付けないよう、ドメイン単位で照合する
+        hostname = parsed.hostname or ""
+        if hostname != "rakuten.co.jp" and not hostname.endswith(".rakuten.co.jp"):
+            raise ValueError(f"楽天 API 以外のホストです: {url}")
+
+        match = _PATH_PATTERN.match(parsed.path)
+        if not match:
+            raise ValueError(f"API パス (/<prefix>/api/<service>/<operation>/<version>) を解釈できません: {url}")
+        family = f"{match.group('service')}/{match.group('operation')}"
+        rest = match.group("rest") or ""
+
+        try:
+            hits = int(parse_qs(parsed.query).get("hits", [self.default_hits])[0])
+        except ValueError:
+            raise ValueError(f"hits が整数ではありません: {url}")
+        if not 1 <= hits <= MAX_HITS:
+            raise ValueError(f"hits は 1〜{MAX_HITS} の範囲で指定してください: {url}")
+
+        # ドメイン・バージョン・プレフィックスを新仕様へ変換
+        new_prefix, shape = _ENDPOINT_TABLE.get(family, (match.group("prefix"), "generic"))
+        if match.group("prefix") != "services":
+            # 既に新仕様のプレフィックスが指定されている場合はそのまま使用
+            new_prefix = match.group("prefix")
+        version = rest.strip("/").split("/")[0] if rest else ""
+        new_version = _VERSION_REWRITES.get((family, version))
+        if new_version:
+            rest = rest.replace(version, new_version, 1)
+
+        new_url = parsed._replace(
+            netloc=_HOST_REWRITES.get(host, host),
+            path=f"/{new_prefix}/api/{family}{rest}"
+        ).geturl()
+        return ResolvedEndpoint(url, new_url, new_prefix, family, hits, shape)
@@ -0,0 +1,215 @@
+"""
+楽天 API 応答の抽出モジュール。
+応答形式の種別（rakuten_endpoints の ResolvedEndpoint.shape）ごとに専用の抽出処理を登録し、
+応答 1 件につき 1 回だけ処理を選択して、正規化・重複排除・件数の打ち切りを 1 パスで行います。
+ijson がインストールされている場合は、応答本文を逐次解析して必要な件数に達した時点で読み込みを止める
+ストリーミング抽出も利用できます。
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Optional, BinaryIO
+from product import Product
+
+try:
+    import ijson  # type: ignore
+except ImportError:  # ストリーミング抽出は任意機能
+    ijson = None
+
+
+# 応答中の配列要素 1 件を Product に変換する処理
+RowBuilder = Callable[[Any], Optional[Product]]
+
+
+def _first_image(images: Any) -> str:
+    """画像 URL のリスト（辞書形式・文字列形式の両方）から先頭の URL を返します。"""
+    if not isinstance(images, list) or not images:
+        return ""
+    first = images[0]
+    if isinstance(first, dict):
+        return first.get("imageUrl") or first.get("url") or ""
+    return first or ""
+
+
+def _ichiba_row(entry: Dict[str, Any]) -> Product:
+    """楽天市場 商品検索・ランキング API の Items 要素 ({"Item": {...}} または formatVersion=2 の平坦な形式)。"""
+    item = entry.get("Item", entry)
+    return Product.parse(
+        item.get("itemName"),
+        item.get("affiliateUrl"),
+        _first_image(item.get("mediumImageUrls")),
+        item.get("itemPrice"),
+        item.get("reviewAverage"),
+        item.get("reviewCount"),
+        item.get("pointRate"),
+    )
+
+
+def _books_row(entry: Dict[str, Any]) -> Product:
+    """楽天ブックス 各種検索 API の Items 要素 ({"Item": {...}})。"""
+    item = entry.get("Item", entry)
+    return Product.parse(
+        item.get("title"),
+        item.get("affiliateUrl"),
+        item.get("largeImageUrl") or item.get("mediumImageUrl"),
+        item.get("itemPrice"),
+        item.get("reviewAverage"),
+        item.get("reviewCount"),
+        item.get("pointRate"),
+    )
+
+
+def _hotel_basic_info(hotel: Any) -> Dict[str, Any]:
+    """hotel 要素（基本情報・評価情報等のリスト、または辞書）から基本情報を取り出します。"""
+    if isinstance(hotel, list):
+        for sub in hotel:
+            info = sub.get("hotelBasicInfo") or sub.get("basicInfo")
+            if info:
+                return info
+        return {}
+    return hotel.get("hotelBasicInfo") or hotel.get("basicInfo") or hotel
+
+
+def _hotel_row(entry: Dict[str, Any]) -> Product:
+    """楽天トラベル API の hotels 要素 ({"hotel": [{"hotelBasicInfo": {...}}, ...]} または {"hotel": {...}})。"""
+    info = _hotel_basic_info(entry.get("hotel") or entry)
+    return Product.parse(
+        info.get("hotelName"),
+        info.get("hotelInformationUrl"),
+        info.get("hotelImageUrl"),
+        info.get("hotelMinCharge"),
+        info.get("reviewAverage"),
+        info.get("reviewCount"),
+        1,
+    )
+
+
+def _generic_row(entry: Any) -> Optional[Product]:
+    """未登録の API 向けに、代表的なキーを順に探索して Product に変換する汎用の処理。"""
+    if not isinstance(entry, dict):
+        return None
+    item = entry.get("hotel") or entry.get("Hotel") or entry.get("Item") or entry
+    info = _hotel_basic_info(item)
+    image_url = info.get("hotelImageUrl") or info.get("imageUrl") or _first_image(info.get("mediumImageUrls"))
+    if not image_url and isinstance(item, dict):
+        image_url = _first_image(item.get("images") or item.get("imageUrls"))
+    return Product.parse(
+        info.get("hotelName") or info.get("itemName") or info.get("title"),
+        info.get("hotelInformationUrl") or info.get("affiliateUrl"),
+        image_url,
+        info.get("itemPrice") or info.get("hotelMinCharge") or info.get("price"),
+        info.get("reviewAverage"),
+        info.get("reviewCount"),
+        info.get("pointRate"),
+    )
+
+
+def _items_entries(data: Any) -> Iterable[Any]:
+    """{"Items": [...]} 形式の配列要素。"""
+    return data.get("Items") or []
+
+
+def _ranking_entries(data: Any) -> Iterator[Any]:
+    """{"Rankings": [{"Ranking": {"hotels": [...]}}]} 形式の配列要素。"""
+    for ranking in data.get("Rankings") or []:
+        yield from (ranking.get("Ranking") or {}).get("hotels") or []
+
+
+def _hotels_entries(data: Any) -> Iterable[Any]:
+    """{"hotels": [...]} 形式の配列要素。"""
+    return data.get("hotels") or []
+
+
+def _generic_entries(data: Any) -> Iterable[Any]:
+    """未登録の API 向けに、代表的なキーを順に探索して配列要素を返します。"""
+    if isinstance(data, list):
+        return data
+    if not isinstance(data, dict):
+        return []
+    if "Rankings" in data:
+        return _ranking_entries(data)
+    if "hotels" in data:
+        return _hotels_entries(data)
+    result = data.get("result")
+    return (
+        data.get("Items") or data.get("items")
+        or (data.get("hits") if isinstance(data.get("hits"), list) else None)
+        or (result.get("items") if isinstance(result, dict) else None)
+        or (data.get("data") if isinstance(data.get("data"), list) else None)
+        or []
+    )
+
+
+@dataclass(frozen=True)
+class ShapeHandler:
+    """応答形式 1 種類分の抽出処理。"""
+    entries: Callable[[Any], Iterable[Any]]  # 応答全体 → 配列要素
+    row: RowBuilder                          # 配列要素 → Product
+    stream_prefix: Optional[str] = None      # ストリーミング抽出時の ijson プレフィックス（None は非対応）
+
+
+# 応答形式の種別 → 抽出処理
+EXTRACTORS: Dict[str, ShapeHandler] = {
+    "ichiba_items": ShapeHandler(_items_entries, _ichiba_row, "Items.item"),
+    "books_items": ShapeHandler(_items_entries, _books_row, "Items.item"),
+    "travel_ranking": ShapeHandler(_ranking_entries, _hotel_row, "Rankings.item.Ranking.hotels.item"),
+    "travel_hotels": ShapeHandler(_hotels_entries, _hotel_row, "hotels.item"),
+    "generic": ShapeHandler(_generic_entries, _generic_row),
+}
+
+
+def _collect(rows: Iterable[Optional[Product]], limit: int) -> List[Product]:
+    """商品名で重複排除し、商品名と URL が揃った商品を limit 件まで集めます。"""
+    seen = set()
+    results: List[Product] = []
+    for product in rows:
+        if not product or not product.is_valid or product.name in seen:
+            continue
+        seen.add(product.name)
+        results.append(product)
+        if len(results) >= limit:
+            break
+    return results
+
+
+def extract_items(data: Any, shape: str, limit: int) -> List[Product]:
+    """応答からアイテムを抽出し、タイトルで重複を排除して limit 件まで返します。
+
+    抽出処理は応答ごとに 1 回だけ選択され、商品名と URL が揃った商品が limit 件に達した時点で
+    残りの要素は走査しません。
+
+    Args:
+        data: デコード済みの API 応答
+        shape: 応答形式の種別（未登録の場合は汎用の抽出処理を使用）
+        limit: 取得件数の上限
+
+    Returns:
+        Product のリスト
+    """
+    handler = EXTRACTORS.get(shape) or EXTRACTORS["generic"]
+    if not isinstance(data, dict):
+        handler = EXTRACTORS["generic"]
+    return _collect((handler.row(entry) for entry in handler.entries(data)), limit)
+
+
+def supports_streaming(shape: str) -> bool:
+    """ijson が利用可能で、応答形式がストリーミング抽出に対応しているかを返します。"""
+    handler = EXTRACTORS.get(shape)
+    return ijson is not None and handler is not None and handler.stream_prefix is not None
+
+
+def stream_items(fp: BinaryIO, shape: str, limit: int) -> List[Product]:
+    """応答本文を逐次解析してアイテムを抽出します。
+
+    配列要素を 1 件ずつ組み立てて Product に変換するため、応答全体をメモリに展開せず、
+    limit 件の有効な商品が揃った時点で以降の本文は読み込みません。
+
+    Args:
+        fp: 応答本文を読み出すバイナリストリーム
+        shape: 応答形式の種別（supports_streaming が True であること）
+        limit: 取得件数の上限
+
+    Returns:
+        Product のリスト
+    """
+    handler = EXTRACTORS[shape]
+    entries = ijson.items(fp, handler.stream_prefix, use_float=True)
+    return _collect((handler.row(entry) for entry in entries), limit)
@@ -0,0 +1,332 @@
+"""
+レート制限モジュール。
+モデルごとの RPM / TPM / 同時実行数の予算を管理するトークンバケット方式のリミッターと、
+API キーごとの送信間隔を保証するガバナーを提供します。
+"""
+import asyncio
+import threading
+import time
+import weakref
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Optional, Iterator, AsyncIterator
+
+
+# rate_limit 設定が無い場合の既定値（Gemini 無料枠 15 RPM に余裕を持たせた値）
+DEFAULT_RPM: float = 14.0
+DEFAULT_BURST: int = 1
+DEFAULT_MAX_CONCURRENT: int = 5
+
+
+class TokenBucketRateLimiter:
+    """RPM / TPM / 同時実行数の 3 種類の予算を管理するスレッドセーフなリミッター。
+
+    リクエスト数とトークン数はそれぞれトークンバケットで管理し、バケット容量 (burst) までは
+    待機なしで連続実行できます。予約方式のため、複数スレッドから同時に呼び出されても
+    待機時間が順番に積み上がり、予算を超えて送信されることはありません。
+    429 を検知すると補充レートを半減させ、成功が続くと徐々に元のレートへ戻します（AIMD）。
+    """
+
+    def __init__(
+        self,
+        rpm: float = DEFAULT_RPM,
+        tpm: Optional[float] = None,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+        burst: Optional[int] = None,
+        min_rate_factor: float = 0.1,
+        recovery_step: float = 0.05
+    ):
+        """リミッターを初期化します。
+
+        Args:
+            rpm: 1 分あたりの最大リクエスト数
+            tpm: 1 分あたりの最大トークン数（None の場合は制限なし）
+            max_concurrent: 同時に実行中（in-flight）にできるリクエスト数
+            burst: 待機なしで連続送信できるリクエスト数（None の場合は max_concurrent）
+            min_rate_factor: 429 検知時に下げられる補充レートの下限倍率
+            recovery_step: 成功 1 回ごとに回復させる補充レートの倍率
+        """
+        if rpm <= 0:
+            raise ValueError("rpm は正の値である必要があります")
+        self.rpm = float(rpm)
+        self.tpm = float(tpm) if tpm else None
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.burst = max(1, int(burst if burst is not None else self.max_concurrent))
+        self.min_rate_factor = min_rate_factor
+        self.recovery_step = recovery_step
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        # イベントループごとに、スロットの空きをスレッドで待つタスクを 1 つに絞るためのロック
+        self._async_waiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+        self._rate_factor = 1.0
+        self._request_level = float(self.burst)
+        # トークンバケットの容量は 1 分間分の TPM とします
+        self._token_level = self.tpm or 0.0
+        self._last_refill = time.monotonic()
+
+    @property
+    def rate_factor(self) -> float:
+        """現在の補充レート倍率（1.0 が設定値どおり）。"""
+        return self._rate_factor
+
+    def _refill(self, now: float) -> None:
+        """経過時間に応じて各バケットを補充します（ロック取得済みで呼び出すこと）。"""
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if elapsed <= 0:
+            return
+        factor = self._rate_factor
+        self._request_level = min(
+            float(self.burst),
+            self._request_level + elapsed * self.rpm / 60.0 * factor
+        )
+        if self.tpm:
+            self._token_level = min(
+                self.tpm,
+                self._token_level + elapsed * self.tpm / 60.0 * factor
+            )
+
+    def reserve(self, tokens: int = 0) -> float:
+        """1 リクエスト分の予算を予約し、送信までに待つべき秒数を返します。
+
+        Args:
+            tokens: このリクエストで消費が見込まれるトークン数
+
+        Returns:
+            予約した枠が利用可能になるまでの待機秒数（0 の場合は即時送信可）
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            factor = self._rate_factor
+
+            self._request_level -= 1.0
+            wait = 0.0
+            if self._request_level < 0:
+                wait = -self._request_level / (self.rpm / 60.0 * factor)
+
+            if self.tpm and tokens > 0:
+                # 1 リクエストで TPM を超える場合でも永久に待たないよう上限で丸めます
+                self._token_level -= min(float(tokens), self.tpm)
+                if self._token_level < 0:
+                    wait = max(wait, -self._token_level / (self.tpm / 60.0 * factor))
+            return wait
+
+    def acquire(self, tokens: int = 0) -> None:
+        """予算を予約し、利用可能になるまでブロックします。"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 0) -> None:
+        """acquire の非同期版。イベントループをブロックせずに待機します。"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    @contextmanager
+    def slot(self, tokens: int = 0) -> Iterator[None]:
+        """同時実行枠を確保したうえでレート予算を消費するコンテキストマネージャ。
+
+        Args:
+            tokens: このリクエストで消費が見込まれるトークン数
+        """
+        self._slots.acquire()
+        try:
+            self.acquire(tokens)
+            yield
+        finally:
+            self._slots.release()
+
+    def _async_waiter_lock(self, loop: asyncio.AbstractEventLoop) -> asyncio.Lock:
+        """イベントループに対応する待機用のロックを返します。"""
+        with self._lock:
+            lock = self._async_waiters.get(loop)
+            if lock is None:
+                lock = asyncio.Lock()
+                self._async_waiters[loop] = lock
+            return lock
+
+    async def _acquire_slot_async(self) -> None:
+        """同時実行枠を確保します。空きが無い場合はイベントループをブロックせずに待機します。
+
+        スレッドと共有する枠のため、ブロッキングの確保はワーカースレッドに渡します。
+        待機中のスレッドがループあたり 1 つで済むよう、他のタスクは asyncio のロックで順番を待ちます。
+        """
+        if self._slots.acquire(blocking=False):
+            return
+        loop = asyncio.get_running_loop()
+        async with self._async_waiter_lock(loop):
+            acquired = loop.run_in_executor(None, self._slots.acquire)
+            try:
+                await asyncio.shield(acquired)
+            except asyncio.CancelledError:
+                # キャンセルされても、スレッド側で確保した枠は確保でき次第返却する
+                acquired.add_done_callback(lambda _: self._slots.release())
+                raise
+
+    @asynccontextmanager
+    async def slot_async(self, tokens: int = 0) -> AsyncIterator[None]:
+        """slot の非同期版。スレッドと非同期タスクで同じ同時実行枠を共有します。"""
+        await self._acquire_slot_async()
+        try:
+            await self.acquire_async(tokens)
+            yield
+        finally:
+            self._slots.release()
+
+    def record_tokens(self, delta: int) -> None:
+        """見積もりと実際の消費トークン数の差分をバケットに反映します。
+
+        Args:
+            delta: 実際の消費量 - 見積もり量（負の値の場合は差分を返却）
+        """
+        if not self.tpm or delta == 0:
+            return
+        with self._lock:
+            self._token_level = min(self.tpm, self._token_level - delta)
+
+    def on_rate_limited(self) -> None:
+        """429 等のレート制限を検知した際に補充レートを半減し、バーストを止めます。"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._rate_factor = max(self.min_rate_factor, self._rate_factor * 0.5)
+            self._request_level = min(self._request_level, 0.0)
+
+    def on_success(self) -> None:
+        """成功時に補充レートを少しずつ設定値へ戻します。"""
+        if self._rate_factor >= 1.0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._rate_factor = min(1.0, self._rate_factor + self.recovery_step)
+
+
+class IntervalGovernor:
+    """一定間隔での送信を保証するスレッドセーフなガバナー（楽天 API の 1 秒 1 リクエスト制限等）。
+
+    次に送信可能な時刻を予約方式で管理するため、複数スレッド・複数アカウントから呼び出されても
+    送信間隔は常に 1 / requests_per_second 秒以上に保たれ、アイドル時には待機が発生しません。
+    429 や Retry-After を受け取った場合は defer で全体の送信を後ろ倒しにします。
+    """
+
+    def __init__(self, requests_per_second: float = 1.0):
+        """初期化。
+
+        Args:
+            requests_per_second: 1 秒あたりの最大リクエスト数
+        """
+        if requests_per_second <= 0:
+            raise ValueError("requests_per_second は正の値である必要があります")
+        self.interval = 1.0 / float(requests_per_second)
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def reserve(self) -> float:
+        """次の送信枠を予約し、送信までに待つべき秒数を返します。"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_time)
+            self._next_time = slot + self.interval
+            return slot - now
+
+    def acquire(self) -> None:
+        """送信枠を予約し、その時刻までブロックします。"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def defer(self, seconds: float) -> None:
+        """レート制限を受けた際に、以降の送信枠を少なくとも seconds 秒後まで後ろ倒しにします。
+
+        Args:
+            seconds: 待機すべき秒数（Retry-After の値など）
+        """
+        with self._lock:
+            self._next_time = max(self._next_time, time.monotonic() + max(0.0, seconds))
+
+
+def estimate_tokens(prompt: str, config: Dict[str, Any]) -> int:
+    """プロンプトの文字数から消費トークン数を概算します。
+
+    日本語は 1 文字あたりおおむね 1 トークン前後のため、安全側に文字数をそのまま入力トークンとし、
+    出力分として expected_output_tokens を加算します。
+
+    Args:
+        prompt: 送信するプロンプト
+        config: rate_limit 設定を含む生成設定の辞書
+
+    Returns:
+        見積もりトークン数
+    """
+    settings = config.get("rate_limit", {}) or {}
+    expected_output = settings.get("expected_output_tokens", 256)
+    return len(prompt) + int(expected_output)
+
+
+# モデル名ごとに共有されるリミッター
+_limiters: Dict[str, TokenBucketRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model_name: str, config: Dict[str, Any]) -> TokenBucketRateLimiter:
+    """モデル名に対応する共有リミッターを取得します。存在しない場合は設定から作成します。
+
+    クォータはモデル単位で課金されるため、同じ model_name を使う複数のセクション
+    (normal_post_generation / affiliate_post_generation) は同じ予算を共有します。
+    設定値は最初に生成したセクションのものが使用されます。
+
+    Args:
+        model_name: Gemini のモデル名
+        config: generation_policy.yaml のセクション辞書。rate_limit キー配下の
+                rpm, tpm, max_concurrent, burst を参照します
+
+    Returns:
+        共有の TokenBucketRateLimiter インスタンス
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(model_name)
+        if limiter is None:
+            settings = config.get("rate_limit", {}) or {}
+            max_concurrent = settings.get("max_concurrent", DEFAULT_MAX_CONCURRENT)
+            limiter = TokenBucketRateLimiter(
+                rpm=settings.get("rpm", DEFAULT_RPM),
+                tpm=settings.get("tpm"),
+                max_concurrent=max_concurrent,
+                burst=settings.get("burst", DEFAULT_BURST if "rpm" not in settings else max_concurrent),
+                min_rate_factor=settings.get("min_rate_factor", 0.1),
+                recovery_step=settings.get("recovery_step", 0.05),
+            )
+            _limiters[model_name] = limiter
+        return limiter
+
+
+# API キー（楽天 applicationId 等）ごとに共有されるガバナー
+_governors: Dict[str, IntervalGovernor] = {}
+
+
+def get_request_governor(key: str, requests_per_second: float = 1.0) -> IntervalGovernor:
+    """API キーに対応する共有ガバナーを取得します。存在しない場合は作成します。
+
+    レート制限は API キー単位で課されるため、同じキーを使う全アカウント・全スレッドが
+    同じガバナーを共有します。
+
+    Args:
+        key: レート制限の単位となるキー（楽天 API の applicationId 等）
+        requests_per_second: 1 秒あたりの最大リクエスト数（初回作成時のみ使用）
+
+    Returns:
+        共有の IntervalGovernor インスタンス
+    """
+    with _limiters_lock:
+        governor = _governors.get(key)
+        if governor is None:
+            governor = IntervalGovernor(requests_per_second)
+            _governors[key] = governor
+        return governor
+
+
+def reset_rate_limiters() -> None:
+    """共有リミッター・ガバナーをすべて破棄します（主にテスト用）。"""
+    with _limiters_lock:
+        _limiters.clear()
+        _governors.clear()
@@ -0,0 +1,154 @@
+"""
+AI 応答キャッシュモジュール。
+モデル名・プロンプト・生成パラメータのハッシュをキーとして、AI の応答を SQLite に永続化します。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+
+DEFAULT_CACHE_PATH: str = "../data/cache/ai_responses.sqlite3"
+
+
+class ResponseCache:
+    """TTL とエントリ数上限による削除に対応した、スレッドセーフな応答キャッシュ。"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: float = 7 * 24 * 60 * 60, max_entries: int = 5000):
+        """キャッシュを初期化し、必要であればデータベースを作成します。
+
+        Args:
+            path: SQLite ファイルのパス
+            ttl_seconds: エントリの有効期間（秒）
+            max_entries: 保持する最大エントリ数（超過分は最終参照が古い順に削除）
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """モデル名・プロンプト・生成パラメータから内容アドレス方式のキーを作成します。
+
+        Args:
+            model_name: Gemini のモデル名
+            prompt: 送信するプロンプト
+            params: 応答に影響する生成パラメータ
+
+        Returns:
+            SHA-256 の 16 進文字列
+        """
+        payload = json.dumps(
+            {"model": model_name, "prompt": prompt, "params": params or {}},
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """有効期限内のエントリを取得します。期限切れのエントリは削除します。
+
+        Args:
+            key: make_key で作成したキー
+
+        Returns:
+            キャッシュ済みの応答。存在しない場合は None
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return response
+
+    def put(self, key: str, response: str) -> None:
+        """応答を保存し、エントリ数が上限を超えた場合は古いものから削除します。
+
+        Args:
+            key: make_key で作成したキー
+            response: 保存する応答テキスト
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def purge_expired(self) -> int:
+        """有効期限切れのエントリをすべて削除します。
+
+        Returns:
+            削除したエントリ数
+        """
+        threshold = time.time() - self.ttl_seconds
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (threshold,))
+            return cursor.rowcount
+
+
+# パスごとに共有されるキャッシュ
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(config: Dict[str, Any]) -> Optional[ResponseCache]:
+    """生成設定の response_cache セクションに対応する共有キャッシュを取得します。
+
+    response_cache.enabled が True のセクションでのみキャッシュを使用します。
+    創作性を重視する通常ポスト (normal_post_generation) では無効のままにし、
+    商品情報から決まるアフィリエイトポストで有効にする運用を想定しています。
+    通常ポストで有効にした場合も、同じテーマの各件は件の番号 (cache_slot) で区別されます。
+
+    Args:
+        config: generation_policy.yaml のセクション辞書。response_cache キー配下の
+                enabled, path, ttl_hours, max_entries を参照します
+
+    Returns:
+        共有の ResponseCache インスタンス。無効の場合は None
+    """
+    settings = config.get("response_cache") or {}
+    if not settings.get("enabled", False):
+        return None
+    path = settings.get("path", DEFAULT_CACHE_PATH)
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = ResponseCache(
+                path=path,
+                ttl_seconds=float(settings.get("ttl_hours", 168)) * 60 * 60,
+                max_entries=int(settings.get("max_entries", 5000))
+            )
+            _caches[path] = cache
+        return cache
@@ -2,10 +2,14 @@ import os
 # カレントディレクトリをスクリプトが存在する場所に固定
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 import time
+import argparse
 import subprocess
 import yaml  # type: ignore
 from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
 from merge_posts import PostMerger
+from checkpoint import RunCheckpoint, count_post_lines
+from stage_scheduler import StageGraph
 from di_container import get_container
 from make_input_csv import InputCSVGenerator
 from normal_post_generator import NormalPostGenerator
@@ -83,49 +87,209 @@ def load_accounts():
     return list(data.keys())  # アカウント名（トップレベルキー）のみ取得
 
 # ================================
-# サブスクリプトの実行処理
+# チェックポイント付きステージ実行
 # ================================
-# run_script 関数は直接呼び出しに変更するため削除
+def run_stage(
+    checkpoint: RunCheckpoint,
+    stage: str,
+    accounts: List[str],
+    runner: Callable[[List[str]], Dict[str, str]],
+    count_items: bool = False,
+    skip: Optional[Callable[[str], Optional[str]]] = None
+) -> None:
+    """未完了のアカウントのみを対象にステージを実行し、結果をチェックポイントに記録します。
+
+    Args:
+        checkpoint: 今回の実行のチェックポイント
+        stage: ステージ名（マニフェストのキー）
+        accounts: ステージの対象アカウント
+        runner: 対象アカウントのリストを受け取り、{アカウント: 出力パス} を返す関数
+        count_items: True の場合、出力ファイルのポスト件数と失敗件数を記録します
+        skip: アカウントを受け取り、ステージの対象外とする場合はその理由を返す関数。
+              対象外のアカウントは失敗ではなくスキップとして記録します
+    """
+    pending = checkpoint.pending(stage, accounts)
+    skipped = [a for a in accounts if a not in pending]
+    if skipped:
+        log(f"[RESUME] {stage}: 完了済みのためスキップ → {skipped}")
+    if skip is not None:
+        for account in pending[:]:
+            reason = skip(account)
+            if reason:
+                log(f"[SKIP] {account}: {reason}")
+                checkpoint.mark_skipped(stage, account, reason)
+                pending.remove(account)
+    if not pending:
+        return
+
+    try:
+        outputs = runner(pending)
+    except Exception as e:
+        for account in pending:
+            checkpoint.mark_failed(stage, account, str(e))
+        raise
+
+    for account in pending:
+        output = outputs.get(account)
+        if output and os.path.exists(output):
+            items = count_post_lines(output) if count_items else None
+            checkpoint.mark_done(stage, account, output, items)
+        else:
+            checkpoint.mark_failed(stage, account, "出力ファイルが生成されませんでした")
 
 # ================================
-# メイン処理フロー
+# 入力が無いアカウントのスキップ判定
 # ================================
-def main():
-    """各ステージ（CSV 生成、通常ポスト、アフィポスト、マージ）を順番に実行する全体制御関数。"""
-    cleanup_old_logs()
-    log("★ 自動生成パイプラインを開始します ★")
-
-    start_time = time.time()
+def skip_without_affiliate_input(account: str) -> Optional[str]:
+    """CSV 取得が 0 件だった（入力 CSV が無い）アカウントをアフィポスト生成の対象外とします。"""
+    if not os.path.exists(f"../data/input/{account}_input.csv"):
+        return "入力 CSV が無いためアフィポスト生成をスキップします"
+    return None
 
-    check_secrets()
 
-    # 前回のメトリクスログをクリア（今回の実行分のみを正確に集計するため）
-    try:
-        os.makedirs("../logs", exist_ok=True)
-        metrics_path = os.path.join("..", "logs", "ai_metrics.jsonl")
-        if os.path.exists(metrics_path):
-            os.remove(metrics_path)
-    except Exception:
-        pass
+def skip_merge_for(checkpoint: RunCheckpoint) -> Callable[[str], Optional[str]]:
+    """アフィポスト生成をスキップしたアカウントをマージの対象外とする判定を返します。"""
+    def skip(account: str) -> Optional[str]:
+        if checkpoint.is_skipped("affiliate", account):
+            return "アフィポストが無いためマージをスキップします"
+        return None
+    return skip
 
+# ================================
+# ステージの逐次実行
+# ================================
+def run_stages_sequential(checkpoint: RunCheckpoint, accounts: List[str]) -> None:
+    """CSV 生成 → 通常ポスト → アフィポスト → マージの順にステージを実行します。"""
     # 1. 楽天 API から商品情報を取得して CSV 作成
     log("=== make_input_csv.py の実行を開始します ===")
-    InputCSVGenerator().generate()
+    run_stage(checkpoint, "csv", accounts, lambda targets: InputCSVGenerator().generate(targets))
     log("=== make_input_csv.py が正常に完了しました ===")
 
     # 2. AI を用いた通常ポストの生成
     log("=== normal_post_generator.py の実行を開始します ===")
-    NormalPostGenerator().generate()
+    run_stage(checkpoint, "normal", accounts, lambda targets: NormalPostGenerator().generate(targets), count_items=True)
     log("=== normal_post_generator.py が正常に完了しました ===")
 
-    # 3. AI を用いたアフィリエイトポストの生成
+    # 3. AI を用いたアフィリエイトポストの生成（入力 CSV があるアカウントのみ）
     log("=== affiliate_post_generator.py の実行を開始します ===")
-    AffiliatePostGenerator().generate()
+    run_stage(
+        checkpoint, "affiliate", accounts, lambda targets: AffiliatePostGenerator().generate(targets),
+        count_items=True, skip=skip_without_affiliate_input
+    )
     log("=== affiliate_post_generator.py が正常に完了しました ===")
 
     # 4. 生成された 2 種類のポストをマージ（DI コンテナを利用）
     merger = PostMerger()
-    merger.merge()
+    run_stage(checkpoint, "merge", accounts, merger.merge, skip=skip_merge_for(checkpoint))
+
+# ================================
+# ステージの並行実行 (DAG)
+# ================================
+def run_stages_parallel(checkpoint: RunCheckpoint, accounts: List[str], max_workers: int) -> None:
+    """アカウント単位のステージを依存グラフとして並行に実行します。
+
+    通常ポストは楽天データに依存しないため CSV 取得と同時に開始し、
+    各アカウントのアフィポストはそのアカウントの CSV が揃い次第開始します。
+    HTML のクリーンアップと Git 公開は全体で 1 回ずつ実行します。
+    """
+    csv_generator = InputCSVGenerator()
+    normal_generator = NormalPostGenerator()
+    affiliate_generator = AffiliatePostGenerator()
+    merger = PostMerger()
+
+    skip_merge = skip_merge_for(checkpoint)
+
+    def affiliate_stage(account: str) -> None:
+        # CSV 取得が 0 件だったアカウントにはアフィポストを生成しない
+        run_stage(
+            checkpoint, "affiliate", [account],
+            lambda targets: affiliate_generator.generate(targets, cleanup=False, publish=False),
+            count_items=True, skip=skip_without_affiliate_input
+        )
+
+    graph = StageGraph(max_workers=max_workers)
+    graph.add("cleanup_html", affiliate_generator.cleanup_html)
+    for account in accounts:
+        graph.add(f"csv:{account}", lambda a=account: run_stage(checkpoint, "csv", [a], csv_generator.generate))
+        graph.add(
+            f"normal:{account}",
+            lambda a=account: run_stage(checkpoint, "normal", [a], normal_generator.generate, count_items=True)
+        )
+        graph.add(f"affiliate:{account}", lambda a=account: affiliate_stage(a), deps=[f"csv:{account}", "cleanup_html"])
+        graph.add(
+            f"merge:{account}",
+            lambda a=account: run_stage(checkpoint, "merge", [a], merger.merge, skip=skip_merge),
+            deps=[f"normal:{account}", f"affiliate:{account}"]
+        )
+    # 一部のアカウントが失敗しても、生成済みの HTML は公開する
+    graph.add(
+        "publish_html",
+        affiliate_generator.publish_html,
+        deps=[f"affiliate:{a}" for a in accounts],
+        run_on_failed_deps=True
+    )
+
+    log(f"=== ステージを並行実行します（{len(graph.nodes)} ノード / 最大 {max_workers} 並列） ===")
+    status = graph.run()
+    failed = sorted(name for name, st in status.items() if st != "done")
+    if failed:
+        log(f"⚠ 完了しなかったステージ: {failed}")
+    log("=== ステージの並行実行が完了しました ===")
+
+# ================================
+# メイン処理フロー
+# ================================
+def main(argv=None):
+    """各ステージ（CSV 生成、通常ポスト、アフィポスト、マージ）を実行する全体制御関数。
+
+    --parallel-stages を指定すると、アカウント単位のステージを依存グラフに沿って並行実行します。
+    --resume を指定すると、直近の未完了の実行マニフェストを読み込み、
+    失敗または未実行のステージ・アカウントのみを再実行します。
+    """
+    parser = argparse.ArgumentParser(description="投稿文自動生成パイプライン")
+    parser.add_argument("--resume", action="store_true", help="直近の未完了の実行を、失敗した単位から再開します")
+    parser.add_argument("--parallel-stages", action="store_true", help="アカウント単位のステージを依存グラフに沿って並行実行します")
+    parser.add_argument("--max-stage-workers", type=int, default=8, help="並行実行するステージ数の上限（既定: 8）")
+    args = parser.parse_args(argv)
+
+    cleanup_old_logs()
+    log("★ 自動生成パイプラインを開始します ★")
+
+    start_time = time.time()
+
+    check_secrets()
+
+    checkpoint = RunCheckpoint.load_latest() if args.resume else None
+    if checkpoint:
+        log(f"[RESUME] 実行 {checkpoint.run_id} を再開します")
+    else:
+        if args.resume:
+            log("[RESUME] 再開可能な実行が無いため、新規に実行します")
+        checkpoint = RunCheckpoint.start_new()
+
+        # 前回のメトリクスログをクリア（今回の実行分のみを正確に集計するため）
+        try:
+            os.makedirs("../logs", exist_ok=True)
+            metrics_path = os.path.join("..", "logs", "ai_metrics.jsonl")
+            if os.path.exists(metrics_path):
+                os.remove(metrics_path)
+        except Exception:
+            pass
+
+    # マージまで完了したアカウントは中間ファイルが削除済みのため、以降のステージごとスキップ
+    accounts = checkpoint.pending("merge", load_accounts())
+
+    if args.parallel_stages:
+        run_stages_parallel(checkpoint, accounts, args.max_stage_workers)
+    else:
+        run_stages_sequential(checkpoint, accounts)
+
+    # 入力が無くマージの対象外としたアカウントは完了済みとして扱う
+    unmerged = checkpoint.pending("merge", accounts)
+    if unmerged:
+        log(f"[RESUME] 未完了のアカウントがあります: {unmerged}（python run_all.py --resume で再開できます）")
+    else:
+        checkpoint.complete()
     log("すべての投稿文のマージ処理が完了しました。")
 
     # AI 実行メトリクス（リクエスト数、成功率、再試行回数等）の集計と報告
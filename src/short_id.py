@@ -0,0 +1,143 @@
+"""
+短縮 ID 割り当てモジュール。
+リダイレクトページのファイル名（短縮 ID）を転送先 URL のハッシュから決定的に割り当て、
+割り当て結果を SQLite の索引に永続化して、同じ URL には実行をまたいで同じ ID を返します。
+"""
+import hashlib
+import os
+import sqlite3
+import string
+import threading
+import time
+from typing import Dict, List, Any, Optional
+from html_layout import PageLayout, get_page_layout
+
+
+DEFAULT_ID_INDEX_PATH: str = "../data/short_ids.sqlite3"
+DEFAULT_ID_LENGTH: int = 6
+
+_ALPHABET = string.digits + string.ascii_lowercase
+
+
+def base36_digest(text: str, length: int = DEFAULT_ID_LENGTH) -> str:
+    """文字列の SHA-256 を base36 (0-9a-z) で表現し、先頭 length 文字を返します。"""
+    value = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest(), "big")
+    chars = []
+    while value and len(chars) < length:
+        value, rem = divmod(value, 36)
+        chars.append(_ALPHABET[rem])
+    return "".join(chars).ljust(length, "0")
+
+
+class ShortIdAllocator:
+    """転送先 URL ごとに一意で安定した短縮 ID を割り当てる、スレッドセーフな索引。
+
+    候補 ID は URL のハッシュから求め、索引上で別の URL に割り当て済みの場合や、
+    索引に無いページ（以前のランダムなファイル名）が出力ディレクトリに存在する場合は、
+    連番を付けたハッシュで次の候補を探索します。
+    """
+
+    def __init__(self, path: str = DEFAULT_ID_INDEX_PATH, layout: Optional[PageLayout] = None, length: int = DEFAULT_ID_LENGTH):
+        """索引を初期化し、必要であればデータベースを作成します。
+
+        Args:
+            path: SQLite ファイルのパス
+            layout: リダイレクトページの配置（既存ファイルとの衝突確認に使用）
+            length: 短縮 ID の文字数
+        """
+        self.path = path
+        self.layout = layout
+        self.length = length
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS short_ids (
+                    short_id TEXT PRIMARY KEY,
+                    target_url TEXT NOT NULL UNIQUE,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )"""
+            )
+
+    def _is_taken(self, short_id: str) -> bool:
+        """ID が索引上で使用済み、または索引に無いページとして出力ディレクトリに存在するかを判定します。"""
+        row = self._conn.execute("SELECT 1 FROM short_ids WHERE short_id = ?", (short_id,)).fetchone()
+        if row is not None:
+            return True
+        return self.layout is not None and self.layout.existing_path(short_id) is not None
+
+    def _allocate_locked(self, target_url: str, now: float) -> str:
+        """ロック取得済みの状態で 1 件の ID を割り当てます。"""
+        row = self._conn.execute(
+            "SELECT short_id FROM short_ids WHERE target_url = ?", (target_url,)
+        ).fetchone()
+        if row is not None:
+            self._conn.execute("UPDATE short_ids SET last_used = ? WHERE short_id = ?", (now, row[0]))
+            return row[0]
+
+        probe = 0
+        short_id = base36_digest(target_url, self.length)
+        while self._is_taken(short_id):
+            probe += 1
+            short_id = base36_digest(f"{target_url}#{probe}", self.length)
+        self._conn.execute(
+            "INSERT INTO short_ids (short_id, target_url, created_at, last_used) VALUES (?, ?, ?, ?)",
+            (short_id, target_url, now, now)
+        )
+        return short_id
+
+    def allocate(self, target_url: str) -> str:
+        """転送先 URL の短縮 ID を返します。割り当て済みの URL には同じ ID を返します。"""
+        return self.allocate_many([target_url])[0]
+
+    def allocate_many(self, target_urls: List[str]) -> List[str]:
+        """複数の転送先 URL の短縮 ID を 1 回のトランザクションで割り当てます。
+
+        Args:
+            target_urls: 転送先 URL のリスト
+
+        Returns:
+            target_urls と同じ順序の短縮 ID のリスト
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            return [self._allocate_locked(url, now) for url in target_urls]
+
+    def lookup(self, short_id: str) -> Optional[str]:
+        """短縮 ID に割り当てられた転送先 URL を返します（未割り当ての場合は None）。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT target_url FROM short_ids WHERE short_id = ?", (short_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+
+# パスごとに共有される索引
+_allocators: Dict[str, ShortIdAllocator] = {}
+_allocators_lock = threading.Lock()
+
+
+def get_short_id_allocator(policy: Dict[str, Any], output_dir: str) -> ShortIdAllocator:
+    """generation_policy.yaml の redirect_pages セクションに対応する共有の索引を取得します。
+
+    Args:
+        policy: generation_policy.yaml 全体の辞書。redirect_pages キー配下の id_index_path, id_length
+                （および配置の layout, shard_length）を参照します
+        output_dir: リダイレクトページの出力ディレクトリ
+
+    Returns:
+        共有の ShortIdAllocator インスタンス
+    """
+    settings = policy.get("redirect_pages") or {}
+    path = settings.get("id_index_path", DEFAULT_ID_INDEX_PATH)
+    with _allocators_lock:
+        allocator = _allocators.get(path)
+        if allocator is None:
+            allocator = ShortIdAllocator(
+                path, get_page_layout(policy, output_dir), int(settings.get("id_length", DEFAULT_ID_LENGTH))
+            )
+            _allocators[path] = allocator
+        return allocator
@@ -0,0 +1,126 @@
+"""
+ステージ依存グラフ (DAG) 実行モジュール。
+アカウント単位のステージをノードとして登録し、依存関係が満たされたノードから並行に実行します。
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Dict, List, Callable, Any, Optional
+
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+
+@dataclass
+class StageNode:
+    """DAG の 1 ノード（例: "csv:account_a"）。"""
+    name: str
+    func: Callable[[], Any]
+    deps: List[str] = field(default_factory=list)
+    # True の場合、依存ノードが失敗・スキップしても実行します（公開処理など）
+    run_on_failed_deps: bool = False
+
+
+class StageGraph:
+    """依存関係付きのステージを、スレッドプール上でクリティカルパスに沿って実行するスケジューラ。
+
+    各ノードは依存ノードがすべて完了した時点で即座に投入されるため、
+    全体の所要時間はステージの合計ではなく、最も長い依存チェーンに近づきます。
+    """
+
+    def __init__(self, max_workers: int = 8, logger: Optional[logging.Logger] = None):
+        """初期化。
+
+        Args:
+            max_workers: 同時に実行するノード数の上限
+            logger: 進捗を記録するロガー
+        """
+        self.max_workers = max_workers
+        self.logger = logger or logging.getLogger(__name__)
+        self.nodes: Dict[str, StageNode] = {}
+
+    def add(self, name: str, func: Callable[[], Any], deps: Optional[List[str]] = None, run_on_failed_deps: bool = False) -> None:
+        """ノードを登録します。
+
+        Args:
+            name: ノード名（グラフ内で一意）
+            func: 実行する処理（引数なし）
+            deps: 先に完了している必要があるノード名のリスト
+            run_on_failed_deps: 依存ノードが失敗しても実行するかどうか
+        """
+        if name in self.nodes:
+            raise ValueError(f"ノード名が重複しています: {name}")
+        self.nodes[name] = StageNode(name, func, list(deps or []), run_on_failed_deps)
+
+    def _validate(self) -> None:
+        """未登録の依存先や循環依存が無いかを確認します。"""
+        for node in self.nodes.values():
+            for dep in node.deps:
+                if dep not in self.nodes:
+                    raise ValueError(f"ノード '{node.name}' の依存先 '{dep}' が登録されていません")
+
+        visiting, visited = set(), set()
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"循環依存を検出しました: {name}")
+            visiting.add(name)
+            for dep in self.nodes[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.nodes:
+            visit(name)
+
+    def run(self) -> Dict[str, str]:
+        """すべてのノードを依存順に実行します。
+
+        失敗したノードに依存するノードは、run_on_failed_deps が指定されていない限りスキップされます。
+
+        Returns:
+            ノード名から結果ステータス (done / failed / skipped) へのマッピング
+        """
+        self._validate()
+        status: Dict[str, str] = {}
+        running: Dict[Future, str] = {}
+
+        def ready_nodes() -> List[StageNode]:
+            in_flight = set(running.values())
+            return [
+                node for name, node in self.nodes.items()
+                if name not in status and name not in in_flight
+                and all(dep in status for dep in node.deps)
+            ]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while len(status) < len(self.nodes):
+                for node in ready_nodes():
+                    failed_deps = [d for d in node.deps if status[d] != STATUS_DONE]
+                    if failed_deps and not node.run_on_failed_deps:
+                        status[node.name] = STATUS_SKIPPED
+                        self.logger.warning(f"依存ステージの失敗によりスキップ: {node.name} ← {failed_deps}")
+                        continue
+                    self.logger.debug(f"ステージ開始: {node.name}")
+                    running[executor.submit(node.func)] = node.name
+
+                if not running:
+                    # スキップ判定で状態が進んだ場合は再度ノードを探索
+                    continue
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        future.result()
+                        status[name] = STATUS_DONE
+                        self.logger.debug(f"ステージ完了: {name}")
+                    except Exception as e:
+                        status[name] = STATUS_FAILED
+                        self.logger.error(f"ステージ失敗: {name} - {e}")
+
+        return status
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# src 配下のモジュールはフラットに import し合うため、src を検索パスに追加する
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
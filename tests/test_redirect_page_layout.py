@@ -0,0 +1,50 @@
+"""
+ページ配置 (flat / sharded) を移行せずに切り替えた場合のリダイレクトページの書き込みの検証。
+"""
+import os
+
+import pytest
+
+from html_generator import RedirectPageWriter
+from html_layout import LAYOUT_FLAT, LAYOUT_SHARDED, PageLayout
+from page_manifest import PageManifest
+from product import Product
+from short_id import ShortIdAllocator
+
+
+def _products(price=1000):
+    return [
+        Product.parse(f"商品{name}", f"https://item.rakuten.co.jp/shop/{name}/", price=price)
+        for name in ("a", "b")
+    ]
+
+
+def _pages(output_dir):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), output_dir).replace(os.sep, "/")
+        for root, _, files in os.walk(output_dir) for name in files
+    )
+
+
+@pytest.mark.parametrize("before, after", [(LAYOUT_FLAT, LAYOUT_SHARDED), (LAYOUT_SHARDED, LAYOUT_FLAT)])
+@pytest.mark.parametrize("price", [1000, 800], ids=["unchanged", "changed"])
+def test_layout_switch_keeps_a_single_copy_of_each_page(tmp_path, before, after, price):
+    output_dir = str(tmp_path / "html")
+    manifest = PageManifest(str(tmp_path / "pages.sqlite3"))
+
+    def writer(layout_name):
+        # 本文が変わっても同じファイル名に書き直されるよう、転送先 URL ごとに固定の短縮 ID を使用する
+        layout = PageLayout(output_dir, layout_name)
+        allocator = ShortIdAllocator(str(tmp_path / "short_ids.sqlite3"), layout)
+        return RedirectPageWriter("https://example.com", id_allocator=allocator, manifest=manifest, layout=layout)
+
+    writer(before).write_all(_products(), "20260101_090000")
+    manifest.clear_changes(manifest.pending_changes())
+    urls = writer(after).write_all(_products(price), "20260101_120000")
+
+    expected = sorted(url[len("https://example.com/"):] for url in urls)
+    assert _pages(output_dir) == expected
+    # 移動・削除した移行前の配置のパスも、公開対象の変更として記録される
+    pending = {os.path.relpath(path, output_dir).replace(os.sep, "/") for path in manifest.pending_changes()}
+    old_layout = PageLayout(output_dir, before)
+    assert pending >= set(expected) | {old_layout.relative_path(page.split("/")[-1][:-len(".html")]) for page in expected}
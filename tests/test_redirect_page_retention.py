@@ -0,0 +1,99 @@
+"""
+同じ日に 2 回実行した後のリダイレクトページの削除（当日内の古いセット）の検証。
+"""
+import csv
+from datetime import datetime
+
+import pytest
+
+from html_generator import RedirectPageWriter
+from html_layout import PageLayout
+from page_manifest import PageManifest
+from product import Product
+
+RETENTION_SECONDS = 7 * 24 * 60 * 60
+
+
+def _products():
+    return [
+        Product.parse(f"商品{name}", f"https://item.rakuten.co.jp/shop/{name}/", price=1000, review_average=4.0)
+        for name in ("a", "b", "c")
+    ]
+
+
+def _run_id(hhmmss: str) -> str:
+    return f"{datetime.now():%Y%m%d}_{hhmmss}"
+
+
+def _writer(tmp_path):
+    layout = PageLayout(str(tmp_path / "html"))
+    manifest = PageManifest(str(tmp_path / "pages.sqlite3"))
+    return RedirectPageWriter("https://example.com", manifest=manifest, layout=layout), manifest, layout
+
+
+def _page_names(layout):
+    return sorted(filename for filename, _ in layout.iter_pages())
+
+
+def test_unchanged_pages_survive_second_run_of_the_day(tmp_path):
+    writer, manifest, layout = _writer(tmp_path)
+    products = _products()
+
+    writer.write_all(products, _run_id("090000"))
+    pages = _page_names(layout)
+    # 2 回目の実行でも全商品を渡し、本文が同一のページは書き込まずに使用中として記録する
+    writer.write_all(products, _run_id("120000"))
+
+    assert manifest.sweep(layout, RETENTION_SECONDS) == []
+    assert _page_names(layout) == pages
+
+
+def test_pages_left_out_of_the_latest_run_are_swept(tmp_path):
+    writer, manifest, layout = _writer(tmp_path)
+    products = _products()
+
+    urls = writer.write_all(products, _run_id("090000"))
+    writer.write_all(products[1:2], _run_id("120000"))
+
+    removed = manifest.sweep(layout, RETENTION_SECONDS)
+    kept = urls[1].rsplit("/", 1)[-1][:-len(".html")]
+    assert sorted(reason for _, reason in removed) == ["当日内の古いセット"] * 2
+    assert _page_names(layout) == [kept]
+
+
+def test_only_changed_products_keeps_pages_of_unchanged_products(tmp_path):
+    pytest.importorskip("google.genai")
+    from affiliate_post_generator import AffiliatePostGenerator
+    from product_store import ProductStore, get_product_store
+
+    config = {
+        "affiliate_post_generation": {"only_changed_products": True},
+        "product_store": {"enabled": True, "path": str(tmp_path / "products.sqlite3")},
+    }
+    store = get_product_store(config)
+    assert isinstance(store, ProductStore)
+    products = _products()
+    store.upsert("acc", products, "1")
+    # 2 回目の取得では商品 b のみ値下げ
+    cheaper = Product.parse(products[1].name, products[1].url, price=800, review_average=4.0)
+    store.upsert("acc", [products[0], cheaper, products[2]], "2")
+
+    input_path = tmp_path / "acc_input.csv"
+    with open(input_path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(p.to_row() for p in (products[0], cheaper, products[2]))
+
+    writer, manifest, layout = _writer(tmp_path)
+    generator = AffiliatePostGenerator.__new__(AffiliatePostGenerator)
+    generator.config = config
+    generator.page_writer = writer
+
+    generator.run_id = _run_id("090000")
+    first = generator._load_entries(str(input_path))
+    generator.run_id = _run_id("120000")
+    second = generator._load_entries(str(input_path))
+
+    # AI 生成の対象は変化のあった商品のみだが、変化の無い商品のページも削除されない
+    assert [e.product.item_key for e in first] == [cheaper.item_key]
+    assert [e.product.item_key for e in second] == [cheaper.item_key]
+    assert manifest.sweep(layout, RETENTION_SECONDS) == []
+    assert len(_page_names(layout)) == 3